@@ -0,0 +1,367 @@
+"""
+流水线式预警周期：获取天气 -> 规则判断 -> 写入邮件任务 三个阶段同时运行。
+
+每个地区的天气数据一到就进入规则判断，判断出的预警随即写入 mail_task，
+阶段之间用有界队列衔接：上游过快时会被阻塞，整轮内存占用不随地区数增长。
+第一封预警邮件在第一个地区判断完成后即可入队，无需等待所有地区获取完毕。
+
+地区较多时可按地区名哈希分片（环境变量 ALERT_SHARDS），每个分片在独立进程中
+运行一条流水线，规则判断与模板渲染不再占用 Web 进程的 GIL；各分片直接写入
+mail_task，天气文件、邮件列表、重复预警日志与健康状态由主进程合并。
+"""
+
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from weather_alert_main import (
+    iter_weather_data,
+    AlertEvaluator,
+    AlertEnqueuer,
+    append_duplicate_logs,
+    report_weather_health,
+    WEATHER_FILE,
+    EMAIL_JSON_FILE,
+)
+import json_store
+from maintenance_utils import backup_if_has_data, trim_json_file
+from data_snapshot import get_snapshot
+
+PIPELINE_QUEUE_SIZE = 64  # 阶段之间队列的最大长度
+_END = object()  # 阶段结束标记
+
+
+class PipelineAborted(Exception):
+    """下游阶段出错，流水线已中止"""
+
+
+def _put(q, item, abort):
+    """向有界队列放入数据；下游中止时不再阻塞等待"""
+    while True:
+        if abort.is_set():
+            raise PipelineAborted()
+        try:
+            q.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+
+def _get(q, producer):
+    """从队列取数据；上游线程异常退出（未放入结束标记）时返回结束标记"""
+    while True:
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            if not producer.is_alive() and q.empty():
+                return _END
+
+
+def run_alert_pipeline(regions, forecast_hours=24, is_test=False, queue_size=PIPELINE_QUEUE_SIZE,
+                       should_stop=None, shard_id=None, snapshot=None):
+    """
+    以流水线方式执行一轮预警检查
+
+    Args:
+        regions: 地区列表
+        forecast_hours: 预报时间范围（小时）
+        is_test: 是否为测试邮件
+        queue_size: 阶段之间队列的最大长度
+        should_stop: 可选的停止检查函数，返回True时提前结束获取
+        shard_id: 分片编号；指定时天气与邮件列表写入分片文件，健康状态与重复预警日志交由调用方汇总
+        snapshot: 本轮使用的数据快照，默认在开始时取一次，三个阶段共用
+
+    Returns:
+        统计信息 dict：regions / alerts / enqueued / first_alert_seconds / elapsed / ok
+        ok 与 send_alerts 的返回值含义相同：有预警且邮件任务全部写入成功
+    """
+    start = time.perf_counter()
+    snapshot = snapshot or get_snapshot()
+    weather_queue = queue.Queue(maxsize=queue_size)
+    alert_queue = queue.Queue(maxsize=queue_size)
+    abort = threading.Event()
+    errors = []
+    stats = {'regions': 0, 'alerts': 0, 'enqueued': 0, 'first_alert_seconds': None}
+    if shard_id is None:
+        weather_file, email_file, weather_summary = WEATHER_FILE, EMAIL_JSON_FILE, None
+    else:
+        weather_file, email_file, weather_summary = shard_file(WEATHER_FILE, shard_id), shard_file(EMAIL_JSON_FILE, shard_id), {}
+
+    def fetch_stage():
+        weather_iter = iter_weather_data(regions, weather_file, weather_summary, snapshot)
+        try:
+            for region, region_data in weather_iter:
+                _put(weather_queue, (region, region_data), abort)
+                if should_stop and should_stop():
+                    print("收到停止信号，停止获取天气数据")
+                    break
+        except PipelineAborted:
+            pass
+        except Exception as e:
+            errors.append(e)
+            abort.set()
+        finally:
+            # 提前结束时关闭生成器，让它保存已获取的数据并记录健康状态
+            try:
+                weather_iter.close()
+            except Exception as e:
+                errors.append(e)
+            try:
+                _put(weather_queue, _END, abort)
+            except PipelineAborted:
+                pass
+
+    def evaluate_stage():
+        evaluator = AlertEvaluator(forecast_hours, snapshot)
+        try:
+            while True:
+                item = _get(weather_queue, fetcher)
+                if item is _END:
+                    break
+                region, region_data = item
+                stats['regions'] += 1
+                alerts = evaluator.evaluate(region, region_data)
+                if alerts:
+                    _put(alert_queue, alerts, abort)
+            evaluator.finish()
+        except PipelineAborted:
+            pass
+        except Exception as e:
+            errors.append(e)
+            abort.set()
+        finally:
+            try:
+                _put(alert_queue, _END, abort)
+            except PipelineAborted:
+                pass
+
+    fetcher = threading.Thread(target=fetch_stage, name='pipeline-fetch', daemon=True)
+    evaluator_thread = threading.Thread(target=evaluate_stage, name='pipeline-evaluate', daemon=True)
+    fetcher.start()
+    evaluator_thread.start()
+
+    # 写入阶段在调用方线程中执行（可直接使用调用方的应用上下文与数据库连接）
+    enqueuer = AlertEnqueuer(is_test, email_file=email_file, shard_output=shard_id is not None, snapshot=snapshot)
+    try:
+        while True:
+            alerts = _get(alert_queue, evaluator_thread)
+            if alerts is _END:
+                break
+            stats['alerts'] += len(alerts)
+            if enqueuer.ready:
+                written = enqueuer.enqueue(alerts)
+                if written and stats['first_alert_seconds'] is None:
+                    stats['first_alert_seconds'] = time.perf_counter() - start
+                stats['enqueued'] += written
+    except Exception as e:
+        errors.append(e)
+        abort.set()
+        # 排空队列，避免上游阻塞
+        while evaluator_thread.is_alive():
+            try:
+                alert_queue.get(timeout=0.5)
+            except queue.Empty:
+                pass
+    finally:
+        fetcher.join()
+        evaluator_thread.join()
+
+    if not stats['alerts']:
+        print("没有需要发送的预警")
+        ok = False
+    else:
+        ok = enqueuer.close()
+
+    stats['elapsed'] = time.perf_counter() - start
+    stats['ok'] = ok and not errors
+    if shard_id is not None:
+        stats.update({
+            'shard_id': shard_id,
+            'weather_summary': weather_summary,
+            'duplicate_logs': enqueuer.duplicate_logs,
+            'weather_file': weather_file,
+            'email_file': email_file if ok else None,
+            'errors': [str(error) for error in errors]
+        })
+    for error in errors:
+        print(f"预警流水线出错: {error}")
+    first = stats['first_alert_seconds']
+    print(f"预警流水线完成: {stats['regions']}个地区，{stats['alerts']}条预警，写入{stats['enqueued']}条邮件任务，"
+          f"耗时{stats['elapsed']:.2f}秒" + (f"，首条任务入队用时{first:.2f}秒" if first is not None else ""))
+    return stats
+
+
+def get_shard_count():
+    """读取分片数（环境变量 ALERT_SHARDS），小于2表示不分片"""
+    try:
+        return max(0, int(os.getenv('ALERT_SHARDS', '0') or 0))
+    except ValueError:
+        return 0
+
+
+def shard_of(region, shards):
+    """按地区名的 crc32 哈希确定分片，同一地区每轮都落在同一分片"""
+    return zlib.crc32(region.encode('utf-8')) % shards
+
+
+def partition_regions(regions, shards):
+    """把地区划分为 shards 个分片，返回 [[地区...], ...]"""
+    buckets = [[] for _ in range(shards)]
+    for region in regions:
+        buckets[shard_of(region, shards)].append(region)
+    return buckets
+
+
+def shard_file(path, shard_id):
+    """分片输出文件名，例如 weather.json -> weather.shard0.json"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{shard_id}{ext}"
+
+
+def _init_shard_worker(workdir, db_path, shards):
+    """分片进程初始化：切换工作目录、指向同一个任务库，并按分片数均分接口限流额度"""
+    import weather_alert_main
+    from weather_provider import get_provider_name, guard_qps_setting
+
+    os.chdir(workdir)
+    weather_alert_main.DB_PATH = db_path
+    qps_env, qps_default = guard_qps_setting(get_provider_name())
+    try:
+        qps = float(os.getenv(qps_env, qps_default))
+    except (TypeError, ValueError):
+        qps = float(qps_default)
+    if qps > 0:
+        os.environ[qps_env] = str(qps / shards)
+
+
+def _run_shard(shard_id, regions, forecast_hours, is_test):
+    return run_alert_pipeline(regions, forecast_hours, is_test=is_test, shard_id=shard_id)
+
+
+def _merge_json_arrays(paths, target):
+    """把多个分片的 JSON 数组依次写入目标文件，返回条目数"""
+    count = 0
+    tmp_path = target + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        out.write('[\n')
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                items = json.load(f)
+            for item in items:
+                if count:
+                    out.write(',\n')
+                out.write(json_store.dumps(item))
+                count += 1
+        out.write('\n]\n')
+    json_store.replace_file(tmp_path, target)
+    return count
+
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def run_sharded_alert_cycle(regions, forecast_hours=24, is_test=False, shards=None):
+    """
+    按地区哈希分片，在多个进程中并行执行预警流水线，并合并各分片结果
+
+    Returns:
+        与 run_alert_pipeline 相同结构的统计信息，另含 shards
+    """
+    import weather_alert_main
+
+    shards = shards or get_shard_count()
+    if shards < 2:
+        return run_alert_pipeline(regions, forecast_hours, is_test=is_test)
+
+    start = time.perf_counter()
+    buckets = [(shard_id, bucket) for shard_id, bucket in enumerate(partition_regions(regions, shards)) if bucket]
+    print(f"分片执行预警检查: {len(regions)}个地区分为{shards}个分片，{len(buckets)}个分片有数据")
+
+    results = []
+    errors = []
+    if buckets:
+        # 使用 spawn 启动分片进程，避免在多线程的 Web 进程中 fork
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(
+            max_workers=len(buckets),
+            mp_context=context,
+            initializer=_init_shard_worker,
+            initargs=(os.getcwd(), weather_alert_main.DB_PATH, shards)
+        ) as pool:
+            futures = {
+                pool.submit(_run_shard, shard_id, bucket, forecast_hours, is_test): shard_id
+                for shard_id, bucket in buckets
+            }
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    print(f"分片 {futures[future]} 执行失败: {e}")
+                    errors.append(e)
+
+    # 合并天气数据文件
+    weather_files = [r['weather_file'] for r in results if os.path.exists(r['weather_file'])]
+    if weather_files:
+        weather_data = {}
+        for path in weather_files:
+            with open(path, 'r', encoding='utf-8') as f:
+                weather_data.update(json.load(f))
+        json_store.write_json(WEATHER_FILE, weather_data)
+        _remove_files(weather_files)
+
+    # 汇总健康状态
+    summaries = [r['weather_summary'] for r in results if r.get('weather_summary')]
+    if summaries:
+        failures = [failure for summary in summaries for failure in summary.get('failures', [])]
+        if errors:
+            failures.append(f"{len(errors)}个分片执行失败")
+        report_weather_health(
+            sum(summary.get('fetched', 0) for summary in summaries),
+            failures,
+            missing_key=all(summary.get('missing_key') for summary in summaries)
+        )
+
+    # 重复预警日志统一写入
+    append_duplicate_logs([entry for r in results for entry in r.get('duplicate_logs', [])])
+
+    stats = {
+        'shards': shards,
+        'regions': sum(r['regions'] for r in results),
+        'alerts': sum(r['alerts'] for r in results),
+        'enqueued': sum(r['enqueued'] for r in results),
+        'first_alert_seconds': min(
+            (r['first_alert_seconds'] for r in results if r['first_alert_seconds'] is not None), default=None
+        ),
+    }
+
+    # 合并各分片的邮件列表为 re-Emile.json
+    ok = False
+    email_files = [r['email_file'] for r in results if r.get('email_file') and os.path.exists(r['email_file'])]
+    if stats['alerts'] and not errors and all(r['ok'] or not r['alerts'] for r in results):
+        try:
+            backup_if_has_data(EMAIL_JSON_FILE, 're_emile')
+            count = _merge_json_arrays(email_files, EMAIL_JSON_FILE)
+            trim_json_file(EMAIL_JSON_FILE, 're_emile', max_entries=1000)
+            print(f"邮件信息已保存到 {EMAIL_JSON_FILE}，共 {count} 条记录")
+            ok = True
+        except Exception as e:
+            print(f"合并分片邮件列表失败: {e}")
+    elif not stats['alerts']:
+        print("没有需要发送的预警")
+    _remove_files(email_files)
+
+    stats['elapsed'] = time.perf_counter() - start
+    stats['ok'] = ok
+    print(f"分片预警检查完成: {stats['regions']}个地区，{stats['alerts']}条预警，写入{stats['enqueued']}条邮件任务，"
+          f"耗时{stats['elapsed']:.2f}秒")
+    return stats
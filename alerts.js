@@ -1639,6 +1639,11 @@ document.addEventListener('DOMContentLoaded', function() {
   console.log('🌐 当前页面URL:', window.location.href);
   console.log('📄 当前页面标题:', document.title);
   
+  // 预警检查结束后刷新统计
+  if (window.serverEvents) {
+    window.serverEvents.on('alert_cycle.finished', () => updateAlertStats());
+  }
+
   // 初始化预警条件模态框
   initializeAlertRuleModal();
   
@@ -0,0 +1,224 @@
+"""
+外部接口保护：客户端令牌桶限流 + 熔断器。
+
+- TokenBucket：按套餐 QPS 发放令牌；遇到限流（429）时速率减半并暂停一段时间，
+  之后每次成功逐步恢复到配置速率（加性增、乘性减）
+- CircuitBreaker：统计最近 N 次调用的错误率，超过阈值即熔断，冷却期内直接拒绝，
+  冷却结束后放行一次试探请求，成功则恢复
+"""
+
+import collections
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，调用被直接拒绝"""
+
+
+class TokenBucket:
+    """线程安全的自适应令牌桶"""
+
+    def __init__(self, rate, capacity=None, min_rate=None, throttle_pause=2.0):
+        """
+        Args:
+            rate: 每秒发放令牌数，<=0 表示不限流
+            capacity: 桶容量（允许的突发量），默认等于 rate
+            min_rate: 自适应降速的下限，默认 rate 的 1/10
+            throttle_pause: 遇到限流后暂停发放令牌的秒数（逐次加倍，最多60秒）
+        """
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self.min_rate = float(min_rate or max(0.1, rate / 10.0))
+        self.throttle_pause = throttle_pause
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._consecutive_throttles = 0
+        self._lock = threading.Lock()
+
+    @property
+    def unlimited(self):
+        return self.max_rate <= 0
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+
+    def acquire(self, timeout=None):
+        """获取一个令牌，必要时阻塞等待；超时返回 False"""
+        if self.unlimited:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(min(wait, 1.0))
+
+    def on_throttled(self):
+        """上游返回限流：速率减半并暂停发放"""
+        if self.unlimited:
+            return
+        with self._lock:
+            self._consecutive_throttles += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            pause = min(60.0, self.throttle_pause * (2 ** (self._consecutive_throttles - 1)))
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            self._tokens = 0
+
+    def on_success(self):
+        """请求成功：逐步恢复速率"""
+        if self.unlimited:
+            return
+        with self._lock:
+            self._consecutive_throttles = 0
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 10.0)
+
+
+class CircuitBreaker:
+    """基于滑动窗口错误率的熔断器"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, error_threshold=0.5, window_size=20, min_requests=10, cooldown=60.0,
+                 on_state_change=None):
+        """
+        Args:
+            error_threshold: 窗口内错误率达到该值即熔断
+            window_size: 统计最近多少次调用
+            min_requests: 窗口内至少多少次调用才开始判断
+            cooldown: 熔断后的冷却时间（秒）
+            on_state_change: 状态变化回调 fn(old_state, new_state, error_rate)
+        """
+        self.error_threshold = error_threshold
+        self.min_requests = min_requests
+        self.cooldown = cooldown
+        self.on_state_change = on_state_change
+        self._outcomes = collections.deque(maxlen=window_size)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_token = None  # 半开状态下放行的试探请求的令牌，只有它的结果能改变状态
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now):
+        if self._state == self.OPEN and now - self._opened_at >= self.cooldown:
+            return self.HALF_OPEN
+        return self._state
+
+    def _error_rate(self):
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def _transition(self, new_state):
+        """切换状态（调用方持有锁）；状态有变化时返回回调参数，由调用方在释放锁之后调用 _notify"""
+        old_state = self._state
+        self._state = new_state
+        if new_state == self.OPEN:
+            self._opened_at = time.monotonic()
+        if old_state != new_state and self.on_state_change:
+            return old_state, new_state, self._error_rate()
+        return None
+
+    def _notify(self, change):
+        # 回调可能写文件或数据库，不能在持有锁时执行，否则所有请求线程都会等待
+        if change is None:
+            return
+        try:
+            self.on_state_change(*change)
+        except Exception as e:
+            print(f"熔断状态回调出错: {e}")
+
+    def allow(self):
+        """
+        是否允许发起调用；半开状态只放行一次试探请求
+
+        Returns:
+            拒绝时返回 False；否则返回放行凭证（试探请求为专属令牌），调用结束后传给 record_success/record_failure
+        """
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._trial_token is None:
+                self._trial_token = object()
+                return self._trial_token
+            return False
+
+    def _is_trial(self, token):
+        return token is not None and token is self._trial_token
+
+    def record_success(self, token=None):
+        change = None
+        with self._lock:
+            if self._state == self.CLOSED:
+                self._outcomes.append(True)
+            elif self._is_trial(token):
+                # 试探成功，恢复正常
+                self._trial_token = None
+                self._outcomes.clear()
+                change = self._transition(self.CLOSED)
+            # 熔断期间返回的其他结果（包括熔断前已发出的请求）不改变状态
+        self._notify(change)
+
+    def record_failure(self, token=None):
+        change = None
+        with self._lock:
+            if self._state == self.CLOSED:
+                self._outcomes.append(False)
+                if len(self._outcomes) >= self.min_requests and self._error_rate() >= self.error_threshold:
+                    change = self._transition(self.OPEN)
+            elif self._is_trial(token):
+                # 试探失败，重新进入冷却
+                self._trial_token = None
+                self._opened_at = time.monotonic()
+            # 熔断期间的其他失败不延长冷却时间
+        self._notify(change)
+
+
+class ApiGuard:
+    """组合令牌桶与熔断器，供天气数据提供方在每次请求前后调用"""
+
+    def __init__(self, name, bucket, breaker):
+        self.name = name
+        self.bucket = bucket
+        self.breaker = breaker
+
+    def available(self):
+        """熔断器未打开（或可进行试探）时返回 True，不占用试探名额"""
+        return self.breaker.state != CircuitBreaker.OPEN
+
+    def before_call(self):
+        """放行时返回熔断器的凭证，调用结束后传给 after_call"""
+        token = self.breaker.allow()
+        if not token:
+            raise CircuitOpenError(f"{self.name} 熔断中，暂停请求")
+        self.bucket.acquire()
+        return token
+
+    def after_call(self, success, throttled=False, token=None):
+        if throttled:
+            self.bucket.on_throttled()
+        elif success:
+            self.bucket.on_success()
+        if success:
+            self.breaker.record_success(token)
+        else:
+            self.breaker.record_failure(token)
@@ -1,6 +1,10 @@
 import os
-from flask import Flask, request, jsonify, send_from_directory
-from sqlalchemy import text
+import atexit
+import hashlib
+from flask import Flask, Response, request, jsonify, send_from_directory
+from sqlalchemy import text, func, or_, and_, event, select, update, tuple_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import selectinload
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 import datetime
@@ -10,14 +14,21 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.utils import formataddr
-import requests
-from threading import Thread
+from concurrent.futures import ThreadPoolExecutor, wait
 import time
 import re
 from werkzeug.utils import secure_filename
 import random
 import sqlite3
-from maintenance_utils import backup_if_has_data, trim_json_file
+import sqlite_db
+import json_store
+from maintenance_utils import backup_if_has_data, trim_json_file, prune_backups, append_json_array
+from scheduler import Scheduler, every, daily_at
+from leader_lease import LeaderLease, LeaderElector
+from http_client import HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT
+from weather_provider import get_weather_provider
+import event_bus
+from data_snapshot import get_snapshot, export_source, install_revision_tracking, settings_to_dict, rule_to_dict, SETTING_FIELDS
 
 # 初始化Flask应用
 app = Flask(__name__, static_folder='.', static_url_path='')
@@ -27,34 +38,49 @@ CORS(app)
 
 
 USER_FILE = 'user.json'
-if not os.path.exists(USER_FILE):
-    with open(USER_FILE, 'w', encoding='utf-8') as f:
+
+def ensure_user_file():
+    """用户文件不存在时创建空文件（读取用户时文件缺失按无用户处理，只需在初始化时创建）"""
+    if not os.path.exists(USER_FILE):
         # 默认不创建账号，避免明文凭证
-        json.dump([], f, ensure_ascii=False, indent=2)
+        json_store.write_json(USER_FILE, [])
 
 
 
 # 配置数据库：使用项目根目录下的绝对路径，避免自动落到 instance 目录
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DB_PATH = os.path.join(BASE_DIR, 'skyalert.db')
+DB_PATH = os.getenv('SKYALERT_DB_PATH') or os.path.join(BASE_DIR, 'skyalert.db')  # 可用环境变量指定其他数据库文件
 app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_PATH}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# 本进程是否参与预警调度：生产环境由 scheduler_main.py 单独运行调度，HTTP 进程（wsgi.py）设为关闭
+app.config['RUN_ALERT_SCHEDULER'] = os.getenv('SKYALERT_RUN_SCHEDULER', '1') != '0'
 
 # 日志与缓存文件控制阈值
 DATA_LOG_MAX_ENTRIES = 2000
 PENDING_EMAIL_MAX_ENTRIES = 1000
 PENDING_NOTIFICATION_MAX_ENTRIES = 500
+NOTIFICATION_BATCH_SIZE = 500  # 批量创建通知时每个事务写入的条数
 
 # 初始化数据库
 db = SQLAlchemy(app)
 
+@event.listens_for(Engine, 'connect')
+def _tune_sqlite_connection(dbapi_connection, connection_record):
+    """SQLAlchemy 新建的 SQLite 连接使用与 sqlite_db 相同的 PRAGMA（WAL、synchronous 等）"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        db_file = dbapi_connection.execute('PRAGMA database_list').fetchone()[2]
+        sqlite_db.apply_pragmas(dbapi_connection, db_file or None)
+
 # 人员数据JSON文件路径
 CUSTOMERS_JSON_FILE = 'customers_data.json'
 # 设置数据JSON文件路径
 SETTINGS_JSON_FILE = 'settings.json'
+# 模板与预警规则JSON文件路径
+TEMPLATES_JSON_FILE = 'templates_data.json'
+ALERT_RULES_JSON_FILE = 'alert_rules.json'
 
 # 导入邮件发送API
-from send_email_api import register_routes
+from send_email_api import register_routes, build_email_message, smtp_config_error, SmtpSession
 
 # 注册邮件发送API路由
 register_routes(app)
@@ -106,6 +132,7 @@ class AlertRule(db.Model):
     condition = db.Column(db.String(200), nullable=False)
     advance_time = db.Column(db.String(50))
     status = db.Column(db.String(20), default='活跃')
+    alert_type = db.Column(db.String(20), default='parameter')  # parameter(参数型) 或 text(文本型)
     created_at = db.Column(db.Date, default=datetime.date.today)
     
     weather_type = db.relationship('WeatherType')
@@ -170,6 +197,7 @@ class Setting(db.Model):
     last_updated = db.Column(db.DateTime, default=datetime.datetime.now)
     last_tested = db.Column(db.DateTime)
     test_result = db.Column(db.String(20), default='未测试')
+    extra = db.Column(db.Text)  # 没有对应列的设置项（例如 forecastRefreshMinutes），JSON 对象
 
 # 通知模型
 class Notification(db.Model):
@@ -179,9 +207,11 @@ class Notification(db.Model):
     recipient = db.Column(db.String(200))
     title = db.Column(db.String(200))
     content = db.Column(db.Text)
-    status = db.Column(db.String(20), default='pending')  # pending, approved, rejected
+    status = db.Column(db.String(20), default='pending')  # pending, sending（已审批、等待发送）, approved, rejected
     email_data = db.Column(db.Text)  # 存储邮件数据的JSON字符串
     is_test = db.Column(db.Boolean, default=False)
+    region = db.Column(db.String(100))  # 预警地区与天气类型（email_data 中的字段，单独保存便于筛选）
+    weather_type = db.Column(db.String(50))
     
     def to_dict(self):
         return {
@@ -192,7 +222,9 @@ class Notification(db.Model):
             'title': self.title,
             'content': self.content,
             'status': self.status,
-            'is_test': self.is_test
+            'is_test': self.is_test,
+            'region': self.region,
+            'weather_type': self.weather_type
         }
 
 # 邮件任务表，用于重启后恢复未发送任务
@@ -206,6 +238,15 @@ class MailTask(db.Model):
     error = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.datetime.now)
+    batch_id = db.Column(db.String(50))  # 批量审批的任务ID，预警流程写入的任务为空
+    notification_id = db.Column(db.String(50))  # 审批发送时对应的通知
+
+# JSON 数据文件的导入记录：内容哈希未变化时启动无需重复导入
+class ImportState(db.Model):
+    source = db.Column(db.String(200), primary_key=True)  # 数据文件路径
+    content_hash = db.Column(db.String(64), nullable=False)
+    record_count = db.Column(db.Integer, default=0)
+    imported_at = db.Column(db.DateTime, default=datetime.datetime.now)
 
 # ===== 设置时间工具 =====
 # ===== 设置时间工具 =====
@@ -218,17 +259,31 @@ def _get_db_path():
         return path or DB_PATH
     return DB_PATH
 
+# 老库需要补齐的列：(表, 列, 类型)
+LEGACY_COLUMNS = [
+    ('setting', 'extra', 'TEXT'),
+    ('alert_rule', 'alert_type', "VARCHAR(20) DEFAULT 'parameter'"),
+    ('notification', 'region', 'VARCHAR(100)'),
+    ('notification', 'weather_type', 'VARCHAR(50)'),
+    ('mail_task', 'batch_id', 'VARCHAR(50)'),
+    ('mail_task', 'notification_id', 'VARCHAR(50)'),
+]
+
+# 已完成表结构检查的数据库路径，同一进程内只检查一次
+_schema_checked_paths = set()
+
 def ensure_first_alert_time_column():
-    """确保 setting 表存在 first_alert_time 列，兼容老库"""
+    """确保 setting 表存在 first_alert_time 列，补齐 LEGACY_COLUMNS 中的列并执行索引迁移，兼容老库"""
     db_path = _get_db_path()
-    if not db_path or not os.path.exists(db_path):
+    if not db_path or not os.path.exists(db_path) or db_path in _schema_checked_paths:
         return
+    schema_ok = True
     try:
-        conn = sqlite3.connect(db_path)
+        conn = sqlite_db.connect(db_path)
         cursor = conn.cursor()
         cursor.execute("PRAGMA table_info(setting)")
         cols = [row[1] for row in cursor.fetchall()]
-        if 'first_alert_time' not in cols:
+        if cols and 'first_alert_time' not in cols:
             cursor.execute("ALTER TABLE setting ADD COLUMN first_alert_time VARCHAR(5)")
             # 用现有 first_alert 补齐初始值
             cursor.execute(
@@ -236,12 +291,21 @@ def ensure_first_alert_time_column():
             )
             conn.commit()
             print("已添加 first_alert_time 列并初始化")
+        # 其余老库缺少的列
+        for table, column, column_type in LEGACY_COLUMNS:
+            cursor.execute(f"PRAGMA table_info({table})")
+            table_cols = [row[1] for row in cursor.fetchall()]
+            if table_cols and column not in table_cols:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                print(f"已添加 {table}.{column} 列")
+        conn.commit()
         conn.close()
     except Exception as e:
+        schema_ok = False
         print(f"确保 first_alert_time 列存在时出错: {e}")
     # 确保邮件任务表存在
     try:
-        conn = sqlite3.connect(db_path)
+        conn = sqlite_db.connect(db_path)
         cursor = conn.cursor()
         cursor.execute(
             """
@@ -261,7 +325,16 @@ def ensure_first_alert_time_column():
         conn.commit()
         conn.close()
     except Exception as e:
+        schema_ok = False
         print(f"确保 mail_task 表存在时出错: {e}")
+    # 热点查询的索引（mail_task.status、notification.status 等）
+    try:
+        sqlite_db.apply_migrations(db_path)
+    except Exception as e:
+        schema_ok = False
+        print(f"执行数据库迁移时出错: {e}")
+    if schema_ok:
+        _schema_checked_paths.add(db_path)
 
 def normalize_first_alert_time(value, fallback_hour=6):
     """将输入转换为 HH:MM 格式字符串"""
@@ -299,9 +372,13 @@ def parse_first_alert_time_to_hour(time_str):
 
 # ===== 邮件任务工具 =====
 
+MAIL_SEND_BATCH_SIZE = 50  # 发送线程每次领取的排队邮件数（同一批共用一个 SMTP 连接，结果在一个事务中保存）
+MAIL_TASK_STALE_SECONDS = 600  # processing 状态超过该时间（秒）的排队邮件重新领取
+MAIL_JOB_MAX_FAILURES = 100  # 发送进度接口返回的失败明细条数上限
+
 def claim_mail_tasks(is_test=None, limit=None):
-    """获取待处理的邮件任务，标记为processing并返回"""
-    query = MailTask.query.filter_by(status='pending')
+    """获取预警流程写入的待处理邮件任务（不含审批后排队的任务），标记为processing并返回"""
+    query = MailTask.query.filter_by(status='pending').filter(MailTask.batch_id.is_(None))
     if is_test is not None:
         query = query.filter_by(is_test=is_test)
     if limit:
@@ -317,6 +394,30 @@ def claim_mail_tasks(is_test=None, limit=None):
         db.session.commit()
     return tasks
 
+def claim_approved_mail_tasks(limit=None):
+    """
+    领取一批审批后排队的邮件任务并标记为processing。领取在一条 UPDATE 语句中完成，多个进程同时领取也不会重复；
+    processing 状态超过 MAIL_TASK_STALE_SECONDS 的任务视为发送进程已退出，重新领取
+    """
+    now = datetime.datetime.now()
+    stale_before = now - datetime.timedelta(seconds=MAIL_TASK_STALE_SECONDS)
+    candidates = select(MailTask.id).where(
+        MailTask.batch_id.is_not(None),
+        or_(
+            MailTask.status == 'pending',
+            and_(MailTask.status == 'processing', MailTask.updated_at < stale_before)
+        )
+    ).order_by(MailTask.created_at).limit(limit or MAIL_SEND_BATCH_SIZE)
+    tasks = db.session.execute(
+        update(MailTask)
+        .where(MailTask.id.in_(candidates))
+        .values(status='processing', attempts=func.coalesce(MailTask.attempts, 0) + 1, updated_at=now)
+        .returning(MailTask.task_id, MailTask.payload, MailTask.notification_id, MailTask.is_test)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    return tasks
+
 def update_mail_task_status(task_id, status, error=None):
     """更新任务状态"""
     task = MailTask.query.filter_by(task_id=task_id).first()
@@ -328,85 +429,151 @@ def update_mail_task_status(task_id, status, error=None):
     db.session.commit()
 
 
-# 人员API
-# 保存人员数据到JSON文件
-def save_customers_to_json(customers_data):
-    try:
-        with open(CUSTOMERS_JSON_FILE, 'w', encoding='utf-8') as f:
-            json.dump(customers_data, f, ensure_ascii=False, indent=4)
-    except Exception as e:
-        print(f"保存人员数据到JSON文件时出错: {e}")
+# ===== JSON 数据文件导入/导出 =====
+# 数据库是唯一数据来源：JSON 文件只在内容变化时（首次迁移、手工编辑或部署新文件）导入一次，
+# 日常修改只写数据库，需要时再按需导出
 
-# 启动时从 customers_data.json 覆盖人员表
-def import_personnel_from_json(json_path=CUSTOMERS_JSON_FILE):
+def read_import_file(json_path, expected_type, label):
+    """读取待导入的 JSON 文件，返回 (数据, 内容哈希)；文件不存在或格式不符时返回 (None, None)"""
     if not os.path.exists(json_path):
-        print(f"  - {json_path} 文件不存在，跳过人员初始化")
-        return
-    
+        print(f"  - {json_path} 文件不存在，跳过{label}初始化")
+        return None, None
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        with open(json_path, 'rb') as f:
+            raw = f.read()
+        data = json.loads(raw.decode('utf-8'))
     except Exception as e:
         print(f"  - 读取 {json_path} 失败: {e}")
+        return None, None
+    if not isinstance(data, expected_type):
+        print(f"  - {json_path} 格式错误，期望{'数组' if expected_type is list else '对象'}，已跳过{label}初始化")
+        return None, None
+    return data, hashlib.sha256(raw).hexdigest()
+
+def is_import_current(json_path, content_hash):
+    """文件内容与上次导入（或导出）时相同"""
+    state = db.session.get(ImportState, json_path)
+    return state is not None and state.content_hash == content_hash
+
+def record_import_state(json_path, content_hash, record_count):
+    """记录文件的导入哈希（随调用方的事务一起提交）"""
+    state = db.session.get(ImportState, json_path)
+    if state is None:
+        state = ImportState(source=json_path)
+        db.session.add(state)
+    state.content_hash = content_hash
+    state.record_count = record_count
+    state.imported_at = datetime.datetime.now()
+
+def export_json_mirror(source):
+    """
+    把数据源（settings/customers/rules/templates）按需导出为 JSON 文件，并记录导出文件的哈希，
+    下次启动时不会把刚导出的文件当作新内容重新导入
+
+    Returns:
+        (文件路径, 条目数)
+    """
+    path, count, content_hash = export_source(source)
+    try:
+        record_import_state(path, content_hash, count)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"记录 {path} 的导出哈希时出错: {e}")
+    print(f"已导出 {count} 条数据到 {path}")
+    return path, count
+
+def export_json_response(source, label):
+    try:
+        path, count = export_json_mirror(source)
+        return jsonify({'success': True, 'message': f'成功导出 {count} 条{label}到 {path}'})
+    except Exception as e:
+        print(f"导出{label}时出错: {str(e)}")
+        return jsonify({'success': False, 'message': f'导出{label}失败: {str(e)}'}), 500
+
+# customers_data.json 内容变化时覆盖人员表
+def import_personnel_from_json(json_path=CUSTOMERS_JSON_FILE):
+    """
+    用 JSON 文件覆盖人员表：文件内容与上次导入（或导出）时相同则直接跳过，之后在后台所做的修改只保存在
+    数据库中，不会被旧文件覆盖；否则预先加载全部天气类型，在一个事务内批量写入人员与关联记录
+    """
+    data, content_hash = read_import_file(json_path, list, '人员')
+    if data is None:
         return
     
-    if not isinstance(data, list):
-        print(f"  - {json_path} 格式错误，期望数组，已跳过人员初始化")
+    if is_import_current(json_path, content_hash):
+        print(f"  - {json_path} 自上次导入后未变化，跳过人员初始化")
         return
     
     try:
-        # 先清空关联表和人员表，避免旧数据残留
+        # 预先加载全部天气类型，缺少的一次性补齐
+        type_ids = {name: type_id for type_id, name in db.session.query(WeatherType.id, WeatherType.name)}
+        missing_types = sorted({
+            name for row in data for name in (row.get('weatherTypes') or [])
+            if name and name not in type_ids
+        })
+        if missing_types:
+            db.session.execute(WeatherType.__table__.insert(), [{'name': name} for name in missing_types])
+            type_ids = {name: type_id for type_id, name in db.session.query(WeatherType.id, WeatherType.name)}
+        
+        # 人员表清空后按文件顺序指定ID（与逐条插入时自增得到的ID一致），关联记录可以直接批量写入
+        now = datetime.datetime.now()
+        personnel_rows = []
+        association_rows = []
+        for personnel_id, row in enumerate(data, start=1):
+            personnel_rows.append({
+                'id': personnel_id,
+                'name': row.get('name'),
+                'title': row.get('title'),
+                'company': row.get('company'),
+                'region': row.get('region'),
+                'email': row.get('email'),
+                'phone': row.get('phone'),
+                'category': row.get('category', '客户'),
+                'last_updated': now
+            })
+            for type_id in {type_ids[name] for name in (row.get('weatherTypes') or []) if name}:
+                association_rows.append({'personnel_id': personnel_id, 'weather_type_id': type_id})
+        
+        # 先清空关联表和人员表，避免旧数据残留；清空与写入在同一个事务内
         db.session.execute(personnel_weather_types.delete())
-        Personnel.query.delete()
-        db.session.commit()
-        imported = 0
-        
-        for row in data:
-            p = Personnel(
-                name=row.get('name'),
-                title=row.get('title'),
-                company=row.get('company'),
-                region=row.get('region'),
-                email=row.get('email'),
-                phone=row.get('phone'),
-                category=row.get('category', '客户')
-            )
-            
-            # 关联天气类型，不存在则创建
-            for wt_name in row.get('weatherTypes', []):
-                if not wt_name:
-                    continue
-                wt = WeatherType.query.filter_by(name=wt_name).first()
-                if not wt:
-                    wt = WeatherType(name=wt_name)
-                    db.session.add(wt)
-                    db.session.flush()
-                p.weather_types.append(wt)
-            
-            db.session.add(p)
-            imported += 1
+        db.session.execute(Personnel.__table__.delete())
+        if personnel_rows:
+            db.session.execute(Personnel.__table__.insert(), personnel_rows)
+        if association_rows:
+            db.session.execute(personnel_weather_types.insert(), association_rows)
         
+        record_import_state(json_path, content_hash, len(personnel_rows))
         db.session.commit()
-        print(f"  - 已从 {json_path} 导入 {imported} 条人员数据并覆盖旧记录")
+        print(f"  - 已从 {json_path} 导入 {len(personnel_rows)} 条人员数据并覆盖旧记录")
     except Exception as e:
         db.session.rollback()
         print(f"  - 导入人员数据失败: {e}")
 
-# 启动时从 settings.json 同步系统设置到数据库
-def import_settings_from_json(json_path=SETTINGS_JSON_FILE):
-    if not os.path.exists(json_path):
-        print(f"  - {json_path} 文件不存在，跳过设置同步")
-        return
-    
+# 有对应列的设置项，其余设置项保存在 Setting.extra 中
+SETTING_COLUMN_KEYS = frozenset(key for key, _ in SETTING_FIELDS) | {'refreshInterval'}
+
+def merge_setting_extra(setting, data):
+    """把没有对应列的设置项合并进 extra（后台表单不包含这些项，提交时保留原值）"""
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except Exception as e:
-        print(f"  - 读取 {json_path} 失败: {e}")
+        extra = json.loads(setting.extra) if setting.extra else {}
+    except ValueError:
+        extra = {}
+    extra.update({key: value for key, value in data.items() if key not in SETTING_COLUMN_KEYS})
+    setting.extra = json.dumps(extra, ensure_ascii=False) if extra else None
+
+def setting_row(setting):
+    """Setting 对象转换为 列名 -> 值 的映射，供 settings_to_dict 使用"""
+    return {column.name: getattr(setting, column.name) for column in Setting.__table__.columns}
+
+# settings.json 内容变化时同步系统设置到数据库
+def import_settings_from_json(json_path=SETTINGS_JSON_FILE):
+    data, content_hash = read_import_file(json_path, dict, '设置')
+    if data is None:
         return
     
-    if not isinstance(data, dict):
-        print(f"  - {json_path} 格式错误，期望对象，已跳过设置同步")
+    if is_import_current(json_path, content_hash) and Setting.query.first():
+        print(f"  - {json_path} 自上次导入后未变化，跳过设置同步")
         return
     
     try:
@@ -446,41 +613,210 @@ def import_settings_from_json(json_path=SETTINGS_JSON_FILE):
                 pass
         if data.get('testResult'):
             setting.test_result = data.get('testResult')
+        merge_setting_extra(setting, data)
         
         db.session.add(setting)
+        record_import_state(json_path, content_hash, 1)
         db.session.commit()
         print(f"  - 已从 {json_path} 同步系统设置到数据库")
     except Exception as e:
         db.session.rollback()
         print(f"  - 同步系统设置失败: {e}")
 
-@app.route('/api/personnel', methods=['GET'])
-def get_personnel():
-    # 从数据库获取人员数据
-    personnel = Personnel.query.all()
-    result = []
+def parse_json_date(value):
+    """JSON 数据中的日期（YYYY-MM-DD，例如规则的 createdAt、模板的 lastModified），无法解析时使用当天"""
+    try:
+        return datetime.datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return datetime.date.today()
+
+# templates_data.json 内容变化时新增或更新模板
+def import_templates_from_json(json_path=TEMPLATES_JSON_FILE):
+    """按模板ID（文件中没有ID时按名称）新增或更新模板；不同适用对象的模板可以同名"""
+    templates_data, content_hash = read_import_file(json_path, list, '模板')
+    if templates_data is None:
+        return
     
-    # 将结果转换为JSON格式
-    for person in personnel:
-        weather_types = [wt.name for wt in person.weather_types]
-        person_data = {
-            'id': person.id,
-            'name': person.name,
-            'title': person.title,
-            'company': person.company,
-            'region': person.region,
-            'email': person.email,
-            'phone': person.phone,
-            'category': person.category,  # 添加类别字段到JSON输出
-            'weatherTypes': weather_types,
-            'lastUpdated': person.last_updated.strftime('%Y-%m-%d %H:%M:%S')
-        }
-        result.append(person_data)
+    if is_import_current(json_path, content_hash):
+        print(f"  - {json_path} 自上次导入后未变化，跳过模板初始化")
+        return
+    
+    try:
+        templates = Template.query.all()
+        by_id = {template.id: template for template in templates}
+        by_name = {template.name: template for template in templates}
+        weather_types = {wt.name: wt for wt in get_weather_types_by_name([item.get('type') for item in templates_data])}
+        for template_data in templates_data:
+            template_id = template_data.get('id')
+            template = by_id.get(template_id) if template_id else by_name.get(template_data['name'])
+            if template:
+                print(f"  - 模板 '{template_data['name']}' 已存在，更新...")
+            else:
+                print(f"  - 创建新模板 '{template_data['name']}'")
+                template = Template(id=template_id, name=template_data['name'])
+                db.session.add(template)
+                if template_id:
+                    by_id[template_id] = template
+            template.name = template_data['name']
+            template.subject = template_data['subject']
+            template.content = template_data['content']
+            template.is_active = template_data.get('isActive', True)
+            if template_data.get('lastModified'):
+                template.last_modified = parse_json_date(template_data['lastModified'])
+            template.target_role = template_data.get('targetRole') or 'all'
+            if 'attachments' in template_data:
+                attachments = template_data['attachments']
+                template.attachments = attachments if isinstance(attachments, str) else json.dumps(attachments)
+            if template_data.get('type'):
+                template.weather_type = weather_types[template_data['type']]
+        
+        record_import_state(json_path, content_hash, len(templates_data))
+        db.session.commit()
+        print(f"  - 成功导入 {len(templates_data)} 个模板")
+    except Exception as e:
+        db.session.rollback()
+        print(f"  - 导入模板数据时出错: {str(e)}")
+
+# alert_rules.json 内容变化时覆盖预警规则表
+def import_alert_rules_from_json(json_path=ALERT_RULES_JSON_FILE):
+    """用 JSON 文件覆盖预警规则表，保留文件中的规则ID；文件内容与上次导入（或导出）时相同则跳过"""
+    rules, content_hash = read_import_file(json_path, list, '预警规则')
+    if rules is None:
+        return
     
-    # 保存到JSON文件
-    save_customers_to_json(result)
+    if is_import_current(json_path, content_hash):
+        print(f"  - {json_path} 自上次导入后未变化，跳过预警规则初始化")
+        return
     
-    return jsonify(result)
+    try:
+        weather_types = {wt.name: wt for wt in get_weather_types_by_name([rule.get('type') for rule in rules])}
+        db.session.flush()
+        rows = []
+        for rule in rules:
+            if not rule.get('condition'):
+                continue
+            advance_time = rule.get('advanceTime')
+            rows.append({
+                'id': rule.get('id'),
+                'weather_type_id': weather_types[rule['type']].id if rule.get('type') else None,
+                'condition': rule['condition'],
+                'advance_time': str(advance_time) if advance_time not in (None, '') else None,
+                'status': rule.get('status', '活跃'),
+                'alert_type': rule.get('alertType', 'parameter'),
+                'created_at': parse_json_date(rule.get('createdAt'))
+            })
+        
+        db.session.execute(AlertRule.__table__.delete())
+        if rows:
+            db.session.execute(AlertRule.__table__.insert(), rows)
+        record_import_state(json_path, content_hash, len(rows))
+        db.session.commit()
+        print(f"  - 已从 {json_path} 导入 {len(rows)} 条预警规则")
+    except Exception as e:
+        db.session.rollback()
+        print(f"  - 导入预警规则失败: {e}")
+
+PERSONNEL_PAGE_SIZE = 50  # 分页查询的默认每页条数
+PERSONNEL_MAX_PAGE_SIZE = 500
+
+# 完整人员列表的响应缓存：人员表指纹不变时直接返回，避免每次请求都序列化全部人员
+_personnel_cache = {'fingerprint': None, 'body': None}
+
+def serialize_personnel(person):
+    return {
+        'id': person.id,
+        'name': person.name,
+        'title': person.title,
+        'company': person.company,
+        'region': person.region,
+        'email': person.email,
+        'phone': person.phone,
+        'category': person.category,
+        'weatherTypes': [wt.name for wt in person.weather_types],
+        'lastUpdated': person.last_updated.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+def personnel_query():
+    """按ID排序的人员查询，天气类型用一次 selectin 查询批量加载"""
+    return Personnel.query.options(selectinload(Personnel.weather_types)).order_by(Personnel.id)
+
+def personnel_fingerprint():
+    """人员表指纹：新增、删除、修改（更新 last_updated）都会改变"""
+    count, max_id, max_updated = db.session.query(
+        func.count(Personnel.id), func.max(Personnel.id), func.max(Personnel.last_updated)
+    ).one()
+    return f"{count}:{max_id}:{max_updated}"
+
+def get_weather_types_by_name(names):
+    """一次查询取得天气类型，不存在的类型随之创建"""
+    names = list(dict.fromkeys(name for name in names if name))
+    found = {wt.name: wt for wt in WeatherType.query.filter(WeatherType.name.in_(names))} if names else {}
+    for name in names:
+        if name not in found:
+            found[name] = WeatherType(name=name)
+            db.session.add(found[name])
+    return [found[name] for name in names]
+
+def personnel_response(body, etag):
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/api/personnel', methods=['GET'])
+def get_personnel():
+    """
+    人员列表。不带参数时返回完整列表（数组）；支持的查询参数：
+    - q: 按姓名、地区、单位、邮箱模糊搜索
+    - category / region: 按类别、地区精确筛选
+    - page / pageSize: 分页，指定时返回 {items, total, page, pageSize}
+    响应带 ETag，客户端携带 If-None-Match 且人员未变化时返回 304
+    """
+    fingerprint = personnel_fingerprint()
+    keyword = (request.args.get('q') or '').strip()
+    category = request.args.get('category')
+    region = request.args.get('region')
+    paged = 'page' in request.args or 'pageSize' in request.args
+    
+    if not (keyword or category or region or paged):
+        if _personnel_cache['fingerprint'] != fingerprint:
+            result = [serialize_personnel(person) for person in personnel_query()]
+            _personnel_cache['body'] = json.dumps(result, ensure_ascii=False)
+            _personnel_cache['fingerprint'] = fingerprint
+        etag = hashlib.md5(fingerprint.encode('utf-8')).hexdigest()
+        return personnel_response(_personnel_cache['body'], etag)
+    
+    query = personnel_query()
+    if keyword:
+        pattern = f"%{keyword}%"
+        query = query.filter(or_(
+            Personnel.name.like(pattern),
+            Personnel.region.like(pattern),
+            Personnel.company.like(pattern),
+            Personnel.email.like(pattern)
+        ))
+    if category:
+        query = query.filter(Personnel.category == category)
+    if region:
+        query = query.filter(Personnel.region == region)
+    
+    if paged:
+        page = max(request.args.get('page', 1, type=int), 1)
+        page_size = min(max(request.args.get('pageSize', PERSONNEL_PAGE_SIZE, type=int), 1), PERSONNEL_MAX_PAGE_SIZE)
+        total = query.order_by(None).count()
+        items = query.offset((page - 1) * page_size).limit(page_size).all()
+        body = json.dumps({
+            'items': [serialize_personnel(person) for person in items],
+            'total': total,
+            'page': page,
+            'pageSize': page_size
+        }, ensure_ascii=False)
+    else:
+        body = json.dumps([serialize_personnel(person) for person in query], ensure_ascii=False)
+    
+    args_key = json.dumps(sorted(request.args.items(multi=True)), ensure_ascii=False)
+    etag = hashlib.md5(f"{fingerprint}|{args_key}".encode('utf-8')).hexdigest()
+    return personnel_response(body, etag)
 
 @app.route('/api/personnel', methods=['POST'])
 def add_personnel():
@@ -498,21 +834,12 @@ def add_personnel():
     )
     
     # 添加关联的天气类型
-    weather_types = data.get('weatherTypes', [])
-    for wt_name in weather_types:
-        wt = WeatherType.query.filter_by(name=wt_name).first()
-        if not wt:
-            wt = WeatherType(name=wt_name)
-            db.session.add(wt)
-        new_person.weather_types.append(wt)
+    new_person.weather_types = get_weather_types_by_name(data.get('weatherTypes', []))
     
     # 保存到数据库
     db.session.add(new_person)
     db.session.commit()
     
-    # 保存到JSON
-    personnel = get_personnel()
-    
     return jsonify({'success': True, 'message': '人员添加成功'})
 
 @app.route('/api/personnel/<int:id>', methods=['PUT'])
@@ -534,21 +861,11 @@ def update_personnel(id):
     person.last_updated = datetime.datetime.now()
     
     # 更新天气类型关系
-    person.weather_types = []
-    weather_types = data.get('weatherTypes', [])
-    for wt_name in weather_types:
-        wt = WeatherType.query.filter_by(name=wt_name).first()
-        if not wt:
-            wt = WeatherType(name=wt_name)
-            db.session.add(wt)
-        person.weather_types.append(wt)
+    person.weather_types = get_weather_types_by_name(data.get('weatherTypes', []))
     
     # 保存到数据库
     db.session.commit()
     
-    # 保存到JSON
-    personnel = get_personnel()
-    
     return jsonify({'success': True, 'message': '人员更新成功'})
 
 @app.route('/api/personnel/<int:id>', methods=['DELETE'])
@@ -561,29 +878,13 @@ def delete_personnel(id):
     db.session.delete(person)
     db.session.commit()
     
-    # 获取最新数据并保存到JSON
-    all_personnel = Personnel.query.all()
-    result = []
-    for p in all_personnel:
-        weather_types = [wt.name for wt in p.weather_types]
-        result.append({
-            'id': p.id,
-            'name': p.name,
-            'title': p.title,
-            'company': p.company,
-            'region': p.region,
-            'email': p.email,
-            'phone': p.phone,
-            'category': p.category,
-            'weatherTypes': weather_types,
-            'lastUpdated': p.last_updated.strftime('%Y-%m-%d %H:%M:%S')
-        })
-    
-    # 确保数据保存到JSON文件
-    save_customers_to_json(result)
-    
     return jsonify({'success': True, 'message': '人员删除成功'})
 
+@app.route('/api/personnel/export', methods=['GET'])
+def export_personnel():
+    """按需把人员表导出到 customers_data.json"""
+    return export_json_response('customers', '人员数据')
+
 # 天气类型API
 @app.route('/api/weather-types', methods=['GET'])
 def get_weather_types():
@@ -848,42 +1149,8 @@ def delete_template(template_id):
 # 创建JSON文件备份
 @app.route('/api/templates/export', methods=['GET'])
 def export_templates():
-    templates = Template.query.all()
-    result = []
-    
-    for template in templates:
-        template_data = {
-            'id': template.id,
-            'name': template.name,
-            'subject': template.subject,
-            'content': template.content,
-            'lastModified': template.last_modified.strftime('%Y-%m-%d'),
-            'type': template.weather_type.name if template.weather_type else '',
-            'isActive': template.is_active,
-            'targetRole': template.target_role
-        }
-        
-        # 处理附件信息，确保格式一致
-        if template.attachments:
-            try:
-                attachments = json.loads(template.attachments)
-                template_data['attachments'] = attachments
-            except:
-                template_data['attachments'] = []
-        else:
-            template_data['attachments'] = []
-            
-        result.append(template_data)
-    
-    # 保存到JSON文件
-    try:
-        with open('templates_data.json', 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
-        print(f"成功导出 {len(result)} 个模板到 templates_data.json")
-        return jsonify({'success': True, 'message': f'成功导出 {len(result)} 个模板到JSON文件'})
-    except Exception as e:
-        print(f"导出模板数据时出错: {str(e)}")
-        return jsonify({'success': False, 'message': f'导出模板失败: {str(e)}'}), 500
+    """按需把模板表导出到 templates_data.json"""
+    return export_json_response('templates', '模板')
 
 # 附件上传API
 @app.route('/api/templates/upload-attachment', methods=['POST'])
@@ -1018,23 +1285,35 @@ def delete_attachment():
         return jsonify({'success': False, 'message': f'删除附件失败: {str(e)}'}), 500
 
 # 预警规则API
+def serialize_alert_rule(rule):
+    return rule_to_dict({
+        'id': rule.id,
+        'type': rule.weather_type.name if rule.weather_type else '',
+        'condition': rule.condition,
+        'status': rule.status,
+        'alert_type': rule.alert_type,
+        'advance_time': rule.advance_time,
+        'created_at': rule.created_at
+    })
+
+def apply_alert_rule_data(rule, rule_data):
+    """把请求中的字段写入规则；未提交的状态、预警方式、提前天数与创建日期保留原值"""
+    rule.weather_type = get_weather_types_by_name([rule_data['type']])[0] if rule_data['type'] else None
+    rule.condition = rule_data['condition']
+    if 'status' in rule_data:
+        rule.status = rule_data['status']
+    if 'alertType' in rule_data:
+        rule.alert_type = rule_data['alertType']
+    if 'advanceTime' in rule_data:
+        advance_time = rule_data['advanceTime']
+        rule.advance_time = str(advance_time) if advance_time not in (None, '') else None
+    if 'createdAt' in rule_data:
+        rule.created_at = parse_json_date(rule_data['createdAt'])
+
 @app.route('/api/alert-rules', methods=['GET'])
 def get_alert_rules():
-    # 尝试从 JSON 文件读取预警规则数据
-    try:
-        with open('alert_rules.json', 'r', encoding='utf-8') as f:
-            rules = json.load(f)
-        print(f"成功读取预警规则数据: {len(rules)} 条规则")
-        return jsonify(rules)
-    except FileNotFoundError:
-        print("预警规则文件不存在")
-        return jsonify([])
-    except json.JSONDecodeError as e:
-        print(f"预警规则文件格式错误: {str(e)}")
-        return jsonify([])
-    except Exception as e:
-        print(f"读取预警规则时发生错误: {str(e)}")
-        return jsonify([]), 500
+    rules = AlertRule.query.options(selectinload(AlertRule.weather_type)).order_by(AlertRule.id).all()
+    return jsonify([serialize_alert_rule(rule) for rule in rules])
 
 @app.route('/api/alert-rules', methods=['POST'])
 def add_alert_rule():
@@ -1042,45 +1321,21 @@ def add_alert_rule():
     rule_data = request.json
     
     # 验证必要字段
-    if not all(key in rule_data for key in ['type', 'condition']):
+    if not rule_data or not all(key in rule_data for key in ['type', 'condition']):
         return jsonify({'error': '缺少必要字段'}), 400
     
-    # 读取现有规则
-    try:
-        with open('alert_rules.json', 'r', encoding='utf-8') as f:
-            rules = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        rules = []
-    
-    # 生成新ID
-    new_id = 1
-    if rules:
-        new_id = max(rule['id'] for rule in rules) + 1
-    
-    # 确保规则包含所有必要字段
-    rule_data['id'] = new_id
-    if 'createdAt' not in rule_data:
-        rule_data['createdAt'] = datetime.datetime.now().strftime('%Y-%m-%d')
-    if 'status' not in rule_data:
-        rule_data['status'] = '活跃'
-    
-    # 添加新规则
-    rules.append(rule_data)
-    
-    # 保存到文件
-    with open('alert_rules.json', 'w', encoding='utf-8') as f:
-        json.dump(rules, f, ensure_ascii=False, indent=2)
+    rule = AlertRule(status='活跃', created_at=datetime.date.today())
+    apply_alert_rule_data(rule, rule_data)
+    db.session.add(rule)
+    db.session.commit()
     
-    return jsonify(rule_data), 201
+    return jsonify(serialize_alert_rule(rule)), 201
 
 @app.route('/api/alert-rules/<int:rule_id>', methods=['PUT'])
 def update_alert_rule(rule_id):
     # 获取请求数据
     rule_data = request.json
     
-    # 记录请求数据，便于调试
-    print(f"收到更新预警规则请求，ID: {rule_id}, 数据: {rule_data}")
-    
     # 验证必要字段
     if not rule_data:
         print(f"请求数据为空，ID: {rule_id}")
@@ -1091,94 +1346,39 @@ def update_alert_rule(rule_id):
         print(f"缺少必要字段: {missing_keys}, ID: {rule_id}")
         return jsonify({'error': f'缺少必要字段: {missing_keys}'}), 400
     
-    # 读取现有规则
-    try:
-        with open('alert_rules.json', 'r', encoding='utf-8') as f:
-            rules = json.load(f)
-        print(f"成功读取预警规则文件，共 {len(rules)} 条规则")
-    except FileNotFoundError:
-        print("预警规则文件不存在")
-        return jsonify({'error': '找不到预警规则文件'}), 404
-    except json.JSONDecodeError as e:
-        print(f"预警规则文件格式错误: {str(e)}")
-        return jsonify({'error': f'预警规则文件格式错误: {str(e)}'}), 500
-    except Exception as e:
-        print(f"读取预警规则时发生错误: {str(e)}")
-        return jsonify({'error': f'读取预警规则时发生错误: {str(e)}'}), 500
-    
-    # 查找要更新的规则
-    rule_index = None
-    for i, rule in enumerate(rules):
-        if rule.get('id') == rule_id:
-            rule_index = i
-            break
-    
-    if rule_index is None:
+    rule = db.session.get(AlertRule, rule_id)
+    if rule is None:
         print(f"找不到ID为 {rule_id} 的预警规则")
         return jsonify({'error': f'找不到ID为{rule_id}的预警规则'}), 404
     
-    # 更新规则，保留原有ID和创建日期
-    rule_data['id'] = rule_id
-    if 'createdAt' not in rule_data and 'createdAt' in rules[rule_index]:
-        rule_data['createdAt'] = rules[rule_index]['createdAt']
-    
-    # 确保所有必要字段都存在
-    if 'status' not in rule_data:
-        rule_data['status'] = rules[rule_index].get('status', '活跃')
-    if 'alertType' not in rule_data:
-        rule_data['alertType'] = rules[rule_index].get('alertType', 'parameter')
-    
-    # 如果原规则中有advanceTime字段且用户提交的数据中没有，保留原有值
-    if 'advanceTime' in rules[rule_index] and 'advanceTime' not in rule_data:
-        rule_data['advanceTime'] = rules[rule_index]['advanceTime']
-    
-    # 更新规则
-    old_rule = rules[rule_index].copy()
-    rules[rule_index] = rule_data
-    
-    print(f"更新预警规则，ID: {rule_id}")
-    print(f"旧数据: {old_rule}")
-    print(f"新数据: {rule_data}")
-    
-    # 保存到文件
+    apply_alert_rule_data(rule, rule_data)
     try:
-        with open('alert_rules.json', 'w', encoding='utf-8') as f:
-            json.dump(rules, f, ensure_ascii=False, indent=2)
-        print(f"成功保存预警规则文件，共 {len(rules)} 条规则")
+        db.session.commit()
     except Exception as e:
+        db.session.rollback()
         print(f"保存预警规则时发生错误: {str(e)}")
         return jsonify({'error': f'保存预警规则时发生错误: {str(e)}'}), 500
     
-    return jsonify(rule_data)
+    print(f"更新预警规则，ID: {rule_id}")
+    return jsonify(serialize_alert_rule(rule))
 
 @app.route('/api/alert-rules/<int:rule_id>', methods=['DELETE'])
 def delete_alert_rule(rule_id):
-    # 读取现有规则
-    try:
-        with open('alert_rules.json', 'r', encoding='utf-8') as f:
-            rules = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return jsonify({'error': '找不到预警规则'}), 404
-    
-    # 查找要删除的规则
-    rule_index = None
-    for i, rule in enumerate(rules):
-        if rule.get('id') == rule_id:
-            rule_index = i
-            break
-    
-    if rule_index is None:
+    rule = db.session.get(AlertRule, rule_id)
+    if rule is None:
         return jsonify({'error': '找不到指定ID的预警规则'}), 404
     
-    # 删除规则
-    deleted_rule = rules.pop(rule_index)
-    
-    # 保存到文件
-    with open('alert_rules.json', 'w', encoding='utf-8') as f:
-        json.dump(rules, f, ensure_ascii=False, indent=2)
+    deleted_rule = serialize_alert_rule(rule)
+    db.session.delete(rule)
+    db.session.commit()
     
     return jsonify({'message': '预警规则删除成功', 'deleted': deleted_rule})
 
+@app.route('/api/alert-rules/export', methods=['GET'])
+def export_alert_rules():
+    """按需把预警规则表导出到 alert_rules.json"""
+    return export_json_response('rules', '预警规则')
+
 # 天气数据API
 @app.route('/api/weather', methods=['GET'])
 def get_weather():
@@ -1214,9 +1414,8 @@ def get_logs():
     show_test = request.args.get('show_test', 'false').lower() == 'true'
     
     try:
-        # 从 data.json 读取日志数据
-        with open('data.json', 'r', encoding='utf-8') as f:
-            logs = json.load(f)
+        # 从 data.json 读取日志数据（文件不存在或格式错误时为空）
+        logs = json_store.read_json('data.json', [])
         
         # 如果不显示测试记录，则过滤掉测试记录
         if not show_test:
@@ -1226,12 +1425,6 @@ def get_logs():
         logs.sort(key=lambda x: x['timestamp'], reverse=True)
         
         return jsonify(logs)
-    except FileNotFoundError:
-        # 如果文件不存在，返回空列表
-        return jsonify([])
-    except json.JSONDecodeError as e:
-        print(f"读取 data.json 失败: {str(e)}")
-        return jsonify([])
     except Exception as e:
         print(f"处理日志数据时出错: {str(e)}")
         return jsonify([])
@@ -1240,24 +1433,23 @@ def get_logs():
 def delete_log(log_id):
     """删除指定的日志记录"""
     try:
-        # 读取日志数据
-        with open('data.json', 'r', encoding='utf-8') as f:
-            logs = json.load(f)
-        
-        # 查找并删除指定ID的日志
-        found = False
-        for i, log in enumerate(logs):
-            if log['id'] == log_id:
-                logs.pop(i)
-                found = True
-                break
-        
-        if not found:
-            return jsonify({'success': False, 'message': '未找到指定日志记录'}), 404
-        
-        # 保存更新后的日志数据
-        with open('data.json', 'w', encoding='utf-8') as f:
-            json.dump(logs, f, ensure_ascii=False, indent=4)
+        with json_store.locked('data.json'):
+            # 读取日志数据
+            logs = json_store.read_json('data.json', [])
+            
+            # 查找并删除指定ID的日志
+            found = False
+            for i, log in enumerate(logs):
+                if log['id'] == log_id:
+                    logs.pop(i)
+                    found = True
+                    break
+            
+            if not found:
+                return jsonify({'success': False, 'message': '未找到指定日志记录'}), 404
+            
+            # 保存更新后的日志数据
+            json_store.write_json('data.json', logs)
         trim_json_file('data.json', 'data_log', max_entries=DATA_LOG_MAX_ENTRIES)
         
         return jsonify({'success': True, 'message': '日志记录已删除'})
@@ -1276,27 +1468,12 @@ def get_settings():
     if setting:
         first_alert_time = setting.first_alert_time or normalize_first_alert_time(setting.first_alert)
         first_alert_int = parse_first_alert_time_to_hour(first_alert_time) or setting.first_alert
-        settings_data = {
-            'emailSender': setting.email_sender,
-            'emailName': setting.email_name,
-            'smtpServer': setting.smtp_server,
-            'smtpPort': setting.smtp_port,
-            'smtpUsername': setting.smtp_username,
-            'smtpPassword': setting.smtp_password,
-            'weatherApiKey': setting.weather_api_key,
-            'retryCount': setting.retry_count,
-            'autoRetry': setting.auto_retry,
-            'adminNotifications': setting.admin_notifications,
-            'sendSummary': setting.send_summary,
-            'alertAdvanceTime': setting.alert_advance_time,
-            'warningInterval': setting.refresh_interval,
-            'firstalert': first_alert_int,
-            'firstAlertTime': first_alert_time,
-            'autoApproval': setting.auto_approval,  # 添加自动审批字段
-            'lastUpdated': setting.last_updated.isoformat() if setting.last_updated else None,
-            'lastTested': setting.last_tested.isoformat() if setting.last_tested else None,
-            'testResult': setting.test_result
-        }
+        # 与预警流程读取的设置项相同（包括 extra 中没有对应列的设置项）
+        settings_data = settings_to_dict(setting_row(setting))
+        settings_data['firstalert'] = first_alert_int
+        settings_data['firstAlertTime'] = first_alert_time
+        settings_data.setdefault('lastUpdated', None)
+        settings_data.setdefault('lastTested', None)
     
     # 如果数据库中没有数据，则尝试从JSON文件加载
     if not setting or not any(settings_data.values()):
@@ -1360,23 +1537,11 @@ def update_settings():
     setting.first_alert = parsed_hour if parsed_hour is not None else 6
     setting.auto_approval = data.get('autoApproval', False)  # 处理自动审批字段
     setting.last_updated = datetime.datetime.now()
+    merge_setting_extra(setting, data)
     
     db.session.add(setting)
     db.session.commit()
     
-    # 同时保存到JSON文件
-    try:
-        # 添加最后更新时间
-        data['lastUpdated'] = datetime.datetime.now().isoformat()
-        data['firstAlertTime'] = normalized_first_time
-        data['firstalert'] = parsed_hour if parsed_hour is not None else setting.first_alert
-        
-        with open(SETTINGS_JSON_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        print(f"设置已保存到JSON文件")
-    except Exception as e:
-        print(f"保存设置到JSON文件时出错: {e}")
-    
     # 如果预警时间相关设置发生变化，重启预警系统以立即生效
     if (
         old_interval != setting.refresh_interval
@@ -1385,34 +1550,13 @@ def update_settings():
         or old_alert_advance != setting.alert_advance_time
     ):
         try:
-            # 停止当前的预警系统
-            global stop_weather_alert, weather_alert_thread
-            if weather_alert_thread and weather_alert_thread.is_alive():
-                print("正在停止旧的预警线程...")
-                stop_weather_alert = True
-                
-                # 等待线程停止，最多等待10秒
-                wait_time = 0
-                while weather_alert_thread.is_alive() and wait_time < 10:
-                    time.sleep(1)
-                    wait_time += 1
-                    print(f"等待线程停止: {wait_time}秒...")
-                
-                if weather_alert_thread.is_alive():
-                    print("警告：旧线程在10秒内未能停止")
-                else:
-                    print("旧线程已成功停止")
+            # 调度器运行中时只需按新设置重新计算下次预警时间，否则启动调度器
+            if alert_scheduler.is_running():
+                next_run_at = alert_scheduler.reschedule('alert_cycle')
+                if next_run_at:
+                    print(f"预警时间已按新设置调整，下次预警: {next_run_at.strftime('%Y-%m-%d %H:%M:%S')}")
             else:
-                print("没有找到活动的预警线程，或线程已经停止")
-            
-            # 确保停止标志被重置
-            stop_weather_alert = False
-            
-            # 启动新的预警系统
-            print("正在启动新的预警线程...")
-            weather_alert_thread = Thread(target=run_weather_alert_background)
-            weather_alert_thread.daemon = True
-            weather_alert_thread.start()
+                start_alert_scheduling()
             print("预警系统已重启")
             
             return jsonify({
@@ -1433,6 +1577,11 @@ def update_settings():
     
     return jsonify({'message': '设置已更新', 'success': True, 'systemRestarted': False})
 
+@app.route('/api/settings/export', methods=['GET'])
+def export_settings():
+    """按需把系统设置导出到 settings.json"""
+    return export_json_response('settings', '系统设置')
+
 @app.route('/api/settings/test-email', methods=['POST'])
 def test_email_connection():
     data = request.json
@@ -1518,20 +1667,6 @@ def test_email_connection():
             db.session.commit()
             print(f"数据库中的最后测试时间已更新: {formatted_time}")
         
-        # 更新JSON文件中的最后测试时间
-        try:
-            with open(SETTINGS_JSON_FILE, 'r', encoding='utf-8') as f:
-                settings_data = json.load(f)
-            
-            settings_data['lastTested'] = current_time.isoformat()
-            settings_data['testResult'] = '成功'
-            
-            with open(SETTINGS_JSON_FILE, 'w', encoding='utf-8') as f:
-                json.dump(settings_data, f, ensure_ascii=False, indent=2)
-            print(f"JSON文件中的最后测试时间已更新: {formatted_time}")
-        except Exception as e:
-            print(f"更新JSON文件中的最后测试时间失败: {e}")
-        
         # 返回成功消息，包含更新的时间
         return jsonify({
             'success': True,
@@ -1550,19 +1685,6 @@ def test_email_connection():
             setting.test_result = '失败'
             db.session.commit()
         
-        # 记录失败状态到JSON文件
-        try:
-            with open(SETTINGS_JSON_FILE, 'r', encoding='utf-8') as f:
-                settings_data = json.load(f)
-            
-            settings_data['lastTested'] = current_time.isoformat()
-            settings_data['testResult'] = '失败'
-            
-            with open(SETTINGS_JSON_FILE, 'w', encoding='utf-8') as f:
-                json.dump(settings_data, f, ensure_ascii=False, indent=2)
-        except Exception as json_e:
-            print(f"更新JSON文件中的测试结果失败: {json_e}")
-        
         # 返回错误信息
         return jsonify({
             'success': False,
@@ -1570,11 +1692,15 @@ def test_email_connection():
         })
 
 # 天气API部分
-# 和风天气API配置
-WEATHER_CITY_API = "https://geoapi.qweather.com/v2/city/lookup"
-WEATHER_DAILY_API = "https://api.qweather.com/v7/weather/3d"
-WEATHER_HOURLY_API = "https://api.qweather.com/v7/weather/24h"
-HTTP_TIMEOUT = 15  # 外部HTTP请求超时时间（秒）
+# 天气数据提供方（和风天气或本地回放）见 weather_provider，此处仅保留并发与超时配置
+WEATHER_DAILY_DAYS = 3
+HTTP_TIMEOUT = HTTP_CONNECT_TIMEOUT + HTTP_READ_TIMEOUT  # 外部HTTP请求最长耗时（秒），超时配置见 http_client
+CITY_FETCH_WORKERS = 8  # 多城市并发拉取的线程数
+CITY_FETCH_TIMEOUT = HTTP_TIMEOUT * 2 + 5  # 单个城市（定位+天气）整体等待上限（秒）
+
+# 城市级并发池与上游请求池分开，避免城市任务等待子请求时占满同一个池导致死锁
+_city_fetch_executor = ThreadPoolExecutor(max_workers=CITY_FETCH_WORKERS, thread_name_prefix='city-fetch')
+_upstream_executor = ThreadPoolExecutor(max_workers=CITY_FETCH_WORKERS * 2, thread_name_prefix='qweather')
 
 # 从环境变量/数据库/配置文件读取天气API Key，避免硬编码泄露
 def get_weather_api_key():
@@ -1676,18 +1802,8 @@ def get_my_cities_weather():
         # 从JSON文件加载收藏的城市列表
         favorite_cities = load_favorite_cities()
         
-        # 获取每个收藏城市的天气数据
-        for city in favorite_cities:
-            # 获取城市ID
-            city_info = get_city_info(city)
-            if city_info:
-                city_id = city_info[0].get('id')
-                city_name = city_info[0].get('name')
-                
-                # 获取天气数据
-                weather_data = get_weather_data(city_id, city_name)
-                if weather_data.get("code") == "200":
-                    result["cities"].append(weather_data)
+        # 并发获取每个收藏城市的天气数据，部分城市失败或超时不影响其余城市
+        result["cities"], result["statuses"] = fetch_cities_weather(favorite_cities)
         
         end_time = datetime.datetime.now()
         total_duration = (end_time - start_time).total_seconds()
@@ -1705,17 +1821,8 @@ def get_popular_cities_weather():
         start_time = datetime.datetime.now()
         print(f"[{start_time.strftime('%Y-%m-%d %H:%M:%S')}] 开始获取热门城市天气数据")
         
-        for city in POPULAR_CITIES[:5]:  # 只获取前5个城市，避免请求过多
-            # 获取城市ID
-            city_info = get_city_info(city)
-            if city_info:
-                city_id = city_info[0].get('id')
-                city_name = city_info[0].get('name')
-                
-                # 获取天气数据
-                weather_data = get_weather_data(city_id, city_name)
-                if weather_data.get("code") == "200":
-                    result["cities"].append(weather_data)
+        # 只获取前5个城市，避免请求过多
+        result["cities"], result["statuses"] = fetch_cities_weather(POPULAR_CITIES[:5])
         
         end_time = datetime.datetime.now()
         total_duration = (end_time - start_time).total_seconds()
@@ -1725,20 +1832,63 @@ def get_popular_cities_weather():
         app.logger.error(f"获取常用城市天气时出错: {str(e)}")
         return jsonify({"code": "500", "message": f"服务器错误: {str(e)}"}), 500
 
+def _fetch_city_weather_task(city):
+    """在线程池中获取单个城市的天气数据（定位 + 天气），返回(天气数据, 状态)"""
+    with app.app_context():
+        city_info = get_city_info(city)
+        if not city_info:
+            return None, {"city": city, "status": "not_found", "message": f"未找到城市: {city}"}
+        
+        city_id = city_info[0].get('id')
+        city_name = city_info[0].get('name')
+        weather_data = get_weather_data(city_id, city_name)
+        if weather_data.get("code") == "200":
+            return weather_data, {"city": city, "status": "ok"}
+        return None, {"city": city, "status": "error", "message": weather_data.get("message", "获取天气数据失败")}
+
+def fetch_cities_weather(cities, timeout=CITY_FETCH_TIMEOUT):
+    """
+    并发获取多个城市的天气数据
+    
+    参数:
+    - cities: 城市名称列表
+    - timeout: 整体等待上限（秒），超时的城市标记为 timeout
+    
+    返回:
+    - (成功城市的天气数据列表, 每个城市的状态列表)，顺序与输入一致
+    """
+    if not cities:
+        return [], []
+    
+    futures = [_city_fetch_executor.submit(_fetch_city_weather_task, city) for city in cities]
+    wait(futures, timeout=timeout)
+    
+    results = []
+    statuses = []
+    for city, future in zip(cities, futures):
+        if not future.done():
+            # 超时的任务在后台继续执行，完成后会写入缓存供下次请求使用
+            statuses.append({"city": city, "status": "timeout", "message": f"获取超时（>{timeout}秒）"})
+            continue
+        try:
+            weather_data, status = future.result()
+        except Exception as e:
+            app.logger.error(f"获取城市天气时出错: {city} - {str(e)}")
+            statuses.append({"city": city, "status": "error", "message": str(e)})
+            continue
+        if weather_data:
+            results.append(weather_data)
+        statuses.append(status)
+    return results, statuses
+
 import json
 import os
 
 def load_favorite_cities():
-    try:
-        with open('favorite_cities.json', 'r') as f:
-            data = json.load(f)
-            return data.get('favorite_cities', [])
-    except FileNotFoundError:
-        return []
+    return json_store.read_json('favorite_cities.json', {}).get('favorite_cities', [])
 
 def save_favorite_cities(cities):
-    with open('favorite_cities.json', 'w') as f:
-        json.dump({'favorite_cities': cities}, f, indent=2)
+    json_store.write_json('favorite_cities.json', {'favorite_cities': cities})
 
 @app.route('/api/weather/add-favorite', methods=['POST'])
 def add_favorite_city():
@@ -1756,10 +1906,11 @@ def add_favorite_city():
             return jsonify({"success": False, "message": f"未找到城市: {city}"}), 404
         
         # 添加到收藏列表（如果不存在）
-        favorite_cities = load_favorite_cities()
-        if city not in favorite_cities:
-            favorite_cities.append(city)
-            save_favorite_cities(favorite_cities)
+        with json_store.locked('favorite_cities.json'):
+            favorite_cities = load_favorite_cities()
+            if city not in favorite_cities:
+                favorite_cities.append(city)
+                save_favorite_cities(favorite_cities)
         
         return jsonify({"success": True, "message": "添加成功"})
     except Exception as e:
@@ -1777,13 +1928,14 @@ def remove_favorite_city():
             return jsonify({"success": False, "message": "城市名称不能为空"}), 400
         
         # 从收藏列表中移除
-        favorite_cities = load_favorite_cities()
-        if city in favorite_cities:
-            favorite_cities.remove(city)
-            save_favorite_cities(favorite_cities)
-            return jsonify({"success": True, "message": "移除成功"})
-        else:
-            return jsonify({"success": False, "message": "该城市未在收藏列表中"}), 404
+        with json_store.locked('favorite_cities.json'):
+            favorite_cities = load_favorite_cities()
+            if city in favorite_cities:
+                favorite_cities.remove(city)
+                save_favorite_cities(favorite_cities)
+                return jsonify({"success": True, "message": "移除成功"})
+            else:
+                return jsonify({"success": False, "message": "该城市未在收藏列表中"}), 404
     except Exception as e:
         app.logger.error(f"移除收藏城市时出错: {str(e)}")
         return jsonify({"success": False, "message": f"服务器错误: {str(e)}"}), 500
@@ -1843,28 +1995,18 @@ def get_city_info(city_name):
         print(f"请求城市信息API | 城市: {city_name}")
         
         # 获取API Key，未配置时直接返回空结果
-        api_key = get_weather_api_key()
-        if not api_key:
+        provider = get_weather_provider(get_weather_api_key())
+        if provider.requires_api_key and not provider.api_key:
             app.logger.warning("未配置天气API Key，城市查询返回空结果")
             return []
 
-        # 请求参数
-        params = {
-            "location": city_name,
-            "key": api_key
-        }
-        
-        # 发送GET请求
-        response = requests.get(WEATHER_CITY_API, params=params, timeout=HTTP_TIMEOUT)
-        
-        # 检查响应状态
-        if response.status_code == 200:
-            data = response.json()
-            if data.get("code") == "200":
-                location_data = data.get("location", [])
-                # 将结果存入缓存
-                weather_cache.set(cache_key, location_data)
-                return location_data
+        # 查询城市
+        data = provider.lookup_city(city_name)
+        if data.get("code") == "200":
+            location_data = data.get("location", [])
+            # 将结果存入缓存
+            weather_cache.set(cache_key, location_data)
+            return location_data
         
         return []
     except Exception as e:
@@ -1874,7 +2016,7 @@ def get_city_info(city_name):
 # 导入天气缓存模块
 from weather_cache import WeatherCache
 
-# 初始化天气缓存
+# 初始化天气缓存（缓存库在首次读写时才创建）
 weather_cache = WeatherCache(cache_duration=7200)  # 缓存2小时
 
 def get_weather_data(city_id, city_name):
@@ -1895,35 +2037,23 @@ def get_weather_data(city_id, city_name):
     
     try:
         # 获取API Key，未配置时直接返回错误信息
-        api_key = get_weather_api_key()
-        if not api_key:
+        provider = get_weather_provider(get_weather_api_key())
+        if provider.requires_api_key and not provider.api_key:
             return {"code": "500", "message": "天气API Key未配置"}
 
+        # 每日与每小时预报互不依赖，逐小时请求放入上游线程池与每日请求并行发出
+        hourly_future = _upstream_executor.submit(provider.hourly_forecast, city_id)
+        
         # 获取每日天气预报
-        daily_params = {
-            "location": city_id,
-            "key": api_key
-        }
-        daily_response = requests.get(WEATHER_DAILY_API, params=daily_params, timeout=HTTP_TIMEOUT)
+        daily_data = provider.daily_forecast(city_id, WEATHER_DAILY_DAYS)
         
         # 获取每小时天气预报
-        hourly_params = {
-            "location": city_id,
-            "key": api_key
-        }
-        hourly_response = requests.get(WEATHER_HOURLY_API, params=hourly_params, timeout=HTTP_TIMEOUT)
+        hourly_data = hourly_future.result()
         
         # 检查响应
         response_time = datetime.datetime.now()
         duration = (response_time - start_time).total_seconds()
         
-        if daily_response.status_code != 200 or hourly_response.status_code != 200:
-            print(f"[{response_time.strftime('%H:%M:%S')}] API请求失败 | 城市: {city_name} | 耗时: {duration:.2f}秒")
-            return {"code": "500", "message": "获取天气数据失败"}
-        
-        daily_data = daily_response.json()
-        hourly_data = hourly_response.json()
-        
         if daily_data.get("code") != "200" or hourly_data.get("code") != "200":
             print(f"[{response_time.strftime('%H:%M:%S')}] API返回错误 | 城市: {city_name} | 耗时: {duration:.2f}秒")
             return {"code": "500", "message": "天气API返回错误"}
@@ -1960,9 +2090,8 @@ def clean_expired_cache():
 
 # 初始化数据库和添加示例数据
 def init_db():
-    """初始化数据库"""
-    # 清理过期缓存
-    clean_expired_cache()
+    """初始化数据库（只由启动脚本显式调用；过期缓存由调度器的 cache_cleanup 任务定期清理）"""
+    ensure_user_file()
     ensure_first_alert_time_column()
     
     # 删除旧的数据库文件
@@ -1981,6 +2110,7 @@ def init_db():
         # 创建新的数据库表
         try:
             db.create_all()
+            sqlite_db.apply_migrations(_get_db_path())
             print("已创建/更新数据库表")
         except Exception as e:
             print(f"创建数据库表时出错: {str(e)}")
@@ -2016,77 +2146,11 @@ def init_db():
         
         # 初始化模板数据
         print("\n4. 初始化模板数据...")
-        try:
-            # 读取templates_data.json
-            with open('templates_data.json', 'r', encoding='utf-8') as f:
-                templates_data = json.load(f)
-            
-            # 导入模板数据
-            for template_data in templates_data:
-                # 检查是否已存在相同名称的模板
-                existing = Template.query.filter_by(name=template_data['name']).first()
-                if existing:
-                    print(f"  - 模板 '{template_data['name']}' 已存在，更新...")
-                    
-                    # 更新现有模板
-                    existing.subject = template_data['subject']
-                    existing.content = template_data['content']
-                    existing.is_active = template_data.get('isActive', True)
-                    
-                    # 更新附件
-                    if 'attachments' in template_data:
-                        existing.attachments = template_data['attachments'] if isinstance(template_data['attachments'], str) else json.dumps(template_data['attachments'])
-                    
-                    # 更新关联的天气类型
-                    if 'type' in template_data and template_data['type']:
-                        # 查找或创建天气类型
-                        weather_type = WeatherType.query.filter_by(name=template_data['type']).first()
-                        if not weather_type:
-                            weather_type = WeatherType(name=template_data['type'])
-                            db.session.add(weather_type)
-                            db.session.flush()
-                        
-                        existing.weather_type_id = weather_type.id
-                else:
-                    print(f"  - 创建新模板 '{template_data['name']}'")
-                    
-                    # 处理天气类型
-                    weather_type_id = None
-                    if 'type' in template_data and template_data['type']:
-                        # 查找或创建天气类型
-                        weather_type = WeatherType.query.filter_by(name=template_data['type']).first()
-                        if not weather_type:
-                            weather_type = WeatherType(name=template_data['type'])
-                            db.session.add(weather_type)
-                            db.session.flush()
-                            weather_type_id = weather_type.id
-                        else:
-                            weather_type_id = weather_type.id
-                    
-                    # 处理附件字段
-                    attachments = None
-                    if 'attachments' in template_data:
-                        attachments = template_data['attachments'] if isinstance(template_data['attachments'], str) else json.dumps(template_data['attachments'])
-                    
-                    # 创建新模板
-                    new_template = Template(
-                        name=template_data['name'],
-                        subject=template_data['subject'],
-                        content=template_data['content'],
-                        weather_type_id=weather_type_id,
-                        is_active=template_data.get('isActive', True),
-                        attachments=attachments
-                    )
-                    db.session.add(new_template)
-            
-            # 提交更改
-            db.session.commit()
-            print(f"  - 成功导入 {len(templates_data)} 个模板")
-        except FileNotFoundError:
-            print("  - templates_data.json 文件不存在，跳过模板初始化")
-        except Exception as e:
-            print(f"  - 导入模板数据时出错: {str(e)}")
-            db.session.rollback()
+        import_templates_from_json()
+        
+        # 初始化预警规则
+        print("\n4.1 初始化预警规则...")
+        import_alert_rules_from_json()
         
         # 同步系统设置
         print("\n5. 同步系统设置...")
@@ -2113,315 +2177,394 @@ def init_db():
             db.session.add(setting)
             db.session.commit()
             print("  - 设置同步失败，已写入默认设置")
+    
+    # JSON 数据导入完成后开始维护数据修订号：预警流程从此直接读取数据库中的设置、人员、规则与模板
+    try:
+        conn = sqlite_db.connect(_get_db_path())
+        install_revision_tracking(conn)
+        conn.commit()
+        conn.close()
+        print("\n6. 预警流程已改为直接读取数据库")
+    except Exception as e:
+        print(f"创建数据修订号触发器时出错: {e}")
 
 # 通知相关API
+NOTIFICATION_PAGE_SIZE = 50  # 分页查询的默认每页条数
+NOTIFICATION_MAX_PAGE_SIZE = 200
+NOTIFICATION_FILTER_ARGS = ('region', 'weather_type', 'is_test', 'date', 'date_from', 'date_to')
+# 汇总接口支持的分组字段
+NOTIFICATION_SUMMARY_GROUPS = {
+    'region': Notification.region,
+    'weather_type': Notification.weather_type,
+    'is_test': Notification.is_test,
+    'date': func.date(Notification.timestamp)
+}
+
+def notification_filter_args(args):
+    """把查询参数转换为 pending_notification_query 的筛选条件（is_test 接受 true/false/1/0）"""
+    filters = {key: args[key] for key in NOTIFICATION_FILTER_ARGS if args.get(key)}
+    if 'is_test' in filters:
+        filters['is_test'] = filters['is_test'].lower() in ('1', 'true', 'yes')
+    return {'filter': filters}
+
+def encode_notification_cursor(notification):
+    return f"{notification.timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')}|{notification.id}"
+
+def decode_notification_cursor(cursor):
+    """解析分页游标，格式错误时抛出 ValueError"""
+    timestamp, _, row_id = cursor.rpartition('|')
+    return datetime.datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S.%f'), int(row_id)
+
 @app.route('/api/notifications', methods=['GET'])
 def get_notifications():
-    """获取所有待处理的通知"""
-    notifications = Notification.query.filter_by(status='pending').order_by(Notification.timestamp.desc()).all()
-    return jsonify([n.to_dict() for n in notifications])
-
-@app.route('/api/notifications/<notification_id>/approve', methods=['POST'])
-def approve_notification(notification_id):
+    """
+    获取待处理的通知，按时间倒序
+    - region / weather_type / is_test / date（YYYY-MM-DD）/ date_from / date_to：筛选条件
+    - limit / cursor：分页（按时间与ID定位，翻页不受新通知插入影响），指定任一参数时返回
+      {items, next_cursor, limit}，next_cursor 为空表示没有更多；都不指定时返回全部通知的列表
+    """
     try:
-        # 首先从数据库中获取通知详情
-        notification = Notification.query.filter_by(notification_id=notification_id).first()
-        if not notification:
-            return jsonify({'success': False, 'message': '找不到对应的通知'}), 404
-        
-        # 从通知中获取邮件数据
-        try:
-            email_data = json.loads(notification.email_data)
-        except:
-            return jsonify({'success': False, 'message': '通知数据格式错误'}), 500
-        
-        print(f"从通知中获取到的邮件数据: {json.dumps(email_data, ensure_ascii=False)}")
-        
-        # 构建发送请求
-        send_data = {
-            'to': email_data.get('to_email', ''),
-            'subject': email_data.get('subject', ''),
-            'content': email_data.get('content', '')
-        }
-        
-        # 验证必要字段
-        if not send_data['to'] or not send_data['subject'] or not send_data['content']:
-            print(f"邮件数据不完整: to={send_data['to']}, subject={send_data['subject']}, content长度={len(send_data['content']) if send_data['content'] else 0}")
-            
-            # 尝试补全数据
-            if not send_data['content']:
-                default_content = f"""
-尊敬的{email_data.get('to_name', '客户')}：
+        query = pending_notification_query(notification_filter_args(request.args))
+        cursor = request.args.get('cursor')
+        position = decode_notification_cursor(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'success': False, 'message': '日期或游标格式错误'}), 400
+    query = query.order_by(Notification.timestamp.desc(), Notification.id.desc())
+    
+    if position is None and 'limit' not in request.args:
+        return jsonify([n.to_dict() for n in query])
+    
+    limit = min(max(request.args.get('limit', NOTIFICATION_PAGE_SIZE, type=int), 1), NOTIFICATION_MAX_PAGE_SIZE)
+    if position:
+        # 与 ix_notification_status (status, timestamp) 的顺序一致，直接从游标位置继续扫描索引
+        query = query.filter(tuple_(Notification.timestamp, Notification.id) < position)
+    items = query.limit(limit + 1).all()
+    return jsonify({
+        'items': [n.to_dict() for n in items[:limit]],
+        'next_cursor': encode_notification_cursor(items[limit - 1]) if len(items) > limit else None,
+        'limit': limit
+    })
 
-我们检测到您所在的{email_data.get('region', '未知地区')}地区将在{email_data.get('alert_date', '近期')}出现{email_data.get('weather_type', '异常')}天气情况。
+@app.route('/api/notifications/summary', methods=['GET'])
+def get_notifications_summary():
+    """
+    待处理通知的数量汇总：{total, groups: {字段: [{value, count}]}}，不返回通知内容
+    - group_by：逗号分隔的分组字段（region、weather_type、is_test、date），默认全部
+    - 筛选条件与 GET /api/notifications 相同
+    """
+    group_by = [g.strip() for g in request.args.get('group_by', ','.join(NOTIFICATION_SUMMARY_GROUPS)).split(',') if g.strip()]
+    unknown = [g for g in group_by if g not in NOTIFICATION_SUMMARY_GROUPS]
+    if unknown:
+        return jsonify({'success': False, 'message': f"不支持的分组字段: {', '.join(unknown)}"}), 400
+    try:
+        query = pending_notification_query(notification_filter_args(request.args))
+    except ValueError:
+        return jsonify({'success': False, 'message': '日期格式错误'}), 400
+    
+    groups = {}
+    for name in group_by:
+        column = NOTIFICATION_SUMMARY_GROUPS[name]
+        rows = query.with_entities(column, func.count()).group_by(column).order_by(func.count().desc()).all()
+        groups[name] = [{'value': value, 'count': count} for value, count in rows]
+    return jsonify({
+        'success': True,
+        'total': query.with_entities(func.count()).scalar(),
+        'groups': groups
+    })
 
-具体情况：{email_data.get('condition', '未知条件')}
+def pending_notification_query(data):
+    """
+    按批量操作请求选出待处理的通知：
+    - ids: 通知ID列表
+    - filter: 筛选条件，可包含 is_test、region、weather_type、date（某一天）、date_from、date_to
+      （YYYY-MM-DD，含当天）；空对象表示全部待处理通知
+    两者都没有时返回 None；日期格式错误时抛出 ValueError
+    """
+    query = Notification.query.filter_by(status='pending')
+    ids = data.get('ids')
+    if isinstance(ids, list):
+        return query.filter(Notification.notification_id.in_([str(i) for i in ids]))
+    filters = data.get('filter')
+    if not isinstance(filters, dict):
+        return None
+    if filters.get('is_test') is not None:
+        query = query.filter(Notification.is_test == bool(filters['is_test']))
+    if filters.get('region'):
+        query = query.filter(Notification.region == filters['region'])
+    if filters.get('weather_type'):
+        query = query.filter(Notification.weather_type == filters['weather_type'])
+    if filters.get('date'):
+        filters = dict(filters, date_from=filters['date'], date_to=filters['date'])
+    if filters.get('date_from'):
+        date_from = datetime.datetime.strptime(filters['date_from'], '%Y-%m-%d')
+        query = query.filter(Notification.timestamp >= date_from)
+    if filters.get('date_to'):
+        date_to = datetime.datetime.strptime(filters['date_to'], '%Y-%m-%d') + datetime.timedelta(days=1)
+        query = query.filter(Notification.timestamp < date_to)
+    return query
+
+def fill_notification_email(email_data):
+    """补全通知邮件数据中缺失的主题与正文，返回新的字典；没有收件人时返回 None"""
+    if not email_data.get('to_email'):
+        return None
+    email = dict(email_data)
+    if not email.get('content'):
+        email['content'] = f"""
+尊敬的{email.get('to_name', '客户')}：
+
+我们检测到您所在的{email.get('region', '未知地区')}地区将在{email.get('alert_date', '近期')}出现{email.get('weather_type', '异常')}天气情况。
+
+具体情况：{email.get('condition', '未知条件')}
 
 请注意防范，确保安全。
 
 此致
 天气预警系统
                 """
-                send_data['content'] = default_content
-                print(f"已添加默认内容: {default_content}")
-            
-            if not send_data['subject']:
-                default_subject = f"{email_data.get('region', '未知地区')}地区{email_data.get('weather_type', '异常')}天气预警通知"
-                send_data['subject'] = default_subject
-                print(f"已添加默认主题: {default_subject}")
-            
-            # 再次验证
-            if not send_data['to'] or not send_data['subject'] or not send_data['content']:
-                return jsonify({'success': False, 'message': '邮件数据不完整，缺少收件人、主题或内容'}), 400
-        
-        # 添加附件信息
-        if 'attachments' in email_data and email_data['attachments']:
-            send_data['attachments'] = email_data['attachments']
-            print(f"发送邮件包含附件: {email_data['attachments']}")
-        
-        # 导入邮件发送函数
-        from send_email_api import prepare_email_content
-        
-        # 尝试直接发送邮件
+    if not email.get('subject'):
+        email['subject'] = f"{email.get('region', '未知地区')}地区{email.get('weather_type', '异常')}天气预警通知"
+    return email
+
+def remove_from_pending_emails(emails):
+    """从 re-Emile.json 中一次性移除一批邮件（按收件人、主题、地区、天气类型匹配）"""
+    keys = {(e.get('to_email'), e.get('subject'), e.get('region', ''), e.get('weather_type', '')) for e in emails}
+    if not keys:
+        return
+    try:
+        with json_store.locked('re-Emile.json'):
+            pending = json_store.read_json('re-Emile.json', [])
+            remaining = [
+                e for e in pending
+                if (e.get('to_email'), e.get('subject'), e.get('region'), e.get('weather_type')) not in keys
+            ]
+            if len(remaining) == len(pending):
+                return
+            json_store.write_json('re-Emile.json', remaining)
+        trim_json_file('re-Emile.json', 're_emile', max_entries=PENDING_EMAIL_MAX_ENTRIES)
+        print(f"已从 re-Emile.json 中移除 {len(pending) - len(remaining)} 封邮件")
+    except Exception as e:
+        print(f"更新 re-Emile.json 失败: {str(e)}")
+
+def queue_notifications(row_ids):
+    """
+    把通知加入邮件任务队列（共用一个 batch_id）并标记为 sending，由发送线程发送；调用方负责提交事务。
+    通知先用带 status='pending' 条件的 UPDATE 领取，并发的审批请求中只有一个能领取到同一条通知，
+    已被领取或已不是待处理状态的通知跳过；邮件数据无效的通知恢复为 pending
+
+    Args:
+        row_ids: 通知的数据库主键列表（按此顺序加入队列）
+
+    Returns:
+        (batch_id, 加入队列的任务ID列表, 邮件数据无效的通知ID列表)
+    """
+    now = datetime.datetime.now()
+    batch_id = f"batch_{now.strftime('%Y%m%d%H%M%S%f')}_{random.randint(1000, 9999)}"
+    order = {row_id: index for index, row_id in enumerate(row_ids)}
+    claimed = []
+    for start in range(0, len(row_ids), NOTIFICATION_BATCH_SIZE):
+        claimed.extend(db.session.execute(
+            update(Notification)
+            .where(Notification.id.in_(row_ids[start:start + NOTIFICATION_BATCH_SIZE]), Notification.status == 'pending')
+            .values(status='sending')
+            .returning(Notification.id, Notification.notification_id, Notification.email_data, Notification.is_test)
+            .execution_options(synchronize_session=False)
+        ).all())
+    claimed.sort(key=lambda row: order[row.id])
+    
+    tasks = []
+    invalid_ids = []
+    invalid_rows = []
+    for notification in claimed:
         try:
-            # 从设置中读取邮件配置
-            with open(SETTINGS_JSON_FILE, 'r', encoding='utf-8') as f:
-                settings = json.load(f)
-            
-            sender = settings.get('emailSender', '')
-            name = settings.get('emailName', '')
-            server = settings.get('smtpServer', '')
-            port = settings.get('smtpPort', 587)
-            username = settings.get('smtpUsername', '')
-            password = settings.get('smtpPassword', '')
-            
-            # 验证邮件配置
-            if not all([sender, server, port]):
-                return jsonify({
-                    'success': False,
-                    'message': '邮件服务器配置不完整，请检查设置'
-                })
-            
-            # 创建邮件
-            import smtplib
-            import mimetypes
-            from email.mime.text import MIMEText
-            from email.mime.multipart import MIMEMultipart
-            from email.mime.application import MIMEApplication
-            from email.utils import formataddr
-            import email.utils
-            
-            message = MIMEMultipart('mixed')
-            message['From'] = formataddr((name, sender))
-            message['To'] = send_data['to']
-            message['Subject'] = send_data['subject']
-            message['Date'] = email.utils.formatdate(localtime=True)
-            message['Message-ID'] = email.utils.make_msgid()
-            
-            # 处理内容
-            email_content = prepare_email_content(send_data['content'], is_html=True)
-            msg = MIMEText(email_content, 'html', 'utf-8')
-            message.attach(msg)
-            
-            # 处理附件
-            attachments = send_data.get('attachments', [])
-            if attachments:
-                # 如果附件是字符串，尝试解析它
-                if isinstance(attachments, str):
-                    try:
-                        if attachments.lower() != "null":
-                            attachments = json.loads(attachments)
-                        else:
-                            attachments = []
-                    except Exception as e:
-                        print(f"解析附件字符串失败: {str(e)}")
-                        attachments = []
-                
-                # 确保attachments是列表
-                if not isinstance(attachments, list):
-                    attachments = [attachments]
-                
-                print(f"邮件包含 {len(attachments)} 个附件")
-                
-                # 遍历附件列表，添加到邮件中
-                for attachment_name in attachments:
-                    # 附件完整路径
-                    attachment_path = os.path.join(os.getcwd(), 'templates', attachment_name)
-                    
-                    if os.path.exists(attachment_path):
-                        try:
-                            # 获取文件MIME类型
-                            content_type, encoding = mimetypes.guess_type(attachment_path)
-                            if content_type is None or encoding is not None:
-                                content_type = 'application/octet-stream'
-                            
-                            # 读取文件内容并创建附件部分
-                            with open(attachment_path, 'rb') as f:
-                                file_data = f.read()
-                                
-                                if content_type.startswith('image/'):
-                                    # 对于图片，使用MIMEImage
-                                    from email.mime.image import MIMEImage
-                                    attachment = MIMEImage(file_data, _subtype=content_type.split('/')[-1])
-                                else:
-                                    # 对于其他类型，使用MIMEApplication
-                                    attachment = MIMEApplication(file_data, _subtype=content_type.split('/')[-1])
-                            
-                            # 设置附件名，使用文件名编码保护中文名
-                            try:
-                                attachment.add_header('Content-Disposition', 'attachment', 
-                                                     filename=('utf-8', '', attachment_name))
-                            except:
-                                # 如果编码方式不支持，使用普通方式
-                                attachment.add_header('Content-Disposition', 'attachment', 
-                                                     filename=attachment_name)
-                            
-                            # 确保添加Content-ID，这对嵌入图片很重要
-                            attachment.add_header('Content-ID', f'<{attachment_name}>')
-                            
-                            # 添加到邮件中
-                            message.attach(attachment)
-                            print(f"  - 已添加附件: {attachment_name}")
-                            
-                        except Exception as e:
-                            print(f"  - 添加附件 {attachment_name} 时出错: {str(e)}")
-                    else:
-                        print(f"  - 警告：附件文件不存在: {attachment_path}")
-            
-            # 连接到SMTP服务器并发送邮件
-            print(f"正在连接SMTP服务器: {server}:{port}")
-            
-            # 根据端口选择不同的连接方式
-            if port == 465:
-                # 端口465使用SSL连接
-                print("使用SSL连接 (端口465)")
-                import ssl
-                context = ssl.create_default_context()
-                smtp = smtplib.SMTP_SSL(server, port, context=context, timeout=30)
-            else:
-                # 端口25和587使用普通连接
-                print(f"使用普通连接 (端口{port})")
-                smtp = smtplib.SMTP(server, port, timeout=30)
-                smtp.ehlo()
-                
-                # 只有端口587才启动STARTTLS
-                if port == 587:
-                    print("启动STARTTLS加密")
-                    smtp.starttls()
-                    smtp.ehlo()
-                elif port == 25:
-                    print("端口25使用明文连接，不启动TLS")
-            
-            # 尝试登录（如果服务器支持认证）
-            try:
-                if username and password:
-                    print(f"尝试使用用户名登录: {username}")
-                    smtp.login(username, password)
-                    print("登录成功")
-                else:
-                    print("未提供用户名密码，跳过认证")
-            except smtplib.SMTPNotSupportedError:
-                print("服务器不支持认证，继续执行")
-                # 如果服务器不支持认证，继续执行
-                pass
-            except Exception as login_error:
-                print(f"登录失败: {str(login_error)}")
-                raise
-            
-            # 发送邮件
-            print(f"正在发送邮件到 {send_data['to']}...")
-            smtp.sendmail(sender, [send_data['to']], message.as_string())
-            print(f"邮件发送成功")
-            
-            # 关闭连接
-            smtp.quit()
-            
-            result = {'success': True, 'message': '邮件发送成功'}
-        except Exception as e:
-            print(f"发送邮件失败: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({'success': False, 'message': f'发送失败: {str(e)}'}), 500
-        
-        if result.get('success'):
-            # 更新通知状态
-            notification.status = 'approved'
-            db.session.commit()
-            
-            # 生成新的日志ID
-            try:
-                with open('data.json', 'r', encoding='utf-8') as f:
-                    log_data = json.load(f)
-                new_id = max([log['id'] for log in log_data]) + 1 if log_data else 1
-            except (FileNotFoundError, json.JSONDecodeError):
-                log_data = []
-                new_id = 1
-            
-            # 创建新的日志记录
-            log_entry = {
-                'id': new_id,
-                'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'recipient': email_data['to_email'],
-                'to_name': email_data.get('to_name', ''),
-                'weather_type': email_data.get('weather_type', ''),
-                'region': email_data.get('region', ''),
-                'subject': email_data['subject'],
-                'content': email_data['content'],
-                'alert_date': email_data.get('alert_date', ''),
-                'condition': email_data.get('condition', ''),
-                'category': email_data.get('category', ''),
-                'status': '已发送',
-                'is_test': notification.is_test
-            }
-            
-            # 添加新的日志记录
-            log_data.append(log_entry)
-            
-            # 保存更新后的日志数据
-            try:
-                with open('data.json', 'w', encoding='utf-8') as f:
-                    json.dump(log_data, f, ensure_ascii=False, indent=4)
-                trim_json_file('data.json', 'data_log', max_entries=DATA_LOG_MAX_ENTRIES)
-            except Exception as e:
-                print(f"保存日志到 data.json 失败: {str(e)}")
-                return jsonify({'success': False, 'message': f'邮件已发送，但保存日志失败: {str(e)}'}), 500
-            
-            # 从 re-Emile.json 中移除已发送的邮件
-            try:
-                # 读取当前的邮件列表
-                with open('re-Emile.json', 'r', encoding='utf-8') as f:
-                    emails = json.load(f)
-                
-                # 根据邮件地址和内容精确匹配要删除的邮件
-                updated_emails = []
-                for e in emails:
-                    # 比较关键字段以确定是否为同一封邮件
-                    if (e['to_email'] == email_data['to_email'] and 
-                        e['subject'] == email_data['subject'] and
-                        e['region'] == email_data.get('region', '') and
-                        e['weather_type'] == email_data.get('weather_type', '')):
-                        # 这是要删除的邮件，跳过它
-                        continue
-                    updated_emails.append(e)
-                
-                # 保存更新后的文件
-                with open('re-Emile.json', 'w', encoding='utf-8') as f:
-                    json.dump(updated_emails, f, ensure_ascii=False, indent=4)
-                trim_json_file('re-Emile.json', 're_emile', max_entries=PENDING_EMAIL_MAX_ENTRIES)
+            email = fill_notification_email(json.loads(notification.email_data))
+        except (TypeError, ValueError):
+            email = None
+        if email is None:
+            invalid_ids.append(notification.notification_id)
+            invalid_rows.append(notification.id)
+            continue
+        tasks.append({
+            'task_id': f"{batch_id}_{notification.id}",
+            'status': 'pending',
+            'payload': json.dumps(email, ensure_ascii=False),
+            'is_test': notification.is_test,
+            'attempts': 0,
+            'created_at': now,
+            'updated_at': now,
+            'batch_id': batch_id,
+            'notification_id': notification.notification_id
+        })
+    
+    if tasks:
+        db.session.execute(MailTask.__table__.insert(), tasks)
+    for start in range(0, len(invalid_rows), NOTIFICATION_BATCH_SIZE):
+        db.session.execute(
+            update(Notification)
+            .where(Notification.id.in_(invalid_rows[start:start + NOTIFICATION_BATCH_SIZE]))
+            .values(status='pending')
+            .execution_options(synchronize_session=False)
+        )
+    return batch_id, [task['task_id'] for task in tasks], invalid_ids
 
-                print(f"已从 re-Emile.json 中移除邮件: {email_data['to_email']}")
-            except Exception as e:
-                print(f"更新 re-Emile.json 失败: {str(e)}")
-            
-            return jsonify({'success': True, 'message': '邮件已发送并记录'})
-        else:
-            return jsonify({'success': False, 'message': f'发送失败: {result.get("message", "未知错误")}'}), 500
-            
+@app.route('/api/notifications/approve', methods=['POST'])
+def approve_notifications_batch():
+    """
+    批量确认发送：请求体为 {"ids": [...]} 或 {"filter": {...}}（见 pending_notification_query）。
+    选中的通知在一个事务中写入邮件任务队列并标记为 sending，由发送线程复用 SMTP 连接发送；
+    返回 202 与 batch_id，可通过 /api/notifications/jobs/<batch_id> 查询进度
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        query = pending_notification_query(data)
+    except ValueError:
+        return jsonify({'success': False, 'message': '日期格式应为 YYYY-MM-DD'}), 400
+    if query is None:
+        return jsonify({'success': False, 'message': '请提供通知ID列表（ids）或筛选条件（filter）'}), 400
+    
+    try:
+        row_ids = [row.id for row in query.with_entities(Notification.id).order_by(Notification.timestamp)]
+        batch_id, tasks, invalid_ids = queue_notifications(row_ids)
+        db.session.commit()
     except Exception as e:
+        db.session.rollback()
+        print(f"批量确认通知失败: {str(e)}")
+        return jsonify({'success': False, 'message': f'操作失败: {str(e)}'}), 500
+    
+    if not tasks:
+        return jsonify({
+            'success': False,
+            'message': '没有可发送的待处理通知',
+            'invalid': invalid_ids
+        }), 404 if not invalid_ids else 400
+    
+    wake_mail_sender()
+    event_bus.publish('notifications.updated', {'status': 'sending', 'count': len(tasks), 'batch_id': batch_id})
+    print(f"已将 {len(tasks)} 个通知加入发送队列: {batch_id}")
+    return jsonify({
+        'success': True,
+        'message': f'已将 {len(tasks)} 封邮件加入发送队列',
+        'batch_id': batch_id,
+        'queued': len(tasks),
+        'invalid': invalid_ids,
+        'status_url': f'/api/notifications/jobs/{batch_id}'
+    }), 202
+
+@app.route('/api/notifications/reject', methods=['POST'])
+def reject_notifications_batch():
+    """批量拒绝发送：请求体同 /api/notifications/approve；通知状态在一个事务中更新，re-Emile.json 只改写一次"""
+    data = request.get_json(silent=True) or {}
+    try:
+        query = pending_notification_query(data)
+    except ValueError:
+        return jsonify({'success': False, 'message': '日期格式应为 YYYY-MM-DD'}), 400
+    if query is None:
+        return jsonify({'success': False, 'message': '请提供通知ID列表（ids）或筛选条件（filter）'}), 400
+    
+    try:
+        rows = query.with_entities(Notification.id, Notification.email_data).all()
+        row_ids = [row.id for row in rows]
+        for start in range(0, len(row_ids), NOTIFICATION_BATCH_SIZE):
+            db.session.execute(
+                update(Notification)
+                .where(Notification.id.in_(row_ids[start:start + NOTIFICATION_BATCH_SIZE]))
+                .values(status='rejected')
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'操作失败: {str(e)}'}), 500
+    
+    emails = []
+    for row in rows:
+        try:
+            emails.append(json.loads(row.email_data))
+        except (TypeError, ValueError):
+            continue
+    remove_from_pending_emails(emails)
+    if row_ids:
+        event_bus.publish('notifications.updated', {'status': 'rejected', 'count': len(row_ids)})
+    return jsonify({'success': True, 'message': f'已拒绝发送 {len(row_ids)} 封邮件', 'rejected': len(row_ids)})
+
+@app.route('/api/notifications/jobs/<batch_id>', methods=['GET'])
+def get_notification_job(batch_id):
+    """批量发送任务的进度：各状态数量，以及发送失败的通知与原因（最多 MAIL_JOB_MAX_FAILURES 条）"""
+    counts = dict(
+        db.session.query(MailTask.status, func.count(MailTask.id))
+        .filter(MailTask.batch_id == batch_id)
+        .group_by(MailTask.status)
+        .all()
+    )
+    total = sum(counts.values())
+    if not total:
+        return jsonify({'success': False, 'message': '发送任务不存在'}), 404
+    failures = (
+        db.session.query(MailTask.notification_id, MailTask.error)
+        .filter(MailTask.batch_id == batch_id, MailTask.status == 'failed')
+        .limit(MAIL_JOB_MAX_FAILURES)
+        .all()
+    )
+    waiting = counts.get('pending', 0) + counts.get('processing', 0)
+    return jsonify({
+        'success': True,
+        'batch_id': batch_id,
+        'total': total,
+        'pending': counts.get('pending', 0),
+        'processing': counts.get('processing', 0),
+        'sent': counts.get('sent', 0),
+        'failed': counts.get('failed', 0),
+        'done': waiting == 0,
+        'failures': [{'notification_id': row.notification_id, 'error': row.error} for row in failures]
+    })
+
+@app.route('/api/notifications/<notification_id>/approve', methods=['POST'])
+def approve_notification(notification_id):
+    """
+    确认发送单个通知：加入邮件任务队列后立即返回 202 与 task_id，由发送线程发送（不在请求线程中连接 SMTP），
+    发送结果通过 /api/mail-tasks/<task_id> 查询
+    """
+    notification = Notification.query.filter_by(notification_id=notification_id).first()
+    if not notification:
+        return jsonify({'success': False, 'message': '找不到对应的通知'}), 404
+    
+    try:
+        # 只领取仍为 pending 的通知：已在队列中、已发送或已拒绝的通知不会再次加入
+        batch_id, tasks, invalid_ids = queue_notifications([notification.id])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
         print(f"处理通知时出错: {str(e)}")
-        import traceback
-        traceback.print_exc()
         return jsonify({'success': False, 'message': f'发送失败: {str(e)}'}), 500
+    if invalid_ids:
+        return jsonify({'success': False, 'message': '邮件数据不完整，缺少收件人'}), 400
+    if not tasks:
+        return jsonify({'success': False, 'message': '该通知已在发送队列中或已处理'}), 409
+    
+    wake_mail_sender()
+    event_bus.publish('notifications.updated', {'status': 'sending', 'count': 1, 'batch_id': batch_id})
+    return jsonify({
+        'success': True,
+        'message': '邮件已加入发送队列',
+        'task_id': tasks[0],
+        'batch_id': batch_id,
+        'status_url': f'/api/mail-tasks/{tasks[0]}'
+    }), 202
+
+@app.route('/api/mail-tasks/<task_id>', methods=['GET'])
+def get_mail_task(task_id):
+    """邮件任务的发送状态：pending、processing、sent 或 failed（附失败原因）"""
+    task = MailTask.query.filter_by(task_id=task_id).first()
+    if not task:
+        return jsonify({'success': False, 'message': '邮件任务不存在'}), 404
+    return jsonify({
+        'success': True,
+        'task_id': task.task_id,
+        'notification_id': task.notification_id,
+        'status': task.status,
+        'error': task.error,
+        'attempts': task.attempts,
+        'updated_at': task.updated_at.strftime('%Y-%m-%d %H:%M:%S') if task.updated_at else None
+    })
 
 @app.route('/api/notifications/<notification_id>/reject', methods=['POST'])
 def reject_notification(notification_id):
@@ -2437,32 +2580,10 @@ def reject_notification(notification_id):
         # 更新通知状态
         notification.status = 'rejected'
         db.session.commit()
+        event_bus.publish('notifications.updated', {'status': 'rejected', 'count': 1})
         
         # 从 re-Emile.json 中移除已拒绝的邮件
-        try:
-            with open('re-Emile.json', 'r', encoding='utf-8') as f:
-                emails = json.load(f)
-            
-            # 根据邮件地址和内容精确匹配要删除的邮件
-            updated_emails = []
-            for e in emails:
-                # 比较关键字段以确定是否为同一封邮件
-                if (e['to_email'] == email_data['to_email'] and 
-                    e['subject'] == email_data['subject'] and
-                    e['region'] == email_data.get('region', '') and
-                    e['weather_type'] == email_data.get('weather_type', '')):
-                    # 这是要删除的邮件，跳过它
-                    continue
-                updated_emails.append(e)
-            
-            # 保存更新后的文件
-            with open('re-Emile.json', 'w', encoding='utf-8') as f:
-                json.dump(updated_emails, f, ensure_ascii=False, indent=4)
-            trim_json_file('re-Emile.json', 're_emile', max_entries=PENDING_EMAIL_MAX_ENTRIES)
-
-            print(f"已从 re-Emile.json 中移除已拒绝的邮件: {email_data['to_email']}")
-        except Exception as e:
-            print(f"更新 re-Emile.json 失败: {str(e)}")
+        remove_from_pending_emails([email_data])
         
         return jsonify({'success': True, 'message': '已拒绝发送邮件'})
     except Exception as e:
@@ -2492,8 +2613,7 @@ def clear_queues():
 
     def _clear_json_file(path):
         try:
-            with open(path, 'w', encoding='utf-8') as f:
-                json.dump([], f, ensure_ascii=False, indent=4)
+            json_store.write_json(path, [])
             cleared_files.append(path)
         except Exception as err:
             file_errors.append(f"{path}: {err}")
@@ -2512,6 +2632,49 @@ def clear_queues():
         response['file_errors'] = file_errors
     return jsonify(response)
 
+# ===== 事件推送（Server-Sent Events） =====
+
+SSE_HEARTBEAT_SECONDS = 15  # 没有事件时发送注释行的间隔（秒），防止代理断开空闲连接
+SSE_MAX_SECONDS = 300  # 单个连接的最长时间（秒），到期后由浏览器自动重连，释放工作线程
+SSE_RETRY_MS = 3000  # 浏览器断线后重连的等待时间（毫秒）
+
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    """
+    推送增量事件（事件类型见 event_bus），前端据此刷新对应数据
+
+    查询参数：types 逗号分隔的事件类型（默认全部）；lastEventId 上次收到的事件ID
+    （浏览器重连时通过 Last-Event-ID 请求头自动提供）
+    """
+    types = [t.strip() for t in request.args.get('types', '').split(',') if t.strip()]
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        last_id = None
+    subscriber = event_bus.subscribe(last_id, types or None)
+    if subscriber is None:
+        return jsonify({'success': False, 'message': '事件连接数已达上限，请稍后重试'}), 503
+
+    def generate():
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            deadline = time.monotonic() + SSE_MAX_SECONDS
+            while time.monotonic() < deadline:
+                if subscriber.overflowed:
+                    # 积压过多：通知客户端重新拉取完整数据，断开后重连
+                    yield event_bus.format_sse(event_bus.Event(subscriber.last_id, 'reset', {}))
+                    return
+                event = subscriber.get(timeout=SSE_HEARTBEAT_SECONDS)
+                yield event_bus.format_sse(event) if event else ": ping\n\n"
+        finally:
+            subscriber.close()
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/weather-alert/test', methods=['POST'])
 def run_weather_alert_test():
     """运行天气预警测试"""
@@ -2555,11 +2718,7 @@ def run_weather_alert_test():
                 if send_alerts(alerts, is_test=True):
                     ensure_first_alert_time_column()
                     # 读取待处理邮件用于展示/通知
-                    try:
-                        with open('re-Emile.json', 'r', encoding='utf-8') as f:
-                            emails = json.load(f)
-                    except Exception:
-                        emails = []
+                    emails = json_store.read_json('re-Emile.json', [])
 
                     if emails:
                         # 按地区分组显示预警信息
@@ -2608,12 +2767,16 @@ def run_weather_alert_test():
                                 title=f"{duplicate_prefix}天气预警: {email.get('weather_type', '')} - {email.get('region', '')}",
                                 content=f"检测到{email.get('region', '')}地区可能出现{email.get('weather_type', '')}天气情况，是否发送预警邮件？",
                                 email_data=json.dumps(email),
-                                is_test=True
+                                is_test=True,
+                                region=email.get('region', ''),
+                                weather_type=email.get('weather_type', '')
                             )
                             db.session.add(notification)
                             new_notifications.append(notification)
                         
                         db.session.commit()
+                        if new_notifications:
+                            event_bus.publish('notifications.created', {'count': len(new_notifications), 'is_test': True})
                     
                     # 检查是否需要发送管理员通知
                     setting = Setting.query.first()
@@ -2671,83 +2834,148 @@ def run_weather_alert_test():
         print(f"发送预警时出错: {str(e)}")
         return jsonify({'success': False, 'message': f'发送预警时出错: {str(e)}'}), 500
 
-def check_duplicate_alert_in_7_days(recipient_email, region, weather_type, condition=None, alert_date=None, category=None):
+def load_duplicate_index(log_file='data.json'):
+    """读取日志建立7天内重复预警的索引（见 weather_alert_main.build_duplicate_index），文件不存在或损坏时为空索引"""
+    from weather_alert_main import build_duplicate_index
+    return build_duplicate_index(json_store.read_json(log_file, []))
+
+def check_duplicate_alert_in_7_days(recipient_email, region, weather_type, condition=None, alert_date=None, category=None,
+                                    duplicate_index=None):
     """
     检查7天内是否已发送过相同的预警邮件（同邮箱+地区+类型+条件+类别）。
     注意：不使用 alert_date（预警日期）参与去重，避免每天预报日期滚动/区间预测导致重复发送。
+    批量判断时传入 load_duplicate_index() 建立的索引，避免每封邮件重新读取日志。
     """
     try:
-        seven_days_ago = datetime.datetime.now() - datetime.timedelta(days=7)
-        
-        try:
-            with open('data.json', 'r', encoding='utf-8') as f:
-                log_data = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return False  # 没有历史记录，不是重复预警
-        
-        for log in log_data:
-            try:
-                log_time = datetime.datetime.strptime(log.get('timestamp', ''), '%Y-%m-%d %H:%M:%S')
-            except Exception:
-                continue
-            if log_time < seven_days_ago:
-                continue
-            
-            if log.get('recipient', '') != recipient_email:
-                continue
-            if log.get('region', '') != region:
-                continue
-            if log.get('weather_type', '') != weather_type:
-                continue
-            # 条件/类别如果任一方缺失则不作为阻断条件（兼容旧日志）
-            log_condition = (log.get('condition', '') or '').strip()
-            current_condition = (condition or '').strip()
-            if log_condition and current_condition and log_condition != current_condition:
-                continue
-            log_category = (log.get('category', '') or '').strip()
-            current_category = (category or '').strip()
-            if log_category and current_category and log_category != current_category:
-                continue
-            
-            if log.get('status', '').startswith('已发送') or log.get('status', '').startswith('已记录（重复预警'):
-                print(f"  发现7天内重复预警: {recipient_email} - {region} - {weather_type} (上次发送时间: {log.get('timestamp')})")
-                return True
+        from weather_alert_main import check_duplicate_alert
+        if duplicate_index is None:
+            duplicate_index = load_duplicate_index()
+        email_data = {
+            'to_email': recipient_email,
+            'region': region,
+            'weather_type': weather_type,
+            'condition': condition,
+            'category': category
+        }
+        if check_duplicate_alert(email_data, None, duplicate_index):
+            print(f"  发现7天内重复预警: {recipient_email} - {region} - {weather_type}")
+            return True
         return False
     except Exception as e:
         print(f"检查重复预警时出错: {str(e)}")
         return False  # 出错时默认不是重复预警，允许发送
 
+def create_alert_notifications(emails, is_test=False, should_stop=None, batch_size=NOTIFICATION_BATCH_SIZE):
+    """
+    手动审批模式下批量创建通知：先用内存索引一次性去重，再按 batch_size 分批写入（每批一个事务）。
+    某批写入失败时逐条重试，仍然失败的通知追加到 pending_notifications.json。
+
+    Args:
+        emails: 待发送邮件列表（re-Emile.json 的内容）
+        should_stop: 可选回调，返回 True 时在下一批写入前停止
+
+    Returns:
+        已创建（包括写入备用文件）的通知ID列表
+    """
+    from weather_alert_main import check_duplicate_alert
+    duplicate_index = load_duplicate_index()
+    created_at = datetime.datetime.now()
+    id_prefix = f"{'test' if is_test else 'alert'}_{created_at.strftime('%Y%m%d%H%M%S%f')}"
+    rows = []
+    for seq, email in enumerate(emails):
+        # 重复预警不进入通知中心
+        if email.get('is_duplicate') or check_duplicate_alert(email, None, duplicate_index):
+            print(f"跳过重复预警，不创建通知: {email['to_name']} ({email['to_email']})")
+            continue
+        rows.append({
+            'notification_id': f"{id_prefix}_{seq:04d}_{email['to_email']}",
+            'timestamp': created_at,
+            'recipient': f"{email['to_name']} ({email['to_email']})",
+            'title': f"天气预警: {email['weather_type']} - {email['region']}",
+            'content': f"检测到{email['region']}地区可能出现{email['weather_type']}天气情况，是否发送预警邮件？",
+            'status': 'pending',
+            'email_data': json.dumps(email),
+            'is_test': is_test,
+            'region': email.get('region', ''),
+            'weather_type': email.get('weather_type', '')
+        })
+
+    created = []
+    failed = []
+    insert = Notification.__table__.insert()
+    for start in range(0, len(rows), batch_size):
+        if should_stop and should_stop():
+            print("处理通知过程中收到停止信号，停止创建剩余通知")
+            break
+        batch = rows[start:start + batch_size]
+        try:
+            db.session.execute(insert, batch)
+            db.session.commit()
+            created.extend(row['notification_id'] for row in batch)
+            continue
+        except Exception as batch_err:
+            db.session.rollback()
+            print(f"批量创建通知失败，改为逐条写入: {str(batch_err)}")
+        # 逐条重试，单条失败不影响同批其他通知
+        for row in batch:
+            try:
+                db.session.execute(insert, [row])
+                db.session.commit()
+                created.append(row['notification_id'])
+            except Exception as notify_err:
+                db.session.rollback()
+                print(f"创建通知失败: {row['notification_id']} - {str(notify_err)}")
+                failed.append(row)
+
+    inserted = len(created)
+    if failed:
+        # 备用方案：追加到JSON文件，不重写已有内容
+        notifications_file = 'pending_notifications.json'
+        try:
+            append_json_array(notifications_file, [
+                dict(row, timestamp=row['timestamp'].strftime('%Y-%m-%d %H:%M:%S'), email_data=json.loads(row['email_data']))
+                for row in failed
+            ], prefix='pending_notifications', max_entries=PENDING_NOTIFICATION_MAX_ENTRIES)
+            created.extend(row['notification_id'] for row in failed)
+            print(f"已将 {len(failed)} 个通知保存到文件: {notifications_file}")
+        except Exception as file_err:
+            print(f"保存通知到文件失败: {str(file_err)}")
+
+    print(f"通知写入完成: 待处理 {len(emails)} 封，跳过重复 {len(emails) - len(rows)} 封，"
+          f"写入数据库 {inserted} 个，写入备用文件 {len(created) - inserted} 个")
+    if inserted:
+        event_bus.publish('notifications.created', {'count': inserted, 'is_test': is_test})
+    return created
+
+def next_log_id():
+    """data.json 中下一条日志的ID"""
+    log_data = json_store.read_json('data.json', [])
+    return max([log.get('id', 0) for log in log_data]) + 1 if log_data else 1
+
 # 自动审批发送辅助：从任务表或旧文件消费待发邮件
 def process_mail_tasks_and_send(is_test, auto_mode_label="自动审批"):
     """
     读取 mail_task 中 pending 任务发送邮件，状态更新并写日志。
     兼容旧的 re-Emile.json（仅在没有任务时兜底）。
     """
-    # 生成新的日志ID
-    try:
-        with open('data.json', 'r', encoding='utf-8') as f:
-            log_data = json.load(f)
-        new_id = max([log['id'] for log in log_data]) + 1 if log_data else 1
-    except (FileNotFoundError, json.JSONDecodeError):
-        log_data = []
-        new_id = 1
+    # 生成新的日志ID；本轮的日志结束时一次追加到 data.json
+    new_id = next_log_id()
+    new_logs = []
 
     tasks = claim_mail_tasks(is_test=is_test)
     processed_from_tasks = bool(tasks)
     legacy_emails = []
     if not tasks:
-        try:
-            with open('re-Emile.json', 'r', encoding='utf-8') as f:
-                legacy_emails = json.load(f)
-        except Exception:
-            legacy_emails = []
+        legacy_emails = json_store.read_json('re-Emile.json', [])
 
     sent_count = 0
     failed_count = 0
     duplicate_count = 0
+    # 本轮只读取一次日志建立重复预警索引
+    duplicate_index = load_duplicate_index()
 
     def handle_email(email, task_id=None):
-        nonlocal new_id, sent_count, failed_count, duplicate_count, log_data
+        nonlocal new_id, sent_count, failed_count, duplicate_count
         try:
             is_duplicate_in_7_days = check_duplicate_alert_in_7_days(
                 email.get('to_email'), 
@@ -2755,26 +2983,12 @@ def process_mail_tasks_and_send(is_test, auto_mode_label="自动审批"):
                 email.get('weather_type', ''),
                 email.get('condition', ''),
                 email.get('alert_date', ''),
-                email.get('category', '')
+                email.get('category', ''),
+                duplicate_index
             )
             
             if is_duplicate_in_7_days:
-                log_entry = {
-                    'id': new_id,
-                    'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'recipient': email.get('to_email'),
-                    'to_name': email.get('to_name', ''),
-                    'weather_type': email.get('weather_type', ''),
-                    'region': email.get('region', ''),
-                    'subject': email.get('subject'),
-                    'content': email.get('content'),
-                    'alert_date': email.get('alert_date', ''),
-                    'condition': email.get('condition', ''),
-                    'category': email.get('category', ''),
-                    'status': '已记录（重复预警）',
-                    'is_test': is_test
-                }
-                log_data.append(log_entry)
+                new_logs.append(mail_log_entry(new_id, email, '已记录（重复预警）', is_test))
                 new_id += 1
                 duplicate_count += 1
                 if task_id:
@@ -2795,22 +3009,7 @@ def process_mail_tasks_and_send(is_test, auto_mode_label="自动审批"):
                 result = response.get_json()
             
             if result and result.get('success'):
-                log_entry = {
-                    'id': new_id,
-                    'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'recipient': email.get('to_email'),
-                    'to_name': email.get('to_name', ''),
-                    'weather_type': email.get('weather_type', ''),
-                    'region': email.get('region', ''),
-                    'subject': email.get('subject'),
-                    'content': email.get('content'),
-                    'alert_date': email.get('alert_date', ''),
-                    'condition': email.get('condition', ''),
-                    'category': email.get('category', ''),
-                    'status': '已发送',
-                    'is_test': is_test
-                }
-                log_data.append(log_entry)
+                new_logs.append(mail_log_entry(new_id, email, '已发送', is_test))
                 new_id += 1
                 sent_count += 1
                 if task_id:
@@ -2841,9 +3040,7 @@ def process_mail_tasks_and_send(is_test, auto_mode_label="自动审批"):
 
     # 保存日志数据
     try:
-        with open('data.json', 'w', encoding='utf-8') as f:
-            json.dump(log_data, f, ensure_ascii=False, indent=4)
-        trim_json_file('data.json', 'data_log', max_entries=DATA_LOG_MAX_ENTRIES)
+        append_json_array('data.json', new_logs, prefix='data_log', max_entries=DATA_LOG_MAX_ENTRIES)
     except Exception as e:
         print(f"保存日志到 data.json 失败: {str(e)}")
 
@@ -2851,34 +3048,127 @@ def process_mail_tasks_and_send(is_test, auto_mode_label="自动审批"):
     if processed_from_tasks:
         try:
             backup_if_has_data('re-Emile.json', 're_emile')
-            with open('re-Emile.json', 'w', encoding='utf-8') as f:
-                json.dump([], f, ensure_ascii=False, indent=4)
+            json_store.write_json('re-Emile.json', [])
             print("已清空 re-Emile.json（以 mail_task 队列为准）")
         except Exception as e:
             print(f"清空 re-Emile.json 失败: {str(e)}")
     
     print(f"\n{auto_mode_label}发送完成: 成功 {sent_count} 封，失败 {failed_count} 封，重复预警 {duplicate_count} 封")
     print("======================================")
-# 全局变量用于控制后台任务
-weather_alert_thread = None
-stop_weather_alert = False
-
-def run_weather_alert_background():
-    """后台运行天气预警主程序"""
-    global stop_weather_alert
-    
-    # 导入天气预警主程序
-    from weather_alert_main import (
-        get_customer_regions,
-        fetch_weather_data,
-        check_alert_conditions,
-        send_alerts,
-        calculate_next_alert_time
+    return {'sent': sent_count, 'failed': failed_count, 'duplicate': duplicate_count}
+
+def mail_log_entry(log_id, email, status, is_test):
+    """data.json 中的一条发送日志"""
+    return {
+        'id': log_id,
+        'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'recipient': email.get('to_email'),
+        'to_name': email.get('to_name', ''),
+        'weather_type': email.get('weather_type', ''),
+        'region': email.get('region', ''),
+        'subject': email.get('subject'),
+        'content': email.get('content'),
+        'alert_date': email.get('alert_date', ''),
+        'condition': email.get('condition', ''),
+        'category': email.get('category', ''),
+        'status': status,
+        'is_test': is_test
+    }
+
+def record_mail_task_results(results):
+    """
+    保存一批排队邮件的发送结果：任务与通知状态在一个事务中更新（发送失败的通知回到待处理，可再次确认），
+    发送成功的邮件追加到 data.json，并从 re-Emile.json 中移除
+
+    Args:
+        results: [(任务, 邮件数据, 错误信息或 None), ...]
+    """
+    now = datetime.datetime.now()
+    table = MailTask.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.task_id == db.bindparam('b_task_id'))
+        .values(status=db.bindparam('b_status'), error=db.bindparam('b_error'), updated_at=now),
+        [
+            {'b_task_id': task.task_id, 'b_status': 'sent' if error is None else 'failed', 'b_error': error}
+            for task, _, error in results
+        ]
     )
+    for status, ok in (('approved', True), ('pending', False)):
+        notification_ids = [task.notification_id for task, _, error in results if (error is None) == ok]
+        if notification_ids:
+            db.session.execute(
+                update(Notification)
+                .where(Notification.notification_id.in_(notification_ids), Notification.status == 'sending')
+                .values(status=status)
+                .execution_options(synchronize_session=False)
+            )
+    db.session.commit()
+    event_bus.publish('mail_task.updated', {
+        'tasks': [
+            {
+                'task_id': task.task_id,
+                'notification_id': task.notification_id,
+                'status': 'sent' if error is None else 'failed',
+                'error': error
+            }
+            for task, _, error in results
+        ],
+        'sent': sum(1 for _, _, error in results if error is None),
+        'failed': sum(1 for _, _, error in results if error is not None)
+    })
     
-    print("=== 天气预警系统后台任务启动 ===\n")
-    
-    # 创建应用上下文
+    sent = [(task, email) for task, email, error in results if error is None]
+    if not sent:
+        return
+    try:
+        new_id = next_log_id()
+        append_json_array('data.json', [
+            mail_log_entry(new_id + i, email, '已发送', bool(task.is_test)) for i, (task, email) in enumerate(sent)
+        ], prefix='data_log', max_entries=DATA_LOG_MAX_ENTRIES)
+    except Exception as e:
+        print(f"保存日志到 data.json 失败: {str(e)}")
+    remove_from_pending_emails([email for _, email in sent])
+
+def send_approved_mail_tasks():
+    """发送审批后排队的邮件，直到队列为空：每批共用一个 SMTP 连接，结果按批保存"""
+    with app.app_context():
+        while not mail_sender.stopping:
+            tasks = claim_approved_mail_tasks()
+            if not tasks:
+                return
+            settings = get_snapshot().settings or {}
+            config_error = smtp_config_error(settings)
+            results = []
+            with SmtpSession(settings) as session:
+                for task in tasks:
+                    email = None
+                    try:
+                        email = json.loads(task.payload)
+                        if config_error:
+                            raise ValueError(config_error)
+                        message = build_email_message(
+                            settings, email['to_email'], email['subject'], email['content'], email.get('attachments')
+                        )
+                        session.send(email['to_email'], message)
+                        results.append((task, email, None))
+                    except Exception as e:
+                        results.append((task, email, str(e)))
+            record_mail_task_results(results)
+            sent_count = sum(1 for _, _, error in results if error is None)
+            print(f"排队邮件发送完成: 成功 {sent_count} 封，失败 {len(results) - sent_count} 封")
+
+# 后台调度器：预警检查、缓存清理、日志保留共用一个定时堆
+WEATHER_CACHE_CLEANUP_INTERVAL = 3600  # 天气缓存清理间隔（秒）
+LOG_RETENTION_DAYS = 30  # JSON 备份文件保留天数
+LOG_RETENTION_TIME = (3, 30)  # 每天执行日志保留任务的时刻（时, 分）
+SETTINGS_WATCH_INTERVAL = 60  # 检查预警时间设置变化的间隔（秒），设置可能由其他进程修改
+MAIL_SEND_INTERVAL = 300  # 发送线程检查遗留排队邮件的间隔（秒）；新加入队列时会立即唤醒
+LEADER_DEMOTE_WAIT_SECONDS = 60  # 失去主实例身份时等待进行中的预警检查结束的最长时间（秒），之后才释放租约
+
+def prepare_alert_database():
+    """调度器启动时检查数据库表结构与写入权限（只执行一次）"""
+    ensure_first_alert_time_column()
     with app.app_context():
         # 检查数据库权限并尝试修复
         try:
@@ -2902,8 +3192,8 @@ def run_weather_alert_background():
                     os.chmod(db_path, 0o666)
                     print(f"已设置数据库文件权限: {db_path}")
                     
-                    # 测试数据库连接
-                    db.session.execute(text("PRAGMA journal_mode=WAL"))  # 使用WAL模式减少锁定问题
+                    # 测试数据库连接（WAL 等连接参数由 sqlite_db 统一设置）
+                    db.session.execute(text("SELECT 1"))
                     db.session.commit()
                 except Exception as perm_err:
                     print(f"设置数据库文件权限失败: {str(perm_err)}")
@@ -2952,279 +3242,294 @@ def run_weather_alert_background():
             except Exception as reinit_err:
                 print(f"重新初始化数据库失败: {str(reinit_err)}")
                 print("将改为使用JSON文件存储通知")
-        
-        while not stop_weather_alert:
+    
+    # 发送上次退出前未发送完的排队邮件
+    wake_mail_sender()
+
+def alert_schedule_settings(setting):
+    """预警时间相关的设置项"""
+    return {
+        'firstalert': setting.first_alert,
+        'firstAlertTime': setting.first_alert_time,
+        'warningInterval': setting.refresh_interval
+    }
+
+def sync_region_schedule(setting, now=None):
+    """按当前地区、地区检查计划与全局设置更新逐地区检查索引"""
+    from weather_alert_main import get_customer_regions
+    from region_schedule import get_region_schedule_index, load_schedule_profiles
+
+    schedule = get_region_schedule_index()
+    schedule.sync(get_customer_regions(), load_schedule_profiles(), alert_schedule_settings(setting), now)
+    return schedule
+
+def next_alert_run_time(now):
+    """读取当前设置，计算下一次预警检查时间（最近一个地区到期的时间）"""
+    from weather_alert_main import calculate_next_alert_time
+
+    with app.app_context():
+        setting = Setting.query.first()
+        if not setting:
+            print("Error: 无法加载配置")
+            return None
+        next_due_at = sync_region_schedule(setting, now).next_due_at()
+        if next_due_at is None:
+            # 还没有任何地区时按全局时间点检查
+            return calculate_next_alert_time(alert_schedule_settings(setting), now=now)
+        # 到期时间已过（例如服务停机期间）时尽快执行
+        return max(next_due_at, now)
+
+def run_alert_cycle():
+    """执行一轮天气预警检查"""
+    if not alert_leader.is_leader():
+        print("本实例不是主实例，跳过本轮预警检查")
+        return
+
+    from alert_pipeline import run_alert_pipeline, run_sharded_alert_cycle, get_shard_count
+
+    cycle = None  # 本轮检查的汇总，结束时通过 alert_cycle.finished 事件推送
+    with app.app_context():
+        try:
+            # 加载配置
+            setting = Setting.query.first()
+            if not setting:
+                print("Error: 无法加载配置")
+                return
+
+            print("=== 开始执行预警检查 ===\n")
+            
+            # 根据预警提前时间自动判断预报时间范围
+            alert_advance_days = setting.alert_advance_time
+            forecast_hours = alert_advance_days * 24
+            print(f"根据配置的提前预警天数: {alert_advance_days}天，系统将检查{forecast_hours}小时预报")
+            
+            # 只检查已到期的地区：高优先级计划的地区排在前面
+            cycle_started = datetime.datetime.now()
+            schedule = sync_region_schedule(setting, cycle_started)
+            regions = schedule.pop_due(cycle_started)
+            if not regions:
+                print("当前没有到期需要检查的地区")
+                return
+            print(f"本轮到期需要检查的地区: {len(regions)}个")
+            cycle = {'regions': len(regions), 'started_at': cycle_started.strftime('%Y-%m-%d %H:%M:%S')}
+            event_bus.publish('alert_cycle.started', cycle)
+
             try:
-                ensure_first_alert_time_column()
-                # 加载配置
-                setting = Setting.query.first()
-                if not setting:
-                    print("Error: 无法加载配置")
-                    break
-                
-                # 计算下一次预警时间
-                next_alert_time = calculate_next_alert_time({
-                    'firstalert': setting.first_alert,
-                    'firstAlertTime': setting.first_alert_time,
-                    'warningInterval': setting.refresh_interval
-                })
-                current_time = datetime.datetime.now()
-                
-                # 如果还没到预警时间，等待
-                if current_time < next_alert_time:
-                    wait_seconds = (next_alert_time - current_time).total_seconds()
-                    print(f"下次预警时间: {next_alert_time.strftime('%Y-%m-%d %H:%M:%S')}")
-                    print(f"等待 {int(wait_seconds/3600)} 小时 {int((wait_seconds%3600)/60)} 分钟...\n")
+                if get_shard_count() > 1:
+                    # 地区按哈希分片，在多个进程中并行执行流水线
+                    result = run_sharded_alert_cycle(regions, forecast_hours, is_test=False)
+                else:
+                    # 流水线执行：获取天气、规则判断、写入邮件任务三个阶段同时进行
+                    result = run_alert_pipeline(
+                        regions, forecast_hours, is_test=False,
+                        should_stop=lambda: alert_scheduler.stopping
+                    )
+            finally:
+                schedule.mark_run(regions, cycle_started)
+            cycle.update(ok=result['ok'], alerts=result.get('alerts', 0), enqueued=result.get('enqueued', 0))
+            if not alert_leader.is_leader():
+                # 检查期间失去了租约：新的主实例会接手发送，本实例不再发送邮件或创建通知
+                print("本实例已不是主实例，跳过本轮的邮件发送与通知创建")
+                cycle['ok'] = False
+                return
+            if result['ok']:
+                # 读取待发送的邮件并创建通知
+                try:
+                    emails = json_store.read_json('re-Emile.json', [])
                     
-                    # 每10秒检查一次是否需要停止，提高响应性
-                    while not stop_weather_alert and datetime.datetime.now() < next_alert_time:
-                        time.sleep(10)  # 减少检查间隔从60秒到10秒
-                        if stop_weather_alert:
-                            print("收到停止信号，预警线程即将退出...")
-                            return  # 立即退出函数
+                    # 创建通知前先清除之前可能失败的事务
+                    db.session.rollback()
                     
-                    if stop_weather_alert:
-                        print("等待期间收到停止信号，预警线程即将退出...")
-                        break
-                
-                # 再次检查停止标志，防止在计算等待时间期间收到停止信号
-                if stop_weather_alert:
-                    print("执行预警前收到停止信号，预警线程即将退出...")
-                    break
+                    # 在正式操作前，先打印预警汇总信息
+                    print("\n=== 检测到的预警条件汇总 ===")
+                    regions_alerts = {}
+                    for email in emails:
+                        region = email['region']
+                        if region not in regions_alerts:
+                            regions_alerts[region] = []
+                        regions_alerts[region].append(email)
                     
-                print("=== 开始执行预警检查 ===\n")
-                
-                # 根据预警提前时间自动判断预报时间范围
-                alert_advance_days = setting.alert_advance_time
-                forecast_hours = alert_advance_days * 24
-                print(f"根据配置的提前预警天数: {alert_advance_days}天，系统将检查{forecast_hours}小时预报")
-                
-                # 执行预警检查
-                regions = get_customer_regions()
-                weather_data = fetch_weather_data(regions)
-                if weather_data:
-                    # 传递forecast_hours参数到check_alert_conditions函数
-                    alerts = check_alert_conditions(weather_data, forecast_hours)
-                    if send_alerts(alerts, is_test=False):
-                        # 读取待发送的邮件并创建通知
+                    # 按地区输出预警信息
+                    for region, alerts in regions_alerts.items():
+                        print(f"\n地区: {region}")
+                        for alert in alerts:
+                            print(f"  - 日期: {alert.get('alert_date', 'unknown')} | 类型: {alert['weather_type']} | 条件: {alert.get('condition', '')} | 收件人: {alert['to_name']}({alert['to_email']})")
+                    print("\n====================")
+                    
+                    # 检查是否启用自动审批
+                    auto_approval = setting.auto_approval if setting else False
+
+                    if auto_approval:
+                        # 自动审批模式：使用邮件任务队列直接发送，不进入通知中心
+                        print("\n=== 自动审批模式已启用，使用邮件任务队列直接发送 ===")
+                        cycle.update(process_mail_tasks_and_send(is_test=False, auto_mode_label="自动审批"))
+
+                    else:
+                        # 手动审批模式：批量创建通知供前端审批使用
+                        processed_ids = create_alert_notifications(
+                            emails, is_test=False, should_stop=lambda: alert_scheduler.stopping
+                        )
+                        cycle['notifications'] = len(processed_ids)
+                        if alert_scheduler.stopping:
+                            print("处理通知过程中收到停止信号，预警线程即将退出...")
+                            return
+                        print(f"\n已创建 {len(processed_ids)} 个预警通知。")
+                    
+                    # 检查是否需要发送管理员通知（仅在非自动审批模式下发送）
+                    if setting.admin_notifications and not alert_scheduler.stopping and not auto_approval:
                         try:
-                            with open('re-Emile.json', 'r', encoding='utf-8') as f:
-                                emails = json.load(f)
-                            
-                            # 创建通知前先清除之前可能失败的事务
-                            db.session.rollback()
+                            # 获取管理员邮箱（使用配置的发件人邮箱）
+                            admin_email = setting.email_sender
                             
-                            # 记录已处理的通知ID，防止重复
-                            processed_ids = set()
+                            # 构建管理员通知邮件内容
+                            admin_subject = f"【系统通知】检测到{len(processed_ids)}个预警情况"
+                            admin_content = f"""
+                            <h2>预警系统通知</h2>
+                            <p>系统检测到{len(processed_ids)}个预警情况，等待审核。</p>
+                            <h3>预警列表：</h3>
+                            <ul>
+                            """
                             
-                            # 在正式操作前，先打印预警汇总信息
-                            print("\n=== 检测到的预警条件汇总 ===")
-                            regions_alerts = {}
+                            # 添加每个预警的详细信息
                             for email in emails:
-                                region = email['region']
-                                if region not in regions_alerts:
-                                    regions_alerts[region] = []
-                                regions_alerts[region].append(email)
-                            
-                            # 按地区输出预警信息
-                            for region, alerts in regions_alerts.items():
-                                print(f"\n地区: {region}")
-                                for alert in alerts:
-                                    print(f"  - 日期: {alert.get('alert_date', 'unknown')} | 类型: {alert['weather_type']} | 条件: {alert.get('condition', '')} | 收件人: {alert['to_name']}({alert['to_email']})")
-                            print("\n====================")
+                                admin_content += f"""
+                                <li>
+                                    <strong>地区:</strong> {email['region']}<br>
+                                    <strong>预警类型:</strong> {email['weather_type']}<br>
+                                    <strong>接收人:</strong> {email['to_name']} ({email['to_email']})<br>
+                                    <strong>重复预警:</strong> {'是' if email.get('is_duplicate', False) else '否'}<br>
+                                </li>
+                                """
                             
-                            # 检查是否启用自动审批
-                            auto_approval = setting.auto_approval if setting else False
-
-                            if auto_approval:
-                                # 自动审批模式：使用邮件任务队列直接发送，不进入通知中心
-                                print("\n=== 自动审批模式已启用，使用邮件任务队列直接发送 ===")
-                                process_mail_tasks_and_send(is_test=False, auto_mode_label="自动审批")
-
-                            else:
-                                # 手动审批模式：创建通知供前端审批使用
-                                for email in emails:
-                                    # 检查停止标志
-                                    if stop_weather_alert:
-                                        print("处理通知过程中收到停止信号，预警线程即将退出...")
-                                        return
-
-                                    # 重复预警不进入通知中心
-                                    is_duplicate_in_7_days = check_duplicate_alert_in_7_days(
-                                        email['to_email'],
-                                        email.get('region', ''),
-                                        email.get('weather_type', ''),
-                                        email.get('condition', ''),
-                                        email.get('alert_date', ''),
-                                        email.get('category', '')
-                                    )
-                                    if is_duplicate_in_7_days or email.get('is_duplicate'):
-                                        print(f"跳过重复预警，不创建通知: {email['to_name']} ({email['to_email']})")
-                                        continue
-
-                                    # 生成唯一ID
-                                    random_suffix = random.randint(1000, 9999)
-                                    notification_id = f"alert_{datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')}_{random_suffix}_{email['to_email']}"
-
-                                    # 检查是否已处理此通知
-                                    if notification_id in processed_ids:
-                                        print(f"跳过重复通知: {notification_id}")
-                                        continue
-
-                                    # 检查是否是重复预警，添加重复标记
-                                    duplicate_prefix = "【已重复】" if email.get('is_duplicate', False) else ""
-
-                                    try:
-                                        notification = Notification(
-                                            notification_id=notification_id,
-                                            recipient=f"{email['to_name']} ({email['to_email']})",
-                                            title=f"{duplicate_prefix}天气预警: {email['weather_type']} - {email['region']}",
-                                            content=f"检测到{email['region']}地区可能出现{email['weather_type']}天气情况，是否发送预警邮件？",
-                                            email_data=json.dumps(email),
-                                            is_test=False
-                                        )
-                                        db.session.add(notification)
-                                        db.session.commit()
-                                        processed_ids.add(notification_id)
-                                        print(f"已创建通知: {notification_id}")
-                                    except Exception as notify_err:
-                                        print(f"创建通知失败: {str(notify_err)}")
-                                        db.session.rollback()  # 回滚失败的事务
-                                        # 备用方案：将通知存储到JSON文件
-                                        try:
-                                            notifications_file = 'pending_notifications.json'
-
-                                            # 读取现有通知
-                                            notifications = []
-                                            if os.path.exists(notifications_file):
-                                                try:
-                                                    with open(notifications_file, 'r', encoding='utf-8') as f:
-                                                        notifications = json.load(f)
-                                                except json.JSONDecodeError:
-                                                    notifications = []
-
-                                            # 添加新通知
-                                            notifications.append({
-                                                'notification_id': notification_id,
-                                                'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                                                'recipient': f"{email['to_name']} ({email['to_email']})",
-                                                'title': f"{duplicate_prefix}天气预警: {email['weather_type']} - {email['region']}",
-                                                'content': f"检测到{email['region']}地区可能出现{email['weather_type']}天气情况，是否发送预警邮件？",
-                                                'email_data': email,
-                                                'is_test': False,
-                                                'status': 'pending'
-                                            })
-
-                                            # 保存到文件
-                                            with open(notifications_file, 'w', encoding='utf-8') as f:
-                                                json.dump(notifications, f, ensure_ascii=False, indent=2)
-                                            trim_json_file(
-                                                notifications_file,
-                                                'pending_notifications',
-                                                max_entries=PENDING_NOTIFICATION_MAX_ENTRIES
-                                            )
-
-                                            processed_ids.add(notification_id)
-                                            print(f"已将通知保存到文件: {notification_id}")
-                                        except Exception as file_err:
-                                            print(f"保存通知到文件失败: {str(file_err)}")
-
-                                        # 短暂等待后继续
-                                        time.sleep(2)
-
-                                print(f"\n已创建 {len(processed_ids)} 个预警通知。")
+                            admin_content += """
+                            </ul>
+                            <p>请登录系统查看详情并进行处理。</p>
+                            """
                             
-                            # 检查是否需要发送管理员通知（仅在非自动审批模式下发送）
-                            if setting.admin_notifications and not stop_weather_alert and not auto_approval:
-                                try:
-                                    # 获取管理员邮箱（使用配置的发件人邮箱）
-                                    admin_email = setting.email_sender
-                                    
-                                    # 构建管理员通知邮件内容
-                                    admin_subject = f"【系统通知】检测到{len(processed_ids)}个预警情况"
-                                    admin_content = f"""
-                                    <h2>预警系统通知</h2>
-                                    <p>系统检测到{len(processed_ids)}个预警情况，等待审核。</p>
-                                    <h3>预警列表：</h3>
-                                    <ul>
-                                    """
-                                    
-                                    # 添加每个预警的详细信息
-                                    for email in emails:
-                                        admin_content += f"""
-                                        <li>
-                                            <strong>地区:</strong> {email['region']}<br>
-                                            <strong>预警类型:</strong> {email['weather_type']}<br>
-                                            <strong>接收人:</strong> {email['to_name']} ({email['to_email']})<br>
-                                            <strong>重复预警:</strong> {'是' if email.get('is_duplicate', False) else '否'}<br>
-                                        </li>
-                                        """
-                                    
-                                    admin_content += """
-                                    </ul>
-                                    <p>请登录系统查看详情并进行处理。</p>
-                                    """
-                                    
-                                    # 使用测试客户端发送请求
-                                    with app.test_client() as client:
-                                        admin_data = {
-                                            'to': admin_email,
-                                            'subject': admin_subject,
-                                            'content': admin_content
-                                        }
-                                        response = client.post('/api/send-email', json=admin_data)
-                                        result = response.get_json()
-                                        
-                                        if result['success']:
-                                            print(f"\n已向管理员 {admin_email} 发送通知邮件")
-                                        else:
-                                            print(f"\n向管理员发送通知邮件失败: {result['message']}")
-                                except Exception as e:
-                                    print(f"\n发送管理员通知时出错: {str(e)}")
+                            # 使用测试客户端发送请求
+                            with app.test_client() as client:
+                                admin_data = {
+                                    'to': admin_email,
+                                    'subject': admin_subject,
+                                    'content': admin_content
+                                }
+                                response = client.post('/api/send-email', json=admin_data)
+                                result = response.get_json()
+                                
+                                if result['success']:
+                                    print(f"\n已向管理员 {admin_email} 发送通知邮件")
+                                else:
+                                    print(f"\n向管理员发送通知邮件失败: {result['message']}")
                         except Exception as e:
-                            print(f"\n处理预警邮件时出错: {str(e)}")
-                
-                print("\n=== 预警检查完成 ===\n")
-                
-            except Exception as e:
-                print(f"\n发生错误: {str(e)}")
-                # 发生错误时，回滚任何未完成的事务
-                try:
-                    db.session.rollback()
-                except:
-                    pass
-                time.sleep(60)  # 发生错误时等待1分钟后重试
-            
-            # 最后检查一次停止标志
-            if stop_weather_alert:
-                print("预警周期结束，检测到停止信号，预警线程即将退出...")
-                break
-                
-        print("预警线程已退出")
+                            print(f"\n发送管理员通知时出错: {str(e)}")
+                except Exception as e:
+                    print(f"\n处理预警邮件时出错: {str(e)}")
+        
+            print("\n=== 预警检查完成 ===\n")
+        except Exception as e:
+            print(f"\n发生错误: {str(e)}")
+            if cycle is not None:
+                cycle.update(ok=False, error=str(e))
+            # 发生错误时，回滚任何未完成的事务
+            try:
+                db.session.rollback()
+            except:
+                pass
+        finally:
+            if cycle is not None:
+                cycle['seconds'] = round((datetime.datetime.now() - cycle_started).total_seconds(), 1)
+                event_bus.publish('alert_cycle.finished', cycle)
+
+def apply_log_retention():
+    """裁剪日志类JSON文件并删除过期备份"""
+    trim_json_file('data.json', 'data_log', max_entries=DATA_LOG_MAX_ENTRIES)
+    trim_json_file('pending_notifications.json', 'pending_notifications', max_entries=PENDING_NOTIFICATION_MAX_ENTRIES)
+    removed = prune_backups(LOG_RETENTION_DAYS)
+    print(f"日志保留任务完成，删除{removed}个超过{LOG_RETENTION_DAYS}天的备份文件")
+
+_alert_settings_fingerprint = None
+
+def watch_alert_settings():
+    """预警时间设置被其他进程（例如独立的HTTP服务）修改后，按新设置重新计算下次预警时间"""
+    global _alert_settings_fingerprint
+    with app.app_context():
+        setting = Setting.query.first()
+        if not setting:
+            return
+        fingerprint = (setting.first_alert, setting.first_alert_time, setting.refresh_interval, setting.alert_advance_time)
+    if _alert_settings_fingerprint is not None and fingerprint != _alert_settings_fingerprint:
+        next_run_at = alert_scheduler.reschedule('alert_cycle')
+        if next_run_at:
+            print(f"检测到预警时间设置变化，下次预警: {next_run_at.strftime('%Y-%m-%d %H:%M:%S')}")
+    _alert_settings_fingerprint = fingerprint
+
+alert_scheduler = Scheduler('weather-alert', on_start=prepare_alert_database)
+alert_scheduler.add_job('alert_cycle', run_alert_cycle, next_alert_run_time, '天气预警检查')
+alert_scheduler.add_job('cache_cleanup', clean_expired_cache, every(WEATHER_CACHE_CLEANUP_INTERVAL), '清理过期天气缓存')
+alert_scheduler.add_job('log_retention', apply_log_retention, daily_at(*LOG_RETENTION_TIME), '日志保留')
+alert_scheduler.add_job('settings_watch', watch_alert_settings, every(SETTINGS_WATCH_INTERVAL), '检查预警时间设置变化')
+
+# 审批后排队邮件的发送线程：每个进程在第一次加入队列时启动，启动时先发送一轮
+mail_sender = Scheduler('mail-sender', on_start=send_approved_mail_tasks)
+mail_sender.add_job('approved_mail', send_approved_mail_tasks, every(MAIL_SEND_INTERVAL), '发送审批后排队的邮件')
+atexit.register(mail_sender.stop, 5)
+
+def wake_mail_sender():
+    """有新的排队邮件时立即发送"""
+    if not mail_sender.run_now('approved_mail'):
+        mail_sender.start()
+
+# 多个进程共用同一个数据库时，只有持有租约的主实例运行预警调度器，其余实例只提供HTTP服务
+alert_leader = LeaderElector(
+    LeaderLease(_get_db_path(), 'alert_scheduler'),
+    on_elected=alert_scheduler.start,
+    # 等待进行中的预警检查结束后再释放租约，避免与新的主实例同时发送
+    on_demoted=lambda: alert_scheduler.stop(LEADER_DEMOTE_WAIT_SECONDS)
+)
+atexit.register(alert_leader.stop, 5)
+
+def start_alert_scheduling():
+    """
+    启用预警调度（对所有实例生效）；本进程负责调度时同时参与主实例选举
+
+    Returns:
+        是否有状态变化（原先停用，或本进程刚开始参与选举）
+    """
+    changed = not alert_leader.lease.is_enabled()
+    alert_leader.lease.set_enabled(True)
+    if app.config['RUN_ALERT_SCHEDULER']:
+        changed = alert_leader.start() or changed
+        alert_leader.wake()
+    return changed
 
 @app.route('/api/weather-alert/start', methods=['POST'])
 def start_weather_alert():
     """启动天气预警后台任务"""
-    global weather_alert_thread, stop_weather_alert
-    
-    if weather_alert_thread and weather_alert_thread.is_alive():
+    if not start_alert_scheduling():
         return jsonify({'success': False, 'message': '天气预警系统已在运行中'})
-    
-    stop_weather_alert = False
-    weather_alert_thread = Thread(target=run_weather_alert_background)
-    weather_alert_thread.daemon = True
-    weather_alert_thread.start()
-    
-    return jsonify({'success': True, 'message': '天气预警系统已启动'})
+    return jsonify({'success': True, 'message': '天气预警系统已启动，主实例将运行预警调度'})
 
 @app.route('/api/weather-alert/stop', methods=['POST'])
 def stop_weather_alert():
-    """停止天气预警后台任务"""
-    global stop_weather_alert
-    
-    stop_weather_alert = True
+    """停止天气预警后台任务（对所有实例生效，调度进程在下次续约时退出调度）"""
+    alert_leader.lease.set_enabled(False)
+    alert_leader.wake()
     return jsonify({'success': True, 'message': '正在停止天气预警系统'})
 
+@app.route('/api/weather-alert/jobs', methods=['GET'])
+def get_weather_alert_jobs():
+    """查看后台任务的运行状态与下次运行时间"""
+    from region_schedule import get_region_schedule_index
+
+    return jsonify({
+        'success': True,
+        'running': alert_scheduler.is_running(),
+        'schedulerInProcess': app.config['RUN_ALERT_SCHEDULER'],
+        'jobs': alert_scheduler.jobs(),
+        'regionSchedules': get_region_schedule_index().summary(),
+        'leader': alert_leader.status()
+    })
+
 @app.route('/api/weather/refresh-cache', methods=['GET'])
 def refresh_weather_cache():
     try:
@@ -3234,17 +3539,10 @@ def refresh_weather_cache():
         # 获取用户收藏的城市
         favorite_cities = load_favorite_cities()
         
-        # 重新获取这些城市的天气数据
-        for city in favorite_cities:
-            # 获取城市ID
-            city_info = get_city_info(city)
-            if city_info:
-                city_id = city_info[0].get('id')
-                city_name = city_info[0].get('name')
-                # 强制刷新天气数据
-                get_weather_data(city_id, city_name)
+        # 并发重新获取这些城市的天气数据
+        _, statuses = fetch_cities_weather(favorite_cities)
         
-        return jsonify({"code": "200", "message": "天气数据已更新"})
+        return jsonify({"code": "200", "message": "天气数据已更新", "statuses": statuses})
     except Exception as e:
         return jsonify({"code": "500", "message": f"刷新缓存失败: {str(e)}"})
 
@@ -3296,16 +3594,18 @@ def replace_template_variables(template_content, customer_data, weather_data):
 
 # 读取用户数据
 def read_users():
-    try:
-        with open(USER_FILE, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+    return json_store.read_json(USER_FILE, [])
 
 # 保存用户数据
 def save_users(users):
-    with open(USER_FILE, 'w') as f:
-        json.dump(users, f)
+    json_store.write_json(USER_FILE, users)
+
+# 浏览器直接读取 JSON 数据文件（如 data.json）时，先把尚未合并的追加日志合并进文件
+@app.before_request
+def merge_json_journal():
+    path = request.path.lstrip('/')
+    if path.endswith('.json') and os.path.basename(path) == path and json_store.has_journal(path):
+        json_store.compact(path)
 
 # 静态文件路由
 @app.route('/')
@@ -3356,22 +3656,23 @@ def add_user():
     password = data.get('password')
     role = data.get('role', 'user')
     
-    users = read_users()
-    
-    # 检查用户名是否已存在
-    if any(u['username'] == username for u in users):
-        return jsonify({
-            'success': False,
-            'message': '用户名已存在'
-        }), 400
+    with json_store.locked(USER_FILE):
+        users = read_users()
     
-    users.append({
-        'username': username,
-        'password': password,
-        'role': role
-    })
+        # 检查用户名是否已存在
+        if any(u['username'] == username for u in users):
+            return jsonify({
+                'success': False,
+                'message': '用户名已存在'
+            }), 400
+    
+        users.append({
+            'username': username,
+            'password': password,
+            'role': role
+        })
     
-    save_users(users)
+        save_users(users)
     
     return jsonify({
         'success': True,
@@ -3386,31 +3687,32 @@ def update_user(username):
     password = data.get('password')
     role = data.get('role')
     
-    users = read_users()
+    with json_store.locked(USER_FILE):
+        users = read_users()
     
-    # 查找要更新的用户
-    user_index = next((i for i, u in enumerate(users) if u['username'] == username), None)
+        # 查找要更新的用户
+        user_index = next((i for i, u in enumerate(users) if u['username'] == username), None)
     
-    if user_index is None:
-        return jsonify({
-            'success': False,
-            'message': '用户不存在'
-        }), 404
+        if user_index is None:
+            return jsonify({
+                'success': False,
+                'message': '用户不存在'
+            }), 404
     
-    # 检查新用户名是否与其他用户冲突
-    if new_username != username and any(u['username'] == new_username for u in users):
-        return jsonify({
-            'success': False,
-            'message': '用户名已存在'
-        }), 400
+        # 检查新用户名是否与其他用户冲突
+        if new_username != username and any(u['username'] == new_username for u in users):
+            return jsonify({
+                'success': False,
+                'message': '用户名已存在'
+            }), 400
     
-    users[user_index]['username'] = new_username
-    if password:
-        users[user_index]['password'] = password
-    if role:
-        users[user_index]['role'] = role
+        users[user_index]['username'] = new_username
+        if password:
+            users[user_index]['password'] = password
+        if role:
+            users[user_index]['role'] = role
     
-    save_users(users)
+        save_users(users)
     
     return jsonify({
         'success': True,
@@ -3420,26 +3722,27 @@ def update_user(username):
 # API路由：删除用户
 @app.route('/api/users/<username>', methods=['DELETE'])
 def delete_user(username):
-    users = read_users()
+    with json_store.locked(USER_FILE):
+        users = read_users()
     
-    # 检查是否是唯一的管理员
-    admin_users = [u for u in users if u['role'] == 'admin']
-    user_to_delete = next((u for u in users if u['username'] == username), None)
+        # 检查是否是唯一的管理员
+        admin_users = [u for u in users if u['role'] == 'admin']
+        user_to_delete = next((u for u in users if u['username'] == username), None)
     
-    if not user_to_delete:
-        return jsonify({
-            'success': False,
-            'message': '用户不存在'
-        }), 404
+        if not user_to_delete:
+            return jsonify({
+                'success': False,
+                'message': '用户不存在'
+            }), 404
     
-    if user_to_delete['role'] == 'admin' and len(admin_users) <= 1:
-        return jsonify({
-            'success': False,
-            'message': '系统中必须至少保留一个管理员账号'
-        }), 400
+        if user_to_delete['role'] == 'admin' and len(admin_users) <= 1:
+            return jsonify({
+                'success': False,
+                'message': '系统中必须至少保留一个管理员账号'
+            }), 400
     
-    users = [u for u in users if u['username'] != username]
-    save_users(users)
+        users = [u for u in users if u['username'] != username]
+        save_users(users)
     
     return jsonify({
         'success': True,
@@ -3454,17 +3757,18 @@ def change_password():
     current_password = data.get('current_password')
     new_password = data.get('new_password')
     
-    users = read_users()
-    user = next((u for u in users if u['username'] == username), None)
+    with json_store.locked(USER_FILE):
+        users = read_users()
+        user = next((u for u in users if u['username'] == username), None)
     
-    if not user or user['password'] != current_password:
-        return jsonify({
-            'success': False,
-            'message': '当前密码不正确'
-        }), 401
+        if not user or user['password'] != current_password:
+            return jsonify({
+                'success': False,
+                'message': '当前密码不正确'
+            }), 401
     
-    user['password'] = new_password
-    save_users(users)
+        user['password'] = new_password
+        save_users(users)
     
     return jsonify({
         'success': True,
@@ -3473,6 +3777,21 @@ def change_password():
 
 ####################
 
+def configure_app(config=None):
+    """
+    覆盖模块级应用 app 的配置并返回它，供 wsgi.py、scheduler_main.py 与测试脚本使用。
+
+    这不是应用工厂：app、db 与调度器在导入本模块时就已创建，同一进程内只有一个应用实例，
+    调用方只能在启动前调整配置。导入本模块不访问数据库；天气缓存、用户文件等在首次使用时才初始化，
+    数据库建表与JSON数据同步由 init_db() 显式执行。
+
+    Args:
+        config: 可选的配置项，例如 {'RUN_ALERT_SCHEDULER': False}
+    """
+    if config:
+        app.config.update(config)
+    return app
+
 # 如果直接运行此文件，则初始化数据库并启动应用
 if __name__ == '__main__':
     # 确保数据库目录有写入权限
@@ -3500,10 +3819,7 @@ if __name__ == '__main__':
     init_db()
     
     # 启动天气预警系统
-    stop_weather_alert = False
-    weather_alert_thread = Thread(target=run_weather_alert_background)
-    weather_alert_thread.daemon = True
-    weather_alert_thread.start()
+    start_alert_scheduling()
     print("天气预警系统已启动")
     
     app.run(debug=False, host='0.0.0.0', port=8000, threaded=True)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+离线压测预警流程：使用本地天气后端（LocalWeatherProvider）生成大量地区，
+依次执行 获取天气 -> 规则判断 -> 写入邮件任务，输出各阶段耗时。
+
+所有文件都写入临时工作目录，不会触碰项目内的 JSON 与数据库。
+用法：python benchmark_alert_cycle.py --regions 10000 --latency-ms 0 --error-rate 0.01
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+
+def prepare_workdir(workdir, regions, customers_per_region, advance_days):
+    """在工作目录中生成设置、人员、规则与模板文件（随后由 init_db 导入压测数据库）"""
+    for name in ('alert_rules.json', 'templates_data.json'):
+        shutil.copy(os.path.join(BASE_DIR, name), os.path.join(workdir, name))
+
+    with open(os.path.join(workdir, 'alert_rules.json'), 'r', encoding='utf-8') as f:
+        weather_types = sorted({rule['type'] for rule in json.load(f)})
+
+    customers = []
+    for i in range(regions):
+        region = f"压测地区{i:05d}"
+        for j in range(customers_per_region):
+            customers.append({
+                'id': len(customers) + 1,
+                'name': f"联系人{i}_{j}",
+                'title': '',
+                'company': '压测单位',
+                'region': region,
+                'email': f"bench{i}_{j}@example.com",
+                'phone': '',
+                'category': '客户' if j % 2 == 0 else '工程师',
+                'weatherTypes': weather_types,
+            })
+
+    settings = {
+        'weatherApiKey': '',
+        'alertAdvanceTime': advance_days,
+        'intervalPrediction': False,
+        'retryCount': 1,
+        'autoRetry': False,
+    }
+    with open(os.path.join(workdir, 'customers_data.json'), 'w', encoding='utf-8') as f:
+        json.dump(customers, f, ensure_ascii=False)
+    with open(os.path.join(workdir, 'settings.json'), 'w', encoding='utf-8') as f:
+        json.dump(settings, f, ensure_ascii=False)
+
+
+def run(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix='skyalert_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    os.environ['WEATHER_PROVIDER'] = 'local'
+    os.environ['WEATHER_REPLAY_DIR'] = args.replay_dir or os.path.join(workdir, 'weather_replay')
+    os.environ['WEATHER_REPLAY_LATENCY_MS'] = str(args.latency_ms)
+    os.environ['WEATHER_REPLAY_ERROR_RATE'] = str(args.error_rate)
+    os.environ['WEATHER_REPLAY_SEED'] = str(args.seed)
+
+    os.environ['SKYALERT_DB_PATH'] = os.path.join(workdir, 'bench.db')
+
+    prepare_workdir(workdir, args.regions, args.customers_per_region, args.advance_days)
+    os.chdir(workdir)
+    sys.path.insert(0, BASE_DIR)
+
+    import weather_alert_main as wam
+    import alert_pipeline
+
+    timings = {}
+    sink = open(os.devnull, 'w', encoding='utf-8') if args.quiet else sys.stdout
+    with contextlib.redirect_stdout(sink):
+        # 预警流程直接读取数据库：先把生成的 JSON 数据导入压测数据库（不计入耗时）
+        import app as skyalert
+        skyalert.configure_app({'RUN_ALERT_SCHEDULER': False})
+        skyalert.init_db()
+
+        start = time.perf_counter()
+        regions = wam.get_customer_regions()
+        timings['地区提取'] = time.perf_counter() - start
+
+        if args.shards > 1:
+            start = time.perf_counter()
+            stats = alert_pipeline.run_sharded_alert_cycle(
+                regions, args.advance_days * 24, is_test=True, shards=args.shards
+            )
+            timings['分片流水线'] = time.perf_counter() - start
+        elif args.pipeline:
+            start = time.perf_counter()
+            stats = alert_pipeline.run_alert_pipeline(regions, args.advance_days * 24, is_test=True)
+            timings['流水线'] = time.perf_counter() - start
+        else:
+            start = time.perf_counter()
+            weather_data = wam.fetch_weather_data(regions) or {}
+            timings['获取天气'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            alerts = wam.check_alert_conditions(weather_data, args.advance_days * 24)
+            timings['规则判断'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            wam.send_alerts(alerts, is_test=True)
+            timings['写入任务'] = time.perf_counter() - start
+
+    print(f"工作目录: {workdir}")
+    if args.pipeline or args.shards > 1:
+        first = stats['first_alert_seconds']
+        print(f"地区数: {len(regions)}，判断地区: {stats['regions']}，触发预警: {stats['alerts']}，"
+              f"首条任务入队: {'-' if first is None else f'{first:.2f}秒'}")
+    else:
+        print(f"地区数: {len(regions)}，成功获取: {len(weather_data)}，触发预警: {len(alerts)}")
+    for stage, seconds in timings.items():
+        print(f"  {stage}: {seconds:.2f}秒")
+    print(f"  合计: {sum(timings.values()):.2f}秒")
+
+    if not args.workdir and not args.keep:
+        os.chdir(BASE_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线压测天气预警流程')
+    parser.add_argument('--regions', type=int, default=1000, help='模拟地区数量')
+    parser.add_argument('--customers-per-region', type=int, default=1, help='每个地区的联系人数量')
+    parser.add_argument('--advance-days', type=int, default=1, help='提前预警天数')
+    parser.add_argument('--latency-ms', type=float, default=0, help='本地后端每次请求的模拟延迟')
+    parser.add_argument('--error-rate', type=float, default=0, help='本地后端的模拟错误率（0~1）')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--replay-dir', help='录制数据目录（默认使用合成数据）')
+    parser.add_argument('--workdir', help='工作目录（默认使用临时目录并在结束后删除）')
+    parser.add_argument('--keep', action='store_true', help='保留临时工作目录')
+    parser.add_argument('--quiet', action='store_true', help='屏蔽流程中的逐条打印')
+    parser.add_argument('--pipeline', action='store_true', help='使用流水线方式执行（获取、判断、写入同时进行）')
+    parser.add_argument('--shards', type=int, default=0, help='按地区哈希分片，在多个进程中并行执行流水线')
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
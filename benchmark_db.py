@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+对比 SQLite 调优前后的热点查询耗时：同样的数据分别写入两个临时数据库，
+一个使用 sqlite3 默认连接参数且没有二级索引（调优前），一个使用 sqlite_db 的连接参数并执行索引迁移（调优后）。
+
+在临时目录中运行，不会触碰项目内的数据库。
+用法：python benchmark_db.py --rows 200000 --repeat 5
+"""
+
+import argparse
+import datetime
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, BASE_DIR)
+
+import sqlite_db  # noqa: E402
+
+# 与 app.py 中模型对应的表结构（只保留压测用到的列）
+SCHEMA = [
+    '''CREATE TABLE mail_task (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        task_id VARCHAR(100) UNIQUE NOT NULL,
+        status VARCHAR(20) DEFAULT 'pending',
+        payload TEXT,
+        is_test BOOLEAN DEFAULT 0,
+        attempts INTEGER DEFAULT 0,
+        error TEXT,
+        created_at DATETIME,
+        updated_at DATETIME
+    )''',
+    '''CREATE TABLE notification (
+        id INTEGER PRIMARY KEY,
+        notification_id VARCHAR(50) UNIQUE,
+        timestamp DATETIME,
+        recipient VARCHAR(200),
+        title VARCHAR(200),
+        content TEXT,
+        status VARCHAR(20),
+        email_data TEXT,
+        is_test BOOLEAN
+    )''',
+    '''CREATE TABLE personnel (
+        id INTEGER PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        company VARCHAR(200),
+        region VARCHAR(100) NOT NULL,
+        email VARCHAR(100) NOT NULL,
+        category VARCHAR(20)
+    )''',
+    '''CREATE TABLE log (
+        id INTEGER PRIMARY KEY,
+        timestamp DATETIME,
+        recipient VARCHAR(200),
+        status VARCHAR(20),
+        region VARCHAR(100),
+        email_data TEXT,
+        is_test BOOLEAN
+    )''',
+]
+
+REGIONS = 2000
+PAYLOAD = '{"subject": "预警", "content": "' + '天气预警内容' * 40 + '"}'
+
+
+def fill(conn, rows, seed):
+    """写入压测数据：mail_task/log 各 rows 行，notification/personnel 各 rows/4 行，少量为待处理状态"""
+    rng = random.Random(seed)
+    start = datetime.datetime(2025, 1, 1)
+    stamp = lambda i: (start + datetime.timedelta(seconds=i * 30)).strftime('%Y-%m-%d %H:%M:%S.%f')
+    conn.executemany(
+        'INSERT INTO mail_task (task_id, status, payload, is_test, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+        ((f"task_{i}", 'pending' if rng.random() < 0.01 else 'sent', PAYLOAD, i % 10 == 0, stamp(i), stamp(i))
+         for i in range(rows))
+    )
+    conn.executemany(
+        'INSERT INTO notification (notification_id, timestamp, recipient, title, content, status, is_test) '
+        'VALUES (?, ?, ?, ?, ?, ?, 0)',
+        ((f"n_{i}", stamp(i), f"user{i}@example.com", '预警', PAYLOAD,
+          'pending' if rng.random() < 0.02 else 'approved') for i in range(rows // 4))
+    )
+    conn.executemany(
+        'INSERT INTO personnel (name, company, region, email, category) VALUES (?, ?, ?, ?, ?)',
+        ((f"联系人{i}", '压测单位', f"地区{rng.randrange(REGIONS):04d}", f"p{i}@example.com", '客户')
+         for i in range(rows // 4))
+    )
+    conn.executemany(
+        'INSERT INTO log (timestamp, recipient, status, region, email_data, is_test) VALUES (?, ?, ?, ?, ?, 0)',
+        ((stamp(i), f"user{i}@example.com", 'sent', f"地区{i % REGIONS:04d}", PAYLOAD) for i in range(rows))
+    )
+    conn.commit()
+
+
+def timed(func, repeat):
+    """执行 repeat 次，返回中位数耗时（毫秒）"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def run_queries(conn, rows, repeat):
+    recent = (datetime.datetime(2025, 1, 1) + datetime.timedelta(seconds=(rows - 500) * 30)).strftime('%Y-%m-%d %H:%M:%S')
+    regions = [f"地区{i:04d}" for i in range(0, REGIONS, REGIONS // 50)]
+    update_ids = iter(range(rows))
+
+    def update_one_by_one():
+        # 逐条更新并提交，与发送邮件后逐个更新任务状态相同
+        for _ in range(200):
+            conn.execute("UPDATE mail_task SET status = 'processing' WHERE task_id = ?", (f"task_{next(update_ids)}",))
+            conn.commit()
+
+    return [
+        ('待发送邮件任务（status=pending）', timed(lambda: conn.execute(
+            "SELECT id, task_id, payload FROM mail_task WHERE status = 'pending' AND is_test = 0 ORDER BY created_at"
+        ).fetchall(), repeat)),
+        ('待审批通知（status=pending）', timed(lambda: conn.execute(
+            "SELECT id, notification_id, title FROM notification WHERE status = 'pending' ORDER BY timestamp DESC"
+        ).fetchall(), repeat)),
+        ('按地区查人员（50个地区）', timed(lambda: [conn.execute(
+            'SELECT id, name, email FROM personnel WHERE region = ?', (region,)
+        ).fetchall() for region in regions], repeat)),
+        ('最近日志（timestamp 范围）', timed(lambda: conn.execute(
+            'SELECT id, recipient, status FROM log WHERE timestamp >= ? ORDER BY timestamp DESC LIMIT 200', (recent,)
+        ).fetchall(), repeat)),
+        ('逐条更新任务状态（200次提交）', timed(update_one_by_one, repeat)),
+    ]
+
+
+def prepare(path, rows, seed, tuned):
+    conn = sqlite_db.connect(path) if tuned else sqlite3.connect(path)
+    for sql in SCHEMA:
+        conn.execute(sql)
+    fill(conn, rows, seed)
+    if tuned:
+        sqlite_db.apply_migrations(path)
+    return conn
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比 SQLite 调优前后的热点查询耗时')
+    parser.add_argument('--rows', type=int, default=200000, help='mail_task 与 log 的行数（通知与人员为其四分之一）')
+    parser.add_argument('--repeat', type=int, default=5, help='每个查询执行的次数，取中位数')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='skyalert_db_bench_')
+    try:
+        results = {}
+        for label, tuned in (('调优前', False), ('调优后', True)):
+            conn = prepare(os.path.join(workdir, f"{label}.db"), args.rows, args.seed, tuned)
+            mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+            sync = conn.execute('PRAGMA synchronous').fetchone()[0]
+            print(f"{label}: journal_mode={mode}, synchronous={sync}")
+            results[label] = run_queries(conn, args.rows, args.repeat)
+            conn.close()
+
+        print(f"\n查询耗时（{args.repeat}次中位数，毫秒）：")
+        for (name, before), (_, after) in zip(results['调优前'], results['调优后']):
+            print(f"  {name}: {before:.2f} -> {after:.2f}（{before / after if after else float('inf'):.1f}倍）")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+测量冷启动耗时：每次在新的 Python 进程中导入模块（可选再创建应用），取多次运行的中位数。
+
+在临时工作目录中运行，不会创建或修改项目内的 JSON 与数据库文件。
+用法：python benchmark_startup.py --runs 5
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+# (名称, 在子进程中执行的语句)
+TARGETS = [
+    ('weather_alert_main', 'import weather_alert_main'),
+    ('alert_pipeline', 'import alert_pipeline'),
+    ('app', 'import app'),
+    ('wsgi（工作进程）', 'import wsgi'),
+]
+
+PROBE = '''
+import sys, time
+sys.path.insert(0, {base_dir!r})
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start)
+'''
+
+
+def measure(statement, workdir, runs):
+    """在新进程中执行 runs 次，返回每次的耗时（秒）"""
+    code = PROBE.format(base_dir=BASE_DIR, statement=statement)
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-c', code], cwd=workdir, capture_output=True, text=True, check=True
+        )
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测量模块导入与应用创建的冷启动耗时')
+    parser.add_argument('--runs', type=int, default=5, help='每个目标运行的次数')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='skyalert_startup_')
+    try:
+        print(f"冷启动耗时（{args.runs}次中位数）：")
+        for name, statement in TARGETS:
+            timings = measure(statement, workdir, args.runs)
+            print(f"  {name}: {statistics.median(timings) * 1000:.0f}毫秒（最快 {min(timings) * 1000:.0f}毫秒）")
+        leftovers = sorted(os.listdir(workdir))
+        if leftovers:
+            print(f"导入时在工作目录中创建了: {', '.join(leftovers)}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
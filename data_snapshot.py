@@ -0,0 +1,336 @@
+"""
+配置与业务数据快照。
+
+设置、人员、预警规则与模板以 skyalert.db 中的 setting / personnel / alert_rule / template 表
+为准，各自按数据源版本缓存解析结果，版本不变时直接复用，不再重复查询；一轮预警检查开始时
+取一次快照，获取天气、规则判断、写入邮件任务各阶段共用这一份数据，整轮看到的是同一个一致的版本。
+
+数据源版本为 data_revision 表中的修订号：各业务表上的触发器在每次增删改后把对应数据源的
+修订号加一，因此无论数据由哪个进程、以何种方式写入，下一次取快照都能发现变化。
+data_revision 表由 app.init_db() 在把 JSON 文件导入数据库之后创建；尚未迁移的数据库
+（或数据库文件不存在时）退回读取原来的 JSON 文件，版本为文件的 mtime 与大小。
+JSON 文件不再随每次修改重写，需要时由 export_source() 按需导出。
+
+快照及其中的列表均不可修改（设置为只读映射，列表为元组）；列表中的条目为普通 dict，
+多个阶段共享同一份对象，使用方不应修改，需要改动时先复制。
+"""
+
+import collections
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import types
+
+import json_store
+from sqlite_db import connect
+
+
+class JsonFileSource:
+    """JSON 文件数据源：以 (mtime_ns, 文件大小) 作为版本"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def version(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (os.path.abspath(self.path), stat.st_mtime_ns, stat.st_size)
+
+    def load(self):
+        """读取并解析文件，文件不存在或格式错误时返回 None"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"无法加载 {self.path}: {e}")
+            return None
+
+
+# setting 表的列与设置项的对应关系；其余设置项（例如 forecastRefreshMinutes）以 JSON 保存在 extra 列
+SETTING_FIELDS = (
+    ('emailSender', 'email_sender'),
+    ('emailName', 'email_name'),
+    ('smtpServer', 'smtp_server'),
+    ('smtpPort', 'smtp_port'),
+    ('smtpUsername', 'smtp_username'),
+    ('smtpPassword', 'smtp_password'),
+    ('weatherApiKey', 'weather_api_key'),
+    ('retryCount', 'retry_count'),
+    ('autoRetry', 'auto_retry'),
+    ('intervalPrediction', 'auto_retry'),  # 区间预测与 autoRetry 共用同一列
+    ('adminNotifications', 'admin_notifications'),
+    ('sendSummary', 'send_summary'),
+    ('alertAdvanceTime', 'alert_advance_time'),
+    ('warningInterval', 'refresh_interval'),
+    ('firstalert', 'first_alert'),
+    ('firstAlertTime', 'first_alert_time'),
+    ('autoApproval', 'auto_approval'),
+    ('lastUpdated', 'last_updated'),
+    ('lastTested', 'last_tested'),
+    ('testResult', 'test_result'),
+)
+SETTING_BOOLEAN_COLUMNS = frozenset({'auto_retry', 'admin_notifications', 'send_summary', 'auto_approval'})
+SETTING_DATETIME_COLUMNS = frozenset({'last_updated', 'last_tested'})
+
+
+def _isoformat(value):
+    """日期时间列：ORM 取得的 date/datetime 与 sqlite3 取得的字符串统一为 ISO 格式"""
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, str):
+        return value.replace(' ', 'T', 1)
+    return value
+
+
+def settings_to_dict(row):
+    """setting 表的一行（列名 -> 值的映射）转换为与 settings.json 格式相同的设置项，值为空的项省略"""
+    result = {}
+    if row['extra']:
+        try:
+            result.update(json.loads(row['extra']))
+        except ValueError:
+            print("设置的 extra 列不是有效的 JSON，已忽略")
+    for key, column in SETTING_FIELDS:
+        value = row[column]
+        if value is None:
+            continue
+        if column in SETTING_BOOLEAN_COLUMNS:
+            value = bool(value)
+        elif column in SETTING_DATETIME_COLUMNS:
+            value = _isoformat(value)
+        result[key] = value
+    if not result.get('firstAlertTime') and result.get('firstalert') is not None:
+        result['firstAlertTime'] = f"{int(result['firstalert']):02d}:00"
+    return result
+
+
+def rule_to_dict(row):
+    """预警规则（id/type/condition/status/alert_type/advance_time/created_at）转换为与 alert_rules.json 相同的格式"""
+    rule = {
+        'id': row['id'],
+        'type': row['type'] or '',
+        'condition': row['condition'],
+        'status': row['status'] or '活跃',
+        'alertType': row['alert_type'] or 'parameter',
+        'createdAt': _isoformat(row['created_at'])
+    }
+    if row['advance_time'] not in (None, ''):
+        rule['advanceTime'] = row['advance_time']
+    return rule
+
+
+def template_to_dict(row):
+    """模板转换为与 templates_data.json 相同的格式，附件列中的 JSON 字符串解析为列表"""
+    try:
+        attachments = json.loads(row['attachments']) if row['attachments'] else []
+    except ValueError:
+        attachments = []
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'subject': row['subject'],
+        'content': row['content'],
+        'lastModified': _isoformat(row['last_modified']),
+        'type': row['type'] or '',
+        'isActive': bool(row['is_active']),
+        'targetRole': row['target_role'] or 'all',
+        'attachments': attachments
+    }
+
+
+def load_settings(conn):
+    row = conn.execute('SELECT * FROM setting ORDER BY id LIMIT 1').fetchone()
+    return settings_to_dict(row) if row else None
+
+
+def load_customers(conn):
+    # 人员数量可能很大：按位置读取普通元组，避免逐行构造 sqlite3.Row
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    weather_types = {}
+    for personnel_id, name in cursor.execute(
+        'SELECT pwt.personnel_id, wt.name FROM personnel_weather_types pwt '
+        'JOIN weather_type wt ON wt.id = pwt.weather_type_id ORDER BY pwt.personnel_id, wt.id'
+    ):
+        weather_types.setdefault(personnel_id, []).append(name)
+    return [
+        {
+            'id': personnel_id,
+            'name': name,
+            'title': title,
+            'company': company,
+            'region': region,
+            'email': email,
+            'phone': phone,
+            'category': category,
+            'weatherTypes': weather_types.get(personnel_id, []),
+            'lastUpdated': last_updated[:19] if last_updated else None
+        }
+        for personnel_id, name, title, company, region, email, phone, category, last_updated in cursor.execute(
+            'SELECT id, name, title, company, region, email, phone, category, last_updated FROM personnel ORDER BY id'
+        )
+    ]
+
+
+def load_rules(conn):
+    return [rule_to_dict(row) for row in conn.execute(
+        'SELECT r.id, wt.name AS type, r.condition, r.status, r.alert_type, r.advance_time, r.created_at '
+        'FROM alert_rule r LEFT JOIN weather_type wt ON wt.id = r.weather_type_id ORDER BY r.id'
+    )]
+
+
+def load_templates(conn):
+    return [template_to_dict(row) for row in conn.execute(
+        'SELECT t.id, t.name, t.subject, t.content, t.last_modified, wt.name AS type, t.is_active, '
+        't.target_role, t.attachments FROM template t LEFT JOIN weather_type wt ON wt.id = t.weather_type_id ORDER BY t.id'
+    )]
+
+
+class TableSource:
+    """数据库数据源：tables 中任一表的增删改都会使修订号加一；数据库尚未迁移时读取 fallback 指向的 JSON 文件"""
+
+    def __init__(self, tables, loader, fallback):
+        self.tables = tables
+        self.loader = loader
+        self.fallback = JsonFileSource(fallback)
+
+    def load(self, conn):
+        return self.loader(conn)
+
+
+# 快照包含的数据源，顺序即 DataSnapshot 的字段顺序
+SOURCES = collections.OrderedDict([
+    ('settings', TableSource(('setting',), load_settings, 'settings.json')),
+    ('customers', TableSource(('personnel', 'personnel_weather_types'), load_customers, 'customers_data.json')),
+    ('rules', TableSource(('alert_rule',), load_rules, 'alert_rules.json')),
+    ('templates', TableSource(('template',), load_templates, 'templates_data.json')),
+])
+
+
+def install_revision_tracking(conn):
+    """创建 data_revision 表及各业务表上维护修订号的触发器（可重复执行，调用方负责提交）"""
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS data_revision (source TEXT PRIMARY KEY, revision INTEGER NOT NULL DEFAULT 0)'
+    )
+    for name, source in SOURCES.items():
+        conn.execute('INSERT OR IGNORE INTO data_revision (source, revision) VALUES (?, 0)', (name,))
+        for table in source.tables:
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                conn.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_revision AFTER {event} ON {table} "
+                    f"BEGIN UPDATE data_revision SET revision = revision + 1 WHERE source = '{name}'; END"
+                )
+
+
+def get_db_path():
+    """业务数据库路径：与预警流程共用 weather_alert_main.DB_PATH（分片子进程与压测脚本会改写它）"""
+    import weather_alert_main
+    return weather_alert_main.DB_PATH
+
+
+def _connect(db_path):
+    """打开已迁移的业务数据库；数据库不存在或还没有 data_revision 表时返回 None"""
+    if not db_path or not os.path.exists(db_path):
+        return None
+    conn = connect(db_path, timeout=5, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'data_revision'").fetchone():
+            return conn
+    except sqlite3.Error as e:
+        print(f"无法读取数据库 {db_path}: {e}")
+    conn.close()
+    return None
+
+
+class DataSnapshot(collections.namedtuple('DataSnapshot', list(SOURCES) + ['versions'])):
+    """
+    一次取得的数据快照。
+
+    settings 为只读映射，customers / rules / templates 为元组；数据源缺失或无法解析时对应字段为 None。
+    versions 为 {数据源: 版本}，可用于判断两次快照之间哪些数据发生了变化。
+    """
+
+    __slots__ = ()
+
+    def version_of(self, name):
+        return self.versions.get(name)
+
+
+def _freeze(value):
+    """快照顶层只读：dict 转为只读映射，list 转为元组"""
+    if isinstance(value, dict):
+        return types.MappingProxyType(value)
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+_cache = {}  # 数据源名称 -> (版本, 解析结果)
+_cache_lock = threading.Lock()
+
+
+def get_snapshot():
+    """取得当前数据快照：只重新加载版本发生变化的数据源"""
+    db_path = get_db_path()
+    values = {}
+    versions = {}
+    with _cache_lock:
+        conn = _connect(db_path)
+        try:
+            if conn is not None:
+                # 修订号与数据在同一个读事务中读取，保证各数据源来自同一时刻
+                conn.execute('BEGIN')
+                revisions = dict(conn.execute('SELECT source, revision FROM data_revision').fetchall())
+            for name, source in SOURCES.items():
+                if conn is not None:
+                    version = (db_path, revisions.get(name, 0))
+                else:
+                    version = source.fallback.version()
+                cached = _cache.get(name)
+                if cached is None or cached[0] != version:
+                    if conn is not None:
+                        data = source.load(conn)
+                    else:
+                        data = source.fallback.load() if version is not None else None
+                    cached = (version, _freeze(data))
+                    _cache[name] = cached
+                values[name] = cached[1]
+                versions[name] = version
+        finally:
+            if conn is not None:
+                if conn.in_transaction:
+                    conn.execute('COMMIT')
+                conn.close()
+    return DataSnapshot(versions=types.MappingProxyType(versions), **values)
+
+
+def export_source(name, path=None):
+    """
+    把数据源的当前内容按需导出为 JSON 文件（通过 json_store 原子写入）
+
+    Returns:
+        (文件路径, 条目数, 文件内容的 sha256)
+    """
+    data = getattr(get_snapshot(), name)
+    if isinstance(data, types.MappingProxyType):
+        data = dict(data)
+    elif data is None:
+        data = {} if name == 'settings' else []
+    path = path or SOURCES[name].fallback.path
+    raw = json_store.write_json(path, data).encode('utf-8')
+    count = len(data) if isinstance(data, (list, tuple)) else 1
+    return path, count, hashlib.sha256(raw).hexdigest()
+
+
+def clear_snapshot_cache():
+    """丢弃所有缓存（例如工作目录切换后）"""
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,235 @@
+"""
+事件发布/订阅：/api/events（Server-Sent Events）向前端推送增量事件，前端不必定时拉取完整列表。
+
+- publish() 把事件写入数据库的 app_event 表；HTTP 进程与独立的调度进程共用数据库，调度进程发布的事件也能送达
+- 进程内有订阅者时才启动一个轮询线程，按事件ID顺序读取新事件并分发给本进程的订阅者；
+  本进程发布事件时立即唤醒，其他进程发布的事件最多延迟 EVENT_POLL_SECONDS。没有订阅者时不访问数据库
+- 订阅时可提供上次收到的事件ID（浏览器重连时的 Last-Event-ID），补发之后的事件；
+  缺失的事件太多或已被清理时发送 reset 事件，客户端应重新拉取完整数据
+
+事件类型：
+- notifications.created：预警流程创建了新的待处理通知
+- notifications.updated：通知被加入发送队列或被拒绝
+- mail_task.updated：排队邮件的发送结果（每个任务的 sent/failed）
+- alert_cycle.started / alert_cycle.finished：预警检查开始、结束（地区数、预警数等）
+- health.changed：外部依赖（天气接口、SMTP）的健康状态变化
+"""
+
+import collections
+import json
+import os
+import queue
+import threading
+import time
+
+import sqlite_db
+
+EVENT_POLL_SECONDS = 2  # 轮询其他进程发布的事件的间隔（秒）
+EVENT_RETENTION = 1000  # app_event 表保留的最近事件数
+EVENT_REPLAY_LIMIT = 200  # 重连时最多补发的事件数
+SUBSCRIBER_QUEUE_SIZE = 500  # 单个订阅者积压的事件上限，超过后断开，客户端重连后收到 reset
+# 每个进程同时保持的事件流连接上限：每个连接占用 gunicorn 的一个工作线程，
+# 默认为 THREADS 的四分之一，且始终至少留一个线程处理普通请求
+WORKER_THREADS = int(os.getenv('THREADS', 8))
+MAX_SUBSCRIBERS = max(1, min(int(os.getenv('SSE_MAX_CLIENTS', WORKER_THREADS // 4)), WORKER_THREADS - 1))
+
+Event = collections.namedtuple('Event', ['id', 'type', 'data'])
+
+CREATE_TABLE_SQL = (
+    'CREATE TABLE IF NOT EXISTS app_event ('
+    'id INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT NOT NULL, data TEXT, created_at REAL NOT NULL)'
+)
+
+
+def get_db_path():
+    """事件表所在的数据库（与预警流程相同）"""
+    from data_snapshot import get_db_path as snapshot_db_path
+    return snapshot_db_path()
+
+
+def format_sse(event):
+    """格式化为 text/event-stream 中的一条事件"""
+    data = json.dumps(event.data, ensure_ascii=False)
+    return f"id: {event.id}\nevent: {event.type}\ndata: {data}\n\n"
+
+
+class Subscriber:
+    """一个事件流连接：事件放入有界队列，由请求线程取出写给客户端"""
+
+    def __init__(self, bus, last_id, types=None):
+        self.bus = bus
+        self.last_id = last_id
+        self.types = set(types) if types else None
+        self.overflowed = False
+        self._queue = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def put(self, event):
+        """分发事件（调用方持有总线的锁）；积压过多时标记溢出并返回 False"""
+        if event.id <= self.last_id:
+            return True
+        self.last_id = event.id
+        if self.types is not None and event.type not in self.types and event.type != 'reset':
+            return True
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.overflowed = True
+            return False
+
+    def get(self, timeout):
+        """等待下一个事件，超时返回 None"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    def __init__(self, db_path_getter=get_db_path):
+        self._get_db_path = db_path_getter
+        self._cond = threading.Condition()
+        self._subscribers = []
+        self._thread = None
+        self._last_id = 0
+        self._wake = False
+        self._published = 0
+        self._ready_paths = set()
+
+    def _connect(self):
+        db_path = self._get_db_path()
+        conn = sqlite_db.connect(db_path)
+        if db_path not in self._ready_paths:
+            conn.execute(CREATE_TABLE_SQL)
+            conn.commit()
+            self._ready_paths.add(db_path)
+        return conn
+
+    def publish(self, event_type, data=None):
+        """发布事件；写入失败时只打印错误，不影响调用方"""
+        try:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    'INSERT INTO app_event (type, data, created_at) VALUES (?, ?, ?)',
+                    (event_type, json.dumps(data, ensure_ascii=False), time.time())
+                )
+                self._published += 1
+                if self._published % 100 == 0:
+                    conn.execute(
+                        'DELETE FROM app_event WHERE id <= (SELECT MAX(id) FROM app_event) - ?', (EVENT_RETENTION,)
+                    )
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"发布事件 {event_type} 失败: {e}")
+            return
+        with self._cond:
+            if self._subscribers:
+                self._wake = True
+                self._cond.notify_all()
+
+    def subscribe(self, last_id=None, types=None):
+        """
+        订阅事件
+
+        Args:
+            last_id: 上次收到的事件ID，提供时先补发之后的事件
+            types: 只接收的事件类型（reset 总会发送），None 表示全部
+
+        Returns:
+            Subscriber；连接数达到 MAX_SUBSCRIBERS 时返回 None
+        """
+        with self._cond:
+            if len(self._subscribers) >= MAX_SUBSCRIBERS:
+                return None
+            # 在锁内读取当前位置：与轮询线程的分发互斥，订阅前后的事件不会遗漏或重复
+            conn = self._connect()
+            try:
+                current = conn.execute('SELECT COALESCE(MAX(id), 0), MIN(id) FROM app_event').fetchone()
+                replay = []
+                if last_id is not None and last_id < current[0]:
+                    replay = conn.execute(
+                        'SELECT id, type, data FROM app_event WHERE id > ? ORDER BY id LIMIT ?',
+                        (last_id, EVENT_REPLAY_LIMIT + 1)
+                    ).fetchall()
+            finally:
+                conn.close()
+            subscriber = Subscriber(self, last_id if replay else current[0], types)
+            if len(replay) > EVENT_REPLAY_LIMIT or (replay and current[1] > last_id + 1):
+                subscriber.put(Event(current[0], 'reset', {}))
+            else:
+                for row in replay:
+                    subscriber.put(Event(row[0], row[1], json.loads(row[2])))
+            self._subscribers.append(subscriber)
+            if self._thread is None:
+                self._last_id = current[0]
+                self._thread = threading.Thread(target=self._poll_loop, name='event-bus', daemon=True)
+                self._thread.start()
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._cond:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+            self._cond.notify_all()
+
+    def subscriber_count(self):
+        with self._cond:
+            return len(self._subscribers)
+
+    def _poll_loop(self):
+        conn = None
+        try:
+            while True:
+                with self._cond:
+                    if self._subscribers and not self._wake:
+                        self._cond.wait(EVENT_POLL_SECONDS)
+                    self._wake = False
+                    if not self._subscribers:
+                        return
+                    last_id = self._last_id
+                try:
+                    if conn is None:
+                        conn = self._connect()
+                    rows = conn.execute(
+                        'SELECT id, type, data FROM app_event WHERE id > ? ORDER BY id LIMIT 500', (last_id,)
+                    ).fetchall()
+                except Exception as e:
+                    print(f"读取事件失败: {e}")
+                    rows = []
+                if not rows:
+                    continue
+                events = [Event(row[0], row[1], json.loads(row[2])) for row in rows]
+                with self._cond:
+                    self._last_id = events[-1].id
+                    for subscriber in list(self._subscribers):
+                        if not all(subscriber.put(event) for event in events):
+                            # 客户端处理不过来：断开，重连后收到 reset 重新拉取
+                            self._subscribers.remove(subscriber)
+        finally:
+            if conn is not None:
+                conn.close()
+            with self._cond:
+                self._thread = None
+                if self._subscribers:
+                    # 异常退出时仍有订阅者，重新启动轮询线程
+                    self._thread = threading.Thread(target=self._poll_loop, name='event-bus', daemon=True)
+                    self._thread.start()
+
+
+_bus = EventBus()
+
+
+def publish(event_type, data=None):
+    """发布事件（见模块说明中的事件类型）"""
+    _bus.publish(event_type, data)
+
+
+def subscribe(last_id=None, types=None):
+    """订阅事件，连接数达到上限时返回 None"""
+    return _bus.subscribe(last_id, types)
@@ -0,0 +1,94 @@
+// 服务端事件推送：整个页面共用一个 EventSource，各模块通过 window.serverEvents.on 订阅
+(function() {
+    const RECONNECT_DELAY = 30000; // 服务端拒绝连接（连接数已满等）后的重连间隔（毫秒）
+    const POLL_INTERVAL = 15000; // 事件流未连接时回退轮询的间隔（毫秒）
+    const handlers = {};
+    const pollers = [];
+    let source = null;
+    let connected = false;
+    let missedEvents = false; // 连接被拒绝期间可能漏掉了事件，重新连上时需要刷新一次
+
+    function runPollers() {
+        pollers.forEach(poller => {
+            try {
+                poller();
+            } catch (error) {
+                console.error('轮询刷新失败:', error);
+            }
+        });
+    }
+
+    function dispatch(type, data) {
+        (handlers[type] || []).forEach(handler => {
+            try {
+                handler(data);
+            } catch (error) {
+                console.error(`处理事件 ${type} 失败:`, error);
+            }
+        });
+    }
+
+    function listen(type) {
+        source.addEventListener(type, (e) => {
+            let data = {};
+            try {
+                data = JSON.parse(e.data);
+            } catch (error) {
+                console.error('事件数据格式错误:', error);
+            }
+            dispatch(type, data);
+        });
+    }
+
+    function connect() {
+        if (typeof EventSource === 'undefined') {
+            return;
+        }
+        source = new EventSource('/api/events');
+        source.onopen = () => {
+            connected = true;
+            if (missedEvents) {
+                missedEvents = false;
+                runPollers();
+            }
+        };
+        source.onerror = () => {
+            connected = false;
+            // 网络中断时浏览器会自动重连；连接被拒绝（状态变为 CLOSED）时稍后手动重连
+            if (source.readyState === EventSource.CLOSED) {
+                source = null;
+                missedEvents = true;
+                setTimeout(connect, RECONNECT_DELAY);
+            }
+        };
+        Object.keys(handlers).forEach(listen);
+    }
+
+    window.serverEvents = {
+        // 订阅事件类型（如 notifications.created、mail_task.updated、reset）
+        on(type, handler) {
+            if (!handlers[type]) {
+                handlers[type] = [];
+                if (source) {
+                    listen(type);
+                }
+            }
+            handlers[type].push(handler);
+        },
+        // 注册事件流未连接（如连接数已满被拒绝）时定期执行的刷新函数，重新连上后再刷新一次
+        poll(refresh) {
+            pollers.push(refresh);
+        },
+        // 事件流是否已连接；未连接时调用方应回退为轮询
+        isConnected() {
+            return connected;
+        }
+    };
+
+    document.addEventListener('DOMContentLoaded', connect);
+    setInterval(() => {
+        if (!connected) {
+            runPollers();
+        }
+    }, POLL_INTERVAL);
+})();
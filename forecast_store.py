@@ -0,0 +1,253 @@
+import json
+import os
+import time
+import datetime
+
+from sqlite_db import get_connection
+
+
+class ForecastStore:
+    """
+    逐地区预报快照库：按 (地区, 预报日期) 保存最近一次成功获取的预报，供接口失败时兜底；
+    同时记录每个地区的城市ID、上游 updateTime 与最近检查时间，用于增量刷新
+    """
+
+    def __init__(self, db_path='instance/forecast_store.db'):
+        """初始化快照库
+
+        Args:
+            db_path: 快照数据库路径
+        """
+        self.db_path = db_path
+        self._init_db()
+
+    def _connect(self):
+        """当前线程复用的连接（close() 只结束未提交的事务，见 sqlite_db）"""
+        return get_connection(self.db_path)
+
+    def _init_db(self):
+        """初始化快照表"""
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS forecast_snapshot (
+            region TEXT NOT NULL,
+            fx_date TEXT NOT NULL,
+            data TEXT NOT NULL,
+            fetched_at INTEGER NOT NULL,
+            PRIMARY KEY (region, fx_date)
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS location_state (
+            region TEXT PRIMARY KEY,
+            city_id TEXT,
+            update_time TEXT,
+            checked_at INTEGER
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS region_schedule (
+            region TEXT PRIMARY KEY,
+            last_run_at INTEGER NOT NULL
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS hourly_snapshot (
+            region TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            update_time TEXT,
+            fetched_at INTEGER NOT NULL
+        )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def save_regions(self, weather_data, fetched_at=None):
+        """批量保存本轮成功获取的预报（单个事务）
+
+        Args:
+            weather_data: {地区: {'region', 'forecasts': [...], 'hourly': [...]}}，带 stale 标记的兜底数据会被跳过
+            fetched_at: 获取时间戳（秒），默认当前时间
+        """
+        fetched_at = int(fetched_at or time.time())
+        rows = []
+        hourly_rows = []
+        for region, region_data in weather_data.items():
+            if region_data.get('stale'):
+                continue
+            for forecast in region_data.get('forecasts', []):
+                if forecast.get('date'):
+                    rows.append((region, forecast['date'], json.dumps(forecast, ensure_ascii=False), fetched_at))
+            if region_data.get('hourly'):
+                hourly_rows.append((
+                    region,
+                    json.dumps(region_data['hourly'], ensure_ascii=False),
+                    region_data.get('hourlyUpdateTime'),
+                    fetched_at
+                ))
+        if not rows and not hourly_rows:
+            return 0
+
+        conn = self._connect()
+        try:
+            conn.executemany(
+                'INSERT OR REPLACE INTO forecast_snapshot (region, fx_date, data, fetched_at) VALUES (?, ?, ?, ?)',
+                rows
+            )
+            conn.executemany(
+                'INSERT OR REPLACE INTO hourly_snapshot (region, data, update_time, fetched_at) VALUES (?, ?, ?, ?)',
+                hourly_rows
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return len(rows)
+
+    def load_region(self, region, max_age_seconds, today=None):
+        """读取地区在有效期内、且预报日期不早于今天的最新快照
+
+        Args:
+            region: 地区名称
+            max_age_seconds: 允许的最大陈旧时间（秒）
+            today: 今天的日期字符串（YYYY-MM-DD），默认当前日期
+
+        Returns:
+            与 fetch_weather_data 相同结构的地区数据（带 stale/fetchedAt 标记），无可用数据时返回None
+        """
+        return self.load_regions([region], max_age_seconds, today).get(region)
+
+    def load_regions(self, regions, max_age_seconds, today=None):
+        """批量读取多个地区的快照（单次查询）；有逐小时快照时附带尚未过去的小时数据
+
+        Returns:
+            {地区: 地区数据}，没有可用快照的地区不出现在结果中
+        """
+        regions = list(regions)
+        if not regions:
+            return {}
+        today = today or datetime.date.today().strftime('%Y-%m-%d')
+        oldest = int(time.time() - max_age_seconds)
+
+        conn = self._connect()
+        try:
+            # 地区列表作为一个 JSON 参数传入，不受变量个数限制；连接按线程复用，不能留下临时表
+            wanted = json.dumps(regions, ensure_ascii=False)
+            rows = conn.execute(
+                'SELECT region, data, fetched_at FROM forecast_snapshot '
+                'WHERE region IN (SELECT value FROM json_each(?)) AND fx_date >= ? AND fetched_at >= ? '
+                'ORDER BY region, fx_date',
+                (wanted, today, oldest)
+            ).fetchall()
+            hourly_rows = conn.execute(
+                'SELECT region, data, update_time FROM hourly_snapshot '
+                'WHERE region IN (SELECT value FROM json_each(?)) AND fetched_at >= ?',
+                (wanted, oldest)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        result = {}
+        for region, data, fetched_at in rows:
+            entry = result.get(region)
+            if entry is None:
+                entry = result[region] = {'region': region, 'forecasts': [], 'stale': True, 'fetchedAt': fetched_at}
+            entry['forecasts'].append(json.loads(data))
+            entry['fetchedAt'] = max(entry['fetchedAt'], fetched_at)
+        for entry in result.values():
+            entry['updateTime'] = datetime.datetime.fromtimestamp(entry['fetchedAt']).strftime('%Y-%m-%d %H:%M:%S')
+
+        current_hour = datetime.datetime.now().strftime('%Y-%m-%dT%H')
+        for region, data, update_time in hourly_rows:
+            if region in result:
+                result[region]['hourly'] = [
+                    hour for hour in json.loads(data) if hour.get('fxTime', '')[:13] >= current_hour
+                ]
+                result[region]['hourlyUpdateTime'] = update_time
+        return result
+
+    def load_location_states(self):
+        """读取所有地区的状态
+
+        Returns:
+            {地区: {'city_id', 'update_time', 'checked_at'}}
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT region, city_id, update_time, checked_at FROM location_state').fetchall()
+        finally:
+            conn.close()
+        return {
+            region: {'city_id': city_id, 'update_time': update_time, 'checked_at': checked_at or 0}
+            for region, city_id, update_time, checked_at in rows
+        }
+
+    def save_location_states(self, states):
+        """批量保存地区状态（单个事务）
+
+        Args:
+            states: {地区: {'city_id', 'update_time', 'checked_at'}}
+        """
+        if not states:
+            return
+        conn = self._connect()
+        try:
+            conn.executemany(
+                'INSERT OR REPLACE INTO location_state (region, city_id, update_time, checked_at) VALUES (?, ?, ?, ?)',
+                [
+                    (region, state.get('city_id'), state.get('update_time'), int(state.get('checked_at') or 0))
+                    for region, state in states.items()
+                ]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def load_schedule_runs(self):
+        """读取每个地区最近一次预警检查的时间戳
+
+        Returns:
+            {地区: 时间戳（秒）}
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT region, last_run_at FROM region_schedule').fetchall()
+        finally:
+            conn.close()
+        return dict(rows)
+
+    def save_schedule_runs(self, regions, last_run_at=None):
+        """批量记录地区的预警检查时间（单个事务）"""
+        if not regions:
+            return
+        last_run_at = int(last_run_at or time.time())
+        conn = self._connect()
+        try:
+            conn.executemany(
+                'INSERT OR REPLACE INTO region_schedule (region, last_run_at) VALUES (?, ?)',
+                [(region, last_run_at) for region in regions]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def prune(self, max_age_seconds, today=None):
+        """删除过期快照与已经过去的预报日期"""
+        today = today or datetime.date.today().strftime('%Y-%m-%d')
+        oldest = int(time.time() - max_age_seconds)
+
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                'DELETE FROM forecast_snapshot WHERE fetched_at < ? OR fx_date < ?',
+                (oldest, today)
+            )
+            conn.execute('DELETE FROM hourly_snapshot WHERE fetched_at < ?', (oldest,))
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
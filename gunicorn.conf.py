@@ -0,0 +1,30 @@
+"""
+gunicorn 配置：多进程 + 线程池提供HTTP服务，参数均可用环境变量覆盖（见 deploy/weather-alert.service）。
+"""
+
+import multiprocessing
+import os
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+
+# 每个 CPU 核心两个工作进程，另加一个；SQLite 写入串行，进程数过多收益有限，默认不超过8个
+workers = int(os.getenv('WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = 'gthread'
+# 事件推送（/api/events）的每个连接长期占用一个线程，每个进程的连接数由 SSE_MAX_CLIENTS 限制
+# （默认 THREADS 的四分之一，最多 THREADS-1，见 event_bus.py）；页面较多时应同时调大 THREADS
+threads = int(os.getenv('THREADS', 8))
+
+timeout = int(os.getenv('TIMEOUT', 120))  # 单个请求的最长处理时间（秒），发送测试邮件等接口较慢
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', 30))  # 重启时等待进行中请求完成的时间（秒）
+keepalive = int(os.getenv('KEEPALIVE', 5))  # 长连接保持时间（秒），前置 nginx 时应小于其 upstream keepalive_timeout
+
+# 处理一定数量的请求后重启工作进程，避免长期运行的内存增长；加入抖动避免所有进程同时重启
+max_requests = int(os.getenv('MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER', 200))
+
+accesslog = os.getenv('ACCESS_LOG', '-')
+errorlog = os.getenv('ERROR_LOG', '-')
+loglevel = os.getenv('LOG_LEVEL', 'info')
+
+# HTTP 进程不运行预警调度
+raw_env = ['SKYALERT_RUN_SCHEDULER=0']
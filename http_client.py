@@ -0,0 +1,93 @@
+"""
+共享HTTP客户端：为和风天气等外部接口提供带连接池的长连接会话。
+同一进程内复用TCP/TLS连接，避免每次请求都重新握手。
+
+可通过环境变量调整：
+- HTTP_POOL_SIZE：每个主机的连接池大小（默认20）
+- HTTP_CONNECT_TIMEOUT：建立连接超时（秒，默认5）
+- HTTP_READ_TIMEOUT：读取响应超时（秒，默认15）
+"""
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def _env_number(name, default, cast=int):
+    """读取数值型环境变量，非法值回退默认值"""
+    try:
+        value = cast(os.getenv(name, default))
+        return value if value > 0 else default
+    except (TypeError, ValueError):
+        return default
+
+
+HTTP_POOL_SIZE = _env_number('HTTP_POOL_SIZE', 20)
+HTTP_CONNECT_TIMEOUT = _env_number('HTTP_CONNECT_TIMEOUT', 5, float)
+HTTP_READ_TIMEOUT = _env_number('HTTP_READ_TIMEOUT', 15, float)
+
+DEFAULT_HEADERS = {
+    'Accept': 'application/json',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+}
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def _build_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=HTTP_POOL_SIZE,
+        pool_block=False,
+        max_retries=0,  # 重试策略由调用方控制
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+def get_session():
+    """获取进程内共享的会话；fork 出的子进程会重新创建，避免共用父进程的套接字"""
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is not None and _session_pid == pid:
+        return _session
+    with _session_lock:
+        if _session is None or _session_pid != pid:
+            _session = _build_session()
+            _session_pid = pid
+    return _session
+
+
+def http_get(url, params=None, timeout=None, **kwargs):
+    """
+    通过共享连接池发送GET请求
+
+    参数:
+    - url: 请求地址
+    - params: 查询参数
+    - timeout: 超时（秒或(连接, 读取)元组），默认使用全局配置
+
+    返回:
+    - requests.Response
+    """
+    if timeout is None:
+        timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    return get_session().get(url, params=params, timeout=timeout, **kwargs)
+
+
+def close_session():
+    """关闭共享会话，释放连接池（进程退出或测试时使用）"""
+    global _session, _session_pid
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _session_pid = None
@@ -0,0 +1,305 @@
+"""
+JSON 数据文件的读写：data.json、re-Emile.json、pending_notifications.json、health_status.json、
+favorite_cities.json、user.json、customers_data.json 等都通过这里持久化。
+
+- 写入先写到同目录的临时文件并 fsync，再用 os.replace 替换，写到一半崩溃不会留下残缺的文件
+- 每个文件一把锁：同一进程的线程之间用 RLock 互斥，支持 fcntl 的平台再对 <文件>.lock 加文件锁，
+  HTTP 进程与调度进程之间也不会互相覆盖；“读取-修改-写入”放在 locked() 中完成
+- 数组文件的追加写入 <文件>.journal（每行一条 JSON，写入后 fsync），不必重写整个文件；
+  后台线程在 JSON_JOURNAL_COMPACT_SECONDS 后把日志合并进主文件（同时按上限裁剪），
+  read_json() 会带上尚未合并的日志，进程异常退出时留下的日志在下次读取或合并时补上
+- 统一使用紧凑编码（不缩进），减少文件体积与写入量
+
+可通过环境变量调整：
+- JSON_JOURNAL：设为 0 时追加不写日志，直接重写主文件
+- JSON_JOURNAL_COMPACT_SECONDS：追加后合并日志的延迟（秒，默认1）
+"""
+
+import atexit
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只做进程内的互斥
+    fcntl = None
+
+JOURNAL_ENABLED = os.getenv('JSON_JOURNAL', '1') != '0'
+JOURNAL_COMPACT_SECONDS = float(os.getenv('JSON_JOURNAL_COMPACT_SECONDS', 1))
+JOURNAL_SUFFIX = '.journal'
+LOCK_SUFFIX = '.lock'
+
+
+def dumps(data):
+    """紧凑编码（保留中文）"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+class FileLock:
+    """单个 JSON 文件的锁，可在同一线程内重入"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                self._fd = os.open(self.path + LOCK_SUFFIX, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except OSError as e:
+                print(f"获取文件锁失败: {self.path} - {e}")
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._lock.release()
+        return False
+
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _reset_locks():
+    # fork 出的子进程不能沿用父进程中可能被其他线程持有的锁
+    global _locks_guard
+    _locks.clear()
+    _locks_guard = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_locks)
+
+
+def locked(path):
+    """取得文件的锁（with json_store.locked(path): ...），读取与写入在锁内自动重入"""
+    key = os.path.abspath(path)
+    with _locks_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = FileLock(key)
+        return lock
+
+
+def _journal_path(path):
+    return path + JOURNAL_SUFFIX
+
+
+def has_journal(path):
+    """是否有尚未合并进主文件的追加日志"""
+    return os.path.exists(_journal_path(path))
+
+
+def _read_base(path):
+    """读取主文件：(数据, 是否已损坏)；文件不存在时数据为 None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f), False
+    except FileNotFoundError:
+        return None, False
+    except ValueError as e:
+        print(f"JSON文件格式错误: {path} - {e}")
+        return None, True
+
+
+def _read_journal(path):
+    """读取追加日志；最后一行可能在写入时中断，无法解析的行跳过"""
+    entries = []
+    try:
+        with open(_journal_path(path), 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    print(f"跳过无法解析的日志行: {_journal_path(path)}")
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def _remove_journal(path):
+    try:
+        os.remove(_journal_path(path))
+    except FileNotFoundError:
+        pass
+
+
+def _atomic_write(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            # mkstemp 创建的文件只有属主可读，沿用原文件的权限
+            os.chmod(tmp_path, os.stat(path).st_mode if os.path.exists(path) else 0o644)
+        except OSError:
+            pass
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def read_json(path, default=None):
+    """
+    读取 JSON 文件（数组文件带上尚未合并的追加日志）
+
+    Returns:
+        解析后的数据；文件不存在或格式错误时返回 default
+    """
+    with locked(path):
+        data, _ = _read_base(path)
+        entries = _read_journal(path)
+    if entries:
+        data = (data if isinstance(data, list) else []) + entries
+    return default if data is None else data
+
+
+def write_json(path, data):
+    """
+    原子写入整个文件（已包含全部数据，丢弃追加日志）
+
+    Returns:
+        写入的文本
+    """
+    text = dumps(data)
+    with locked(path):
+        _atomic_write(path, text)
+        _remove_journal(path)
+    return text
+
+
+def replace_file(tmp_path, path):
+    """用已经写好的临时文件（须与目标在同一目录）原子替换目标文件，用于逐条流式写出的大文件"""
+    with locked(path):
+        with open(tmp_path, 'rb+') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _remove_journal(path)
+
+
+def append_json(path, entries, max_entries=None, on_trim=None):
+    """
+    向数组文件追加记录：写入追加日志，由后台线程合并进主文件
+
+    Args:
+        max_entries: 合并时最多保留的记录数（保留最新的）
+        on_trim: 合并时需要裁剪的回调 on_trim(path)，在主文件被替换之前调用（例如备份）
+    """
+    if not entries:
+        return
+    if not JOURNAL_ENABLED:
+        with locked(path):
+            data = read_json(path, [])
+            write_json(path, (data if isinstance(data, list) else []) + list(entries))
+        compact(path, max_entries, on_trim)
+        return
+    with locked(path):
+        with open(_journal_path(path), 'a', encoding='utf-8') as f:
+            f.write(''.join(dumps(entry) + '\n' for entry in entries))
+            f.flush()
+            os.fsync(f.fileno())
+    _compactor.schedule(path, max_entries, on_trim)
+
+
+def compact(path, max_entries=None, on_trim=None):
+    """把追加日志合并进主文件；指定 max_entries 时同时裁剪到最新的记录"""
+    if max_entries is None and not has_journal(path):
+        return
+    with locked(path):
+        entries = _read_journal(path)
+        if not entries and max_entries is None:
+            return
+        data, corrupt = _read_base(path)
+        if not isinstance(data, list):
+            if not entries:
+                return
+            if corrupt:
+                # 无法解析的主文件另存一份，避免被新数据覆盖后无从恢复
+                corrupt_path = f"{path}.{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.corrupt"
+                shutil.copy(path, corrupt_path)
+                print(f"{path} 已损坏，已另存为 {corrupt_path}")
+            data = []
+        merged = data + entries
+        if max_entries is not None and len(merged) > max_entries:
+            if on_trim is not None:
+                on_trim(path)
+            merged = merged[-max_entries:]
+        elif not entries:
+            return
+        _atomic_write(path, dumps(merged))
+        _remove_journal(path)
+
+
+class _Compactor:
+    """后台合并追加日志：同一文件在延迟期间的多次追加只合并一次"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._thread = None
+        self._pid = None
+
+    def schedule(self, path, max_entries, on_trim):
+        with self._cond:
+            self._pending[path] = (max_entries, on_trim)
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='json-compactor', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            # 等待一小段时间，把这段时间内的追加一起合并
+            threading.Event().wait(JOURNAL_COMPACT_SECONDS)
+            self.flush()
+
+    def flush(self):
+        """立即合并全部待合并的文件"""
+        with self._cond:
+            pending, self._pending = self._pending, {}
+        for path, (max_entries, on_trim) in pending.items():
+            try:
+                compact(path, max_entries, on_trim)
+            except Exception as e:
+                print(f"合并追加日志失败: {path} - {e}")
+
+
+_compactor = _Compactor()
+
+
+def flush():
+    """立即合并全部待合并的追加日志（进程退出时自动执行）"""
+    _compactor.flush()
+
+
+atexit.register(flush)
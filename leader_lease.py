@@ -0,0 +1,276 @@
+"""
+预警调度的主实例选举：基于数据库租约。
+
+多个应用进程（负载均衡后的多实例，或守护脚本重启时新旧进程短暂并存）共用同一个
+skyalert.db。每个进程都参与选举，只有持有租约的实例运行预警调度器，其余实例只提供
+HTTP 服务。主实例定期续约；进程退出时释放租约，异常退出时租约到期后由其他实例接管。
+
+leader_control 表记录预警调度是否启用：后台的启动/停止操作写入该表，所有参与选举的
+进程（包括独立的调度进程）在下次续约时生效，停用时主实例退位并释放租约。
+"""
+
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+
+from sqlite_db import connect
+
+LEADER_LEASE_SECONDS = 60  # 租约有效期（秒）：主实例超过该时间未续约即可被接管
+LEADER_HEARTBEAT_SECONDS = 15  # 续约/竞选间隔（秒），应明显小于租约有效期
+
+
+def make_holder_id():
+    """实例标识：主机名:进程号:随机后缀"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaderLease:
+    """leader_lease 表中的一条具名租约"""
+
+    def __init__(self, db_path, name='alert_scheduler', lease_seconds=LEADER_LEASE_SECONDS, holder_id=None):
+        """
+        Args:
+            db_path: SQLite 数据库路径（与应用共用 skyalert.db）
+            name: 租约名称，不同用途的调度可以使用不同租约
+            lease_seconds: 租约有效期（秒）
+            holder_id: 本实例标识，默认自动生成
+        """
+        self.db_path = db_path
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.holder_id = holder_id or make_holder_id()
+        self._table_ready = False
+
+    def _connect(self):
+        conn = connect(self.db_path, timeout=5, isolation_level=None)
+        if not self._table_ready:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS leader_lease (
+                name TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                acquired_at REAL NOT NULL,
+                heartbeat_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            ''')
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS leader_control (
+                name TEXT PRIMARY KEY,
+                enabled INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            ''')
+            self._table_ready = True
+        return conn
+
+    def try_acquire(self):
+        """
+        尝试获取或续约租约
+
+        Returns:
+            (是否持有租约, 租约到期时间戳)
+        """
+        now = time.time()
+        expires_at = now + self.lease_seconds
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE 先拿写锁，保证“读取-判断-写入”在多个进程之间是原子的
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT holder, expires_at FROM leader_lease WHERE name = ?', (self.name,)
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    'INSERT INTO leader_lease (name, holder, acquired_at, heartbeat_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+                    (self.name, self.holder_id, now, now, expires_at)
+                )
+            elif row[0] == self.holder_id:
+                conn.execute(
+                    'UPDATE leader_lease SET heartbeat_at = ?, expires_at = ? WHERE name = ?',
+                    (now, expires_at, self.name)
+                )
+            elif row[1] <= now:
+                print(f"租约 {self.name} 已过期（原持有者 {row[0]}），由 {self.holder_id} 接管")
+                conn.execute(
+                    'UPDATE leader_lease SET holder = ?, acquired_at = ?, heartbeat_at = ?, expires_at = ? WHERE name = ?',
+                    (self.holder_id, now, now, expires_at, self.name)
+                )
+            else:
+                conn.execute('COMMIT')
+                return False, row[1]
+            conn.execute('COMMIT')
+            return True, expires_at
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def is_enabled(self):
+        """该租约对应的调度是否启用，未设置过时视为启用"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT enabled FROM leader_control WHERE name = ?', (self.name,)).fetchone()
+        finally:
+            conn.close()
+        return row is None or bool(row[0])
+
+    def set_enabled(self, enabled):
+        """启用或停用该租约对应的调度，对所有实例生效"""
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO leader_control (name, enabled, updated_at) VALUES (?, ?, ?)',
+                (self.name, 1 if enabled else 0, time.time())
+            )
+        finally:
+            conn.close()
+
+    def release(self):
+        """释放本实例持有的租约，其他实例下次竞选即可接管"""
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM leader_lease WHERE name = ? AND holder = ?', (self.name, self.holder_id))
+        finally:
+            conn.close()
+
+    def current(self):
+        """当前租约信息，没有租约时返回 None"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT holder, acquired_at, heartbeat_at, expires_at FROM leader_lease WHERE name = ?', (self.name,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        holder, acquired_at, heartbeat_at, expires_at = row
+        fmt = lambda ts: time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))
+        return {
+            'holder': holder,
+            'acquiredAt': fmt(acquired_at),
+            'heartbeatAt': fmt(heartbeat_at),
+            'expiresAt': fmt(expires_at),
+            'expired': expires_at <= time.time()
+        }
+
+
+class LeaderElector:
+    """后台竞选线程：持有租约时调用 on_elected，失去租约时调用 on_demoted"""
+
+    def __init__(self, lease, on_elected, on_demoted, heartbeat_seconds=LEADER_HEARTBEAT_SECONDS):
+        """
+        Args:
+            lease: LeaderLease
+            on_elected: 成为主实例时调用；之后每次续约成功也会调用，需保证可重复调用
+            on_demoted: 失去租约或停止竞选时调用
+            heartbeat_seconds: 续约/竞选间隔（秒）
+        """
+        self.lease = lease
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.heartbeat_seconds = heartbeat_seconds
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._leader = False
+        self._expires_at = 0
+        self._enabled = None
+
+    def is_leader(self):
+        """本实例当前是否持有有效租约"""
+        return self._leader and time.time() < self._expires_at
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def wake(self):
+        """立即执行一次竞选/续约（例如启用状态刚被修改）"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def start(self):
+        """开始参与选举；已在运行时返回 False"""
+        with self._cond:
+            if self.is_running():
+                return False
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='leader-elector', daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self, timeout=None):
+        """停止参与选举并释放租约"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        thread = self._thread
+        if timeout is not None and thread and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def status(self):
+        try:
+            current = self.lease.current()
+            enabled = self.lease.is_enabled()
+        except Exception as e:
+            current, enabled = {'error': str(e)}, self._enabled
+        return {
+            'instance': self.lease.holder_id,
+            'participating': self.is_running(),
+            'enabled': enabled,
+            'isLeader': self.is_leader(),
+            'lease': current
+        }
+
+    def _set_leader(self, leader):
+        was_leader = self._leader
+        self._leader = leader
+        try:
+            if leader:
+                if not was_leader:
+                    print(f"实例 {self.lease.holder_id} 成为主实例，开始运行预警调度")
+                self.on_elected()
+            elif was_leader:
+                print(f"实例 {self.lease.holder_id} 失去主实例租约，停止预警调度")
+                self.on_demoted()
+        except Exception as e:
+            print(f"主实例切换回调执行失败: {e}")
+            traceback.print_exc()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopping:
+                    break
+            try:
+                self._enabled = self.lease.is_enabled()
+                if self._enabled:
+                    leader, expires_at = self.lease.try_acquire()
+                    if leader:
+                        self._expires_at = expires_at
+                    self._set_leader(leader)
+                elif self._leader:
+                    # 调度已被停用：主实例退位并释放租约
+                    self._set_leader(False)
+                    self.lease.release()
+            except Exception as e:
+                print(f"租约续约失败: {e}")
+                # 无法续约且本地记录的租约已到期时必须主动退位，避免与接管者同时运行
+                if self._leader and time.time() >= self._expires_at:
+                    self._set_leader(False)
+            with self._cond:
+                if not self._stopping:
+                    self._cond.wait(self.heartbeat_seconds)
+
+        was_leader = self._leader
+        self._set_leader(False)
+        if was_leader:
+            try:
+                self.lease.release()
+            except Exception as e:
+                print(f"释放租约失败: {e}")
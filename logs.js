@@ -677,6 +677,13 @@ async function batchResendLogs() {
 // Initialize logs when the page loads
 document.addEventListener('DOMContentLoaded', function() {
   fetchLogs();
+
+  // 邮件发送完成或预警检查结束后，服务端推送事件时刷新日志
+  if (window.serverEvents) {
+    window.serverEvents.on('mail_task.updated', fetchLogs);
+    window.serverEvents.on('alert_cycle.finished', fetchLogs);
+    window.serverEvents.poll(fetchLogs);
+  }
   
   // Add event listener for test alert button
   const testAlertBtn = document.getElementById('test-alert-btn');
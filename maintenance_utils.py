@@ -1,8 +1,10 @@
 import os
-import json
 import datetime
 import shutil
 
+import event_bus
+import json_store
+
 # 日志备份目录与健康状态文件常量
 LOG_BACKUP_DIR = os.path.join('logs', 'json_backups')
 HEALTH_STATUS_FILE = 'health_status.json'
@@ -31,11 +33,7 @@ def backup_if_has_data(file_path, prefix):
     """仅在文件存在有效数据时进行备份，避免空文件占用空间"""
     if not os.path.exists(file_path):
         return
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except Exception:
-        data = None
+    data = json_store.read_json(file_path)
     if isinstance(data, list) and len(data) == 0:
         return
     if data in (None, {}, []):
@@ -47,34 +45,52 @@ def trim_json_file(file_path, prefix, max_entries=2000):
     """裁剪JSON数组文件，超过阈值时备份并仅保留最新记录"""
     if not os.path.exists(file_path):
         return
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
+    with json_store.locked(file_path):
+        # 先合并追加日志，备份的文件才包含全部记录
+        json_store.compact(file_path)
+        data = json_store.read_json(file_path)
+        if data is None:
+            backup_json_file(file_path, prefix)
+            return
+        if not isinstance(data, list):
+            return
+        if len(data) <= max_entries:
+            return
         backup_json_file(file_path, prefix)
-        return
-    if not isinstance(data, list):
-        return
-    if len(data) <= max_entries:
-        return
-    backup_json_file(file_path, prefix)
-    trimmed = data[-max_entries:]
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(trimmed, f, ensure_ascii=False, indent=4)
+        json_store.write_json(file_path, data[-max_entries:])
+
+
+def append_json_array(file_path, entries, prefix=None, max_entries=None):
+    """
+    把记录追加到JSON数组文件：写入追加日志，不重新读取和写入已有内容（见 json_store）。
+    提供 max_entries 时合并日志时裁剪到最新的记录，裁剪前按 prefix 备份
+    """
+    on_trim = (lambda path: backup_json_file(path, prefix)) if prefix else None
+    json_store.append_json(file_path, entries, max_entries=max_entries, on_trim=on_trim)
 
 
 def log_health(service_name, success, message):
     """记录外部依赖健康状况，方便前端或运维查看"""
     _ensure_directory(os.path.dirname(HEALTH_STATUS_FILE) or '.')
     timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    data = {}
-    if os.path.exists(HEALTH_STATUS_FILE):
-        try:
-            with open(HEALTH_STATUS_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except json.JSONDecodeError:
-            data = {}
+    with json_store.locked(HEALTH_STATUS_FILE):
+        data = json_store.read_json(HEALTH_STATUS_FILE, {})
+        previous_status = _update_health_entry(data, service_name, success, message, timestamp)
+        json_store.write_json(HEALTH_STATUS_FILE, data)
+    if previous_status != data[service_name]['status']:
+        event_bus.publish('health.changed', {
+            'service': service_name,
+            'status': data[service_name]['status'],
+            'previous': previous_status,
+            'message': message,
+            'timestamp': timestamp
+        })
+
+
+def _update_health_entry(data, service_name, success, message, timestamp):
+    """更新一个服务的健康记录，返回更新前的状态"""
     service_entry = data.get(service_name, {'history': []})
+    previous_status = service_entry.get('status')
     service_entry['last_check'] = timestamp
     if success:
         service_entry['last_success'] = timestamp
@@ -90,6 +106,22 @@ def log_health(service_name, success, message):
     })
     service_entry['history'] = history[-MAX_HEALTH_HISTORY:]
     data[service_name] = service_entry
-    with open(HEALTH_STATUS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+    return previous_status
 
+
+
+def prune_backups(max_age_days=30, backup_dir=LOG_BACKUP_DIR):
+    """删除超过保留天数的JSON备份文件，返回删除数量"""
+    if not os.path.isdir(backup_dir):
+        return 0
+    cutoff = datetime.datetime.now().timestamp() - max_age_days * 86400
+    removed = 0
+    for name in os.listdir(backup_dir):
+        path = os.path.join(backup_dir, name)
+        try:
+            if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError as e:
+            print(f"删除过期备份失败: {path} - {e}")
+    return removed
@@ -59,7 +59,9 @@ def migrate_database():
                     attempts INTEGER DEFAULT 0,
                     error TEXT,
                     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    batch_id VARCHAR(50),
+                    notification_id VARCHAR(50)
                 )
                 """
             )
@@ -28,6 +28,10 @@ document.addEventListener('DOMContentLoaded', () => {
     let uniqueRegions = [];
     // 存储客户数据
     let customersData = [];
+    // 分页：每页条数、下一页游标与待处理通知总数（来自汇总接口）
+    const PAGE_SIZE = 50;
+    let nextCursor = null;
+    let totalPending = 0;
 
     // 获取通知类型对应的图标
     function getNotificationIcon(type) {
@@ -66,7 +70,23 @@ document.addEventListener('DOMContentLoaded', () => {
         return customer ? customer.category : null;
     }
 
-    // 从后端获取通知
+    // 获取一页通知（地区筛选在后端完成）
+    async function fetchNotificationPage(cursor) {
+        const params = new URLSearchParams({ limit: PAGE_SIZE });
+        if (regionFilter && regionFilter.value) {
+            params.set('region', regionFilter.value);
+        }
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        const response = await fetch(`/api/notifications?${params}`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! Status: ${response.status}`);
+        }
+        return response.json();
+    }
+
+    // 从后端获取通知：第一页与按地区汇总的数量（总数与地区列表不需要下载全部通知）
     async function fetchNotifications() {
         try {
             // 确保客户数据已加载
@@ -74,32 +94,48 @@ document.addEventListener('DOMContentLoaded', () => {
                 await loadCustomersData();
             }
             
-            const response = await fetch('/api/notifications');
-            if (!response.ok) {
-                throw new Error(`HTTP error! Status: ${response.status}`);
+            const [page, summaryResponse] = await Promise.all([
+                fetchNotificationPage(null),
+                fetch('/api/notifications/summary?group_by=region')
+            ]);
+            if (!summaryResponse.ok) {
+                throw new Error(`HTTP error! Status: ${summaryResponse.status}`);
             }
-            const data = await response.json();
-            notifications = data;
+            const summary = await summaryResponse.json();
+            notifications = page.items;
+            nextCursor = page.next_cursor;
+            totalPending = summary.total;
+            uniqueRegions = summary.groups.region.map(group => group.value).filter(Boolean);
             updateFilters();
             applyFilters();
         } catch (error) {
             console.error('获取通知失败:', error);
         }
     }
+
+    // 加载下一页通知
+    async function loadMoreNotifications() {
+        if (!nextCursor) return;
+        try {
+            const page = await fetchNotificationPage(nextCursor);
+            notifications = notifications.concat(page.items);
+            nextCursor = page.next_cursor;
+            updateFilters();
+            applyFilters();
+        } catch (error) {
+            console.error('加载更多通知失败:', error);
+        }
+    }
     
     // 更新筛选器选项
     function updateFilters() {
-        // 提取唯一的客户名称
+        // 提取唯一的客户名称（已加载的通知）；地区列表来自汇总接口
         uniqueCustomers = [...new Set(notifications.map(n => {
             const recipientMatch = n.recipient.match(/^([^(]+)/);
             return recipientMatch ? recipientMatch[1].trim() : n.recipient;
         }))];
-        
-        // 提取唯一的地区
-        uniqueRegions = [...new Set(notifications.map(n => {
-            const titleMatch = n.title.match(/- ([^-]+)$/);
-            return titleMatch ? titleMatch[1].trim() : '';
-        }).filter(Boolean))];
+        const selectedCustomer = customerFilter.value;
+        const selectedRegion = regionFilter.value;
         
         // 更新客户筛选器
         customerFilter.innerHTML = '<option value="">全部客户</option>';
@@ -118,12 +154,15 @@ document.addEventListener('DOMContentLoaded', () => {
             option.textContent = region;
             regionFilter.appendChild(option);
         });
+        
+        // 刷新选项后保留当前的筛选
+        customerFilter.value = uniqueCustomers.includes(selectedCustomer) ? selectedCustomer : '';
+        regionFilter.value = selectedRegion;
     }
     
     // 应用筛选条件
     function applyFilters() {
         const selectedCustomer = customerFilter.value;
-        const selectedRegion = regionFilter.value;
         const selectedDuplicateStatus = duplicateFilter.value;
         const selectedUserType = userTypeFilter.value;
         
@@ -131,9 +170,6 @@ document.addEventListener('DOMContentLoaded', () => {
             // 客户筛选
             const customerMatch = selectedCustomer ? notification.recipient.includes(selectedCustomer) : true;
             
-            // 地区筛选
-            const regionMatch = selectedRegion ? notification.title.includes(`- ${selectedRegion}`) : true;
-            
             // 重复邮件筛选
             let duplicateMatch = true;
             if (selectedDuplicateStatus === 'duplicate') {
@@ -155,7 +191,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 userTypeMatch = category === '工程师';
             }
             
-            return customerMatch && regionMatch && duplicateMatch && userTypeMatch;
+            return customerMatch && duplicateMatch && userTypeMatch;
         });
         
         renderNotifications();
@@ -214,6 +250,21 @@ document.addEventListener('DOMContentLoaded', () => {
             })
             .join('');
 
+        // 还有未加载的通知时显示“加载更多”
+        if (nextCursor) {
+            notificationList.insertAdjacentHTML('beforeend', `
+                <div class="text-center">
+                    <button id="load-more-notifications" class="px-4 py-2 text-sm font-medium rounded-md bg-gray-100 text-gray-700 hover:bg-gray-200">
+                        加载更多（已加载 ${notifications.length} / ${totalPending}）
+                    </button>
+                </div>
+            `);
+            document.getElementById('load-more-notifications').addEventListener('click', function() {
+                disableButton(this, '加载中...');
+                loadMoreNotifications();
+            });
+        }
+
         // 添加确认和拒绝按钮的点击事件
         document.querySelectorAll('.approve-btn').forEach(btn => {
             btn.addEventListener('click', function() {
@@ -266,7 +317,7 @@ document.addEventListener('DOMContentLoaded', () => {
         updateSelectAllButtonText();
 
         // 更新未读数量
-        const unreadCount = notifications.length;
+        const unreadCount = totalPending;
         const badge = notificationBtn.querySelector('span');
         if (badge) {
             badge.textContent = unreadCount;
@@ -310,9 +361,11 @@ document.addEventListener('DOMContentLoaded', () => {
             const result = await response.json();
             
             if (result.success) {
-                // 从列表中移除已确认的通知
+                // 已加入发送队列：先从列表中移除，发送结果在后台跟踪
                 notifications = notifications.filter(n => n.notification_id !== notificationId);
+                totalPending = Math.max(totalPending - 1, 0);
                 applyFilters();
+                trackMailTask(result.task_id, result.status_url);
             } else {
                 Swal.fire({
                     icon: 'error',
@@ -340,6 +393,49 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // 发送失败提示
+    function showSendFailure(error) {
+        Swal.fire({
+            icon: 'error',
+            title: '发送失败',
+            text: '邮件发送失败: ' + (error || '未知错误'),
+            toast: true,
+            position: 'top-end',
+            showConfirmButton: false,
+            timer: 5000,
+            timerProgressBar: true
+        });
+    }
+
+    // 通过事件推送跟踪的邮件任务ID
+    const trackedTasks = new Set();
+
+    // 跟踪单个邮件任务，发送失败时提示并刷新列表（失败的通知会回到待处理）
+    async function trackMailTask(taskId, statusUrl) {
+        if (window.serverEvents && window.serverEvents.isConnected()) {
+            // 事件流已连接：等待 mail_task.updated 推送结果
+            trackedTasks.add(taskId);
+            return;
+        }
+        try {
+            while (true) {
+                await new Promise(resolve => setTimeout(resolve, 2000));
+                const response = await fetch(statusUrl);
+                const task = await response.json();
+                if (!task.success || task.status === 'sent') {
+                    return;
+                }
+                if (task.status === 'failed') {
+                    showSendFailure(task.error);
+                    fetchNotifications();
+                    return;
+                }
+            }
+        } catch (error) {
+            console.error('查询发送状态失败:', error);
+        }
+    }
+
     // 拒绝发送通知
     async function rejectNotification(notificationId) {
         try {
@@ -351,6 +447,7 @@ document.addEventListener('DOMContentLoaded', () => {
             if (result.success) {
                 // 从列表中移除已拒绝的通知
                 notifications = notifications.filter(n => n.notification_id !== notificationId);
+                totalPending = Math.max(totalPending - 1, 0);
                 applyFilters();
             } else {
                 Swal.fire({
@@ -419,36 +516,19 @@ document.addEventListener('DOMContentLoaded', () => {
                 }
             });
             
-            let successCount = 0;
-            let failedCount = 0;
-            
-            for (let i = 0; i < selectedIds.length; i++) {
-                const id = selectedIds[i];
-                try {
-                    const response = await fetch(`/api/notifications/${id}/approve`, {
-                        method: 'POST'
-                    });
-                    
-                    if (response.ok) {
-                        const data = await response.json();
-                        if (data.success) {
-                            successCount++;
-                        } else {
-                            failedCount++;
-                        }
-                    } else {
-                        failedCount++;
-                    }
-                    
-                    // 更新进度
-                    Swal.getTitle().textContent = `正在处理...`;
-                    Swal.getHtmlContainer().textContent = `${i + 1}/${selectedIds.length}`;
-                    
-                } catch (error) {
-                    console.error(`确认发送通知 ${id} 失败:`, error);
-                    failedCount++;
-                }
+            // 一次请求加入发送队列，再查询发送进度
+            const response = await fetch('/api/notifications/approve', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ ids: selectedIds })
+            });
+            const data = await response.json();
+            if (!data.success) {
+                throw new Error(data.message || '加入发送队列失败');
             }
+            const job = await waitForSendJob(data.status_url, data.queued);
+            const successCount = job.sent;
+            const failedCount = job.failed + (data.invalid ? data.invalid.length : 0);
             
             // 从列表中移除已确认的通知
             await fetchNotifications();
@@ -512,36 +592,17 @@ document.addEventListener('DOMContentLoaded', () => {
                 }
             });
             
-            let successCount = 0;
-            let failedCount = 0;
-            
-            for (let i = 0; i < selectedIds.length; i++) {
-                const id = selectedIds[i];
-                try {
-                    const response = await fetch(`/api/notifications/${id}/reject`, {
-                        method: 'POST'
-                    });
-                    
-                    if (response.ok) {
-                        const data = await response.json();
-                        if (data.success) {
-                            successCount++;
-                        } else {
-                            failedCount++;
-                        }
-                    } else {
-                        failedCount++;
-                    }
-                    
-                    // 更新进度
-                    Swal.getTitle().textContent = `正在处理...`;
-                    Swal.getHtmlContainer().textContent = `${i + 1}/${selectedIds.length}`;
-                    
-                } catch (error) {
-                    console.error(`拒绝发送通知 ${id} 失败:`, error);
-                    failedCount++;
-                }
+            const response = await fetch('/api/notifications/reject', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ ids: selectedIds })
+            });
+            const data = await response.json();
+            if (!data.success) {
+                throw new Error(data.message || '取消发送失败');
             }
+            const successCount = data.rejected;
+            const failedCount = selectedIds.length - data.rejected;
             
             // 从列表中移除已拒绝的通知
             await fetchNotifications();
@@ -565,6 +626,23 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
     
+    // 轮询批量发送进度，直到队列中的邮件全部处理完
+    async function waitForSendJob(statusUrl, total) {
+        while (true) {
+            const response = await fetch(statusUrl);
+            const job = await response.json();
+            if (!job.success) {
+                throw new Error(job.message || '查询发送进度失败');
+            }
+            Swal.getTitle().textContent = `正在发送...`;
+            Swal.getHtmlContainer().textContent = `${job.sent + job.failed}/${total}`;
+            if (job.done) {
+                return job;
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+    }
+    
     // 获取选中的通知ID
     function getSelectedNotificationIds() {
         const checkboxes = document.querySelectorAll('.notification-checkbox:checked');
@@ -579,7 +657,8 @@ document.addEventListener('DOMContentLoaded', () => {
     }
     
     if (regionFilter) {
-        regionFilter.addEventListener('change', applyFilters);
+        // 地区筛选由后端完成，切换后重新获取第一页
+        regionFilter.addEventListener('change', fetchNotifications);
     }
     
     if (duplicateFilter) {
@@ -623,6 +702,31 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     });
 
+    // 事件推送：新通知、状态变化或发送失败（失败的通知回到待处理）时刷新列表，短时间内的多个事件只刷新一次
+    let refreshTimer = null;
+    function scheduleRefresh() {
+        clearTimeout(refreshTimer);
+        refreshTimer = setTimeout(fetchNotifications, 500);
+    }
+
+    if (window.serverEvents) {
+        window.serverEvents.on('notifications.created', scheduleRefresh);
+        window.serverEvents.on('notifications.updated', scheduleRefresh);
+        window.serverEvents.on('reset', scheduleRefresh);
+        window.serverEvents.poll(fetchNotifications);
+        window.serverEvents.on('mail_task.updated', (data) => {
+            const tasks = data.tasks || [];
+            tasks.forEach(task => {
+                if (trackedTasks.delete(task.task_id) && task.status === 'failed') {
+                    showSendFailure(task.error);
+                }
+            });
+            if (data.failed > 0) {
+                scheduleRefresh();
+            }
+        });
+    }
+
     // 暴露全局函数
     window.approveNotification = approveNotification;
     window.rejectNotification = rejectNotification;
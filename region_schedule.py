@@ -0,0 +1,228 @@
+"""
+逐地区预警检查计划。
+
+默认所有地区按全局的 firstAlertTime / warningInterval 一起检查。在 region_schedules.json
+中配置计划后，匹配到的地区按各自的间隔检查：例如台风季的沿海地区每2小时一次，
+其余地区仍按全局间隔。所有地区的下次检查时间放在同一个按时间排序的堆中，
+调度器只在最近一个地区到期时唤醒，每轮只获取、判断已到期的地区。
+
+计划文件是一个列表，按 priority 从高到低匹配，地区使用第一个匹配且在当月生效的计划：
+    {
+        "name": "沿海台风季",
+        "regions": ["宁波", "温州"],
+        "keywords": ["厦门", "福州"],
+        "months": [6, 7, 8, 9, 10],
+        "intervalHours": 2,
+        "priority": 10,
+        "status": "活跃"
+    }
+regions 为精确匹配的地区，keywords 为地区名包含的关键字，months 省略表示全年生效。
+同一时刻到期的地区按优先级从高到低处理。
+"""
+
+import collections
+import datetime
+import heapq
+import itertools
+import json
+import os
+import threading
+
+from weather_alert_main import calculate_next_alert_time, get_forecast_store
+
+REGION_SCHEDULES_FILE = 'region_schedules.json'
+DEFAULT_PROFILE_NAME = '默认'
+
+ScheduleProfile = collections.namedtuple('ScheduleProfile', 'name regions keywords months interval_hours priority')
+
+# 未匹配任何计划的地区：沿用全局首次预警时间与预警间隔
+DEFAULT_PROFILE = ScheduleProfile(DEFAULT_PROFILE_NAME, frozenset(), (), None, None, 0)
+
+
+def load_schedule_profiles(path=REGION_SCHEDULES_FILE):
+    """读取活跃的地区检查计划，按优先级从高到低排序；文件不存在时返回空列表"""
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"Error loading {path}: {e}")
+        return []
+
+    profiles = []
+    for index, item in enumerate(data if isinstance(data, list) else []):
+        if not isinstance(item, dict) or item.get('status', '活跃') != '活跃':
+            continue
+        try:
+            interval_hours = float(item.get('intervalHours'))
+            priority = int(item.get('priority', 0))
+            months = frozenset(int(month) for month in item['months']) if item.get('months') else None
+        except (TypeError, ValueError):
+            print(f"地区检查计划 {item.get('name') or index} 配置无效，已跳过")
+            continue
+        if interval_hours <= 0:
+            continue
+        profiles.append(ScheduleProfile(
+            name=item.get('name') or f"计划{index + 1}",
+            regions=frozenset(item.get('regions') or ()),
+            keywords=tuple(item.get('keywords') or ()),
+            months=months,
+            interval_hours=interval_hours,
+            priority=priority
+        ))
+    profiles.sort(key=lambda profile: -profile.priority)
+    return profiles
+
+
+def match_profile(region, profiles):
+    """返回地区匹配的第一个计划，没有时返回默认计划"""
+    for profile in profiles:
+        if region in profile.regions or any(keyword in region for keyword in profile.keywords):
+            return profile
+    return DEFAULT_PROFILE
+
+
+class RegionScheduleIndex:
+    """按下次检查时间排序的地区索引（堆 + 版本号，改期时旧堆项自动失效）"""
+
+    def __init__(self, store=None):
+        self._store = store
+        self._lock = threading.Lock()
+        self._heap = []
+        self._seq = itertools.count()
+        self._entries = {}  # 地区 -> [计划, 版本号, 下次检查时间]
+        self._last_runs = None
+        self._settings = {}
+        self._fingerprint = None
+
+    def _get_store(self):
+        if self._store is None:
+            self._store = get_forecast_store()
+        return self._store
+
+    def _due_at(self, region, profile, now):
+        last_run = self._last_runs.get(region)
+        if profile.interval_hours is None:
+            # 默认计划：上次检查之后的下一个全局预警时间点，从未检查过则等下一个时间点
+            base = datetime.datetime.fromtimestamp(last_run) if last_run else now
+            return calculate_next_alert_time(self._settings, now=base)
+        if not last_run:
+            return now
+        return datetime.datetime.fromtimestamp(last_run) + datetime.timedelta(hours=profile.interval_hours)
+
+    def _push(self, region, profile, now):
+        """计算地区下次检查时间并入堆（调用方需持有锁）"""
+        entry = self._entries.get(region)
+        version = entry[1] + 1 if entry else 0
+        due_at = self._due_at(region, profile, now)
+        self._entries[region] = [profile, version, due_at]
+        heapq.heappush(self._heap, (due_at, -profile.priority, next(self._seq), region, version))
+
+    def _peek(self):
+        """丢弃过时堆项后返回堆顶（调用方需持有锁）"""
+        while self._heap:
+            due_at, _, _, region, version = self._heap[0]
+            entry = self._entries.get(region)
+            if entry is None or entry[1] != version:
+                heapq.heappop(self._heap)
+                continue
+            return self._heap[0]
+        return None
+
+    def sync(self, regions, profiles, settings, now=None):
+        """
+        按当前地区列表、检查计划与全局设置更新索引
+
+        计划、全局时间设置或月份变化时重新计算所有地区；否则只为新增地区入堆、移除已不存在的地区
+        """
+        now = now or datetime.datetime.now()
+        in_season = [p for p in profiles if p.months is None or now.month in p.months]
+        fingerprint = (
+            tuple(in_season),
+            settings.get('firstAlertTime'),
+            settings.get('firstalert'),
+            settings.get('warningInterval')
+        )
+        with self._lock:
+            if self._last_runs is None:
+                self._last_runs = self._get_store().load_schedule_runs()
+            self._settings = dict(settings)
+            rebuild = fingerprint != self._fingerprint
+            self._fingerprint = fingerprint
+
+            regions = set(regions)
+            for region in set(self._entries) - regions:
+                del self._entries[region]
+            for region in regions:
+                if rebuild or region not in self._entries:
+                    self._push(region, match_profile(region, in_season), now)
+            if rebuild:
+                self._heap = [item for item in self._heap if self._entries.get(item[3], [None, None])[1] == item[4]]
+                heapq.heapify(self._heap)
+
+    def next_due_at(self):
+        """最近一个地区的检查时间，索引为空时返回 None"""
+        with self._lock:
+            top = self._peek()
+            return top[0] if top else None
+
+    def pop_due(self, now=None):
+        """取出所有已到期的地区，按优先级从高到低、到期时间从早到晚排序"""
+        now = now or datetime.datetime.now()
+        due = []
+        with self._lock:
+            while True:
+                top = self._peek()
+                if top is None or top[0] > now:
+                    break
+                heapq.heappop(self._heap)
+                due_at, neg_priority, _, region, _ = top
+                # 版本号加一：在 mark_run 重新入堆前，该地区不会再被取出
+                self._entries[region][1] += 1
+                due.append((neg_priority, due_at, region))
+        due.sort()
+        return [region for _, _, region in due]
+
+    def mark_run(self, regions, now=None):
+        """记录地区已检查，并按各自计划重新入堆"""
+        now = now or datetime.datetime.now()
+        if not regions:
+            return
+        self._get_store().save_schedule_runs(regions, now.timestamp())
+        with self._lock:
+            for region in regions:
+                self._last_runs[region] = int(now.timestamp())
+                entry = self._entries.get(region)
+                if entry:
+                    self._push(region, entry[0], now)
+
+    def summary(self):
+        """各计划的地区数与最近检查时间，供状态接口展示"""
+        with self._lock:
+            result = {}
+            for profile, _, due_at in self._entries.values():
+                item = result.setdefault(profile.name, {
+                    'name': profile.name,
+                    'intervalHours': profile.interval_hours,
+                    'priority': profile.priority,
+                    'regions': 0,
+                    'nextDueAt': None
+                })
+                item['regions'] += 1
+                if item['nextDueAt'] is None or due_at < item['nextDueAt']:
+                    item['nextDueAt'] = due_at
+        for item in result.values():
+            item['nextDueAt'] = item['nextDueAt'].strftime('%Y-%m-%d %H:%M:%S') if item['nextDueAt'] else None
+        return sorted(result.values(), key=lambda item: -item['priority'])
+
+
+_region_schedule_index = None
+
+
+def get_region_schedule_index():
+    """获取进程内共享的地区检查索引（首次使用时创建）"""
+    global _region_schedule_index
+    if _region_schedule_index is None:
+        _region_schedule_index = RegionScheduleIndex()
+    return _region_schedule_index
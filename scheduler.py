@@ -0,0 +1,251 @@
+"""
+后台任务调度器：定时堆 + 条件变量。
+
+所有任务放在同一个按下次运行时间排序的堆中，由一个后台线程依次执行。
+线程在两次任务之间用 Condition.wait 等待到最近的运行时间，
+停止、改期、新增任务时会立即被唤醒，不再需要轮询。
+"""
+
+import datetime
+import heapq
+import itertools
+import threading
+import traceback
+
+# 单次等待的上限（秒）：防止系统时间被调整后长时间睡过头
+MAX_WAIT_SECONDS = 300
+
+
+class ScheduledJob:
+    """调度器中的一个任务"""
+
+    def __init__(self, name, func, next_run, description=''):
+        """
+        Args:
+            name: 任务名称（唯一）
+            func: 任务函数，无参数
+            next_run: 计算下次运行时间的函数 fn(now) -> datetime，返回 None 表示不再运行
+            description: 任务说明
+        """
+        self.name = name
+        self.func = func
+        self.next_run = next_run
+        self.description = description
+        self.next_run_at = None
+        self.last_run_at = None
+        self.last_error = None
+        self.running = False
+        self.rerun = False  # 运行期间收到 run_now 请求，结束后立即再运行一次
+        self.version = 0
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'description': self.description,
+            'nextRunAt': self.next_run_at.strftime('%Y-%m-%d %H:%M:%S') if self.next_run_at else None,
+            'lastRunAt': self.last_run_at.strftime('%Y-%m-%d %H:%M:%S') if self.last_run_at else None,
+            'lastError': self.last_error,
+            'running': self.running
+        }
+
+
+def every(seconds):
+    """固定间隔的下次运行时间函数"""
+    def next_run(now):
+        return now + datetime.timedelta(seconds=seconds)
+    return next_run
+
+
+def daily_at(hour, minute=0):
+    """每天固定时刻的下次运行时间函数"""
+    def next_run(now):
+        target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if target <= now:
+            target += datetime.timedelta(days=1)
+        return target
+    return next_run
+
+
+class Scheduler:
+    """单线程任务调度器，多个任务共用一个定时堆"""
+
+    def __init__(self, name='scheduler', on_start=None):
+        """
+        Args:
+            name: 线程名称
+            on_start: 调度线程启动后、执行任务前调用一次的初始化函数
+        """
+        self.name = name
+        self.on_start = on_start
+        self._jobs = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._ready = False
+
+    @property
+    def stopping(self):
+        """是否收到了停止请求，长任务可据此提前结束"""
+        return self._stopping
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _push(self, job, now=None):
+        """计算任务下次运行时间并入堆（调用方需持有锁）"""
+        job.version += 1
+        try:
+            job.next_run_at = job.next_run(now or datetime.datetime.now())
+        except Exception as e:
+            print(f"计算任务 {job.name} 的下次运行时间失败: {e}")
+            job.next_run_at = None
+        if job.next_run_at is not None:
+            heapq.heappush(self._heap, (job.next_run_at, next(self._seq), job.name, job.version))
+
+    def add_job(self, name, func, next_run, description=''):
+        """添加（或替换）任务；调度线程运行中时立即入堆并唤醒"""
+        job = ScheduledJob(name, func, next_run, description)
+        with self._cond:
+            old = self._jobs.get(name)
+            if old:
+                job.version = old.version
+            self._jobs[name] = job
+            if self._ready:
+                self._push(job)
+                self._cond.notify_all()
+        return job
+
+    def reschedule(self, name):
+        """按当前配置重新计算任务的下次运行时间（例如设置变更后）"""
+        with self._cond:
+            job = self._jobs.get(name)
+            if not job:
+                return None
+            if self._ready and not job.running:
+                self._push(job)
+                self._cond.notify_all()
+            return job.next_run_at
+
+    def _push_now(self, job):
+        """任务立即到期（调用方需持有锁）"""
+        job.version += 1
+        job.next_run_at = datetime.datetime.now()
+        heapq.heappush(self._heap, (job.next_run_at, next(self._seq), job.name, job.version))
+
+    def run_now(self, name):
+        """让任务尽快运行一次；任务正在运行时，结束后立即再运行一次"""
+        with self._cond:
+            job = self._jobs.get(name)
+            if not job or not self._ready:
+                return False
+            if job.running:
+                job.rerun = True
+                return True
+            self._push_now(job)
+            self._cond.notify_all()
+            return True
+
+    def jobs(self):
+        with self._cond:
+            return [job.to_dict() for job in self._jobs.values()]
+
+    def start(self):
+        """启动调度线程；已在运行时返回 False"""
+        with self._cond:
+            if self.is_running():
+                return False
+            self._stopping = False
+            self._ready = False
+            self._heap = []
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self, timeout=None):
+        """请求停止并立即唤醒调度线程；timeout 不为 None 时等待线程退出"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        thread = self._thread
+        if timeout is not None and thread and thread is not threading.current_thread():
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def _next_due_job(self):
+        """等待到最近一个任务到期，返回该任务；收到停止请求时返回 None"""
+        with self._cond:
+            while not self._stopping:
+                # 丢弃已被改期的过时堆项
+                while self._heap:
+                    run_at, _, name, version = self._heap[0]
+                    job = self._jobs.get(name)
+                    if job is None or job.version != version:
+                        heapq.heappop(self._heap)
+                        continue
+                    break
+
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+
+                run_at, _, name, _ = self._heap[0]
+                wait_seconds = (run_at - datetime.datetime.now()).total_seconds()
+                if wait_seconds <= 0:
+                    heapq.heappop(self._heap)
+                    job = self._jobs[name]
+                    job.running = True
+                    return job
+                self._cond.wait(min(wait_seconds, MAX_WAIT_SECONDS))
+            return None
+
+    def _shutdown(self):
+        with self._cond:
+            self._ready = False
+            self._heap = []
+
+    def _run(self):
+        print(f"=== 调度器 {self.name} 启动 ===")
+        if self.on_start:
+            try:
+                self.on_start()
+            except Exception as e:
+                print(f"调度器初始化失败: {e}")
+                traceback.print_exc()
+
+        # 初始化完成后再按当前时间排入所有任务
+        with self._cond:
+            for job in self._jobs.values():
+                self._push(job)
+                if job.next_run_at:
+                    print(f"任务 {job.name} 下次运行: {job.next_run_at.strftime('%Y-%m-%d %H:%M:%S')}")
+            self._ready = True
+
+        while True:
+            job = self._next_due_job()
+            if job is None:
+                break
+            print(f"=== 开始执行任务: {job.name} ===")
+            job.last_run_at = datetime.datetime.now()
+            try:
+                job.func()
+                job.last_error = None
+            except Exception as e:
+                job.last_error = str(e)
+                print(f"任务 {job.name} 执行出错: {e}")
+                traceback.print_exc()
+            with self._cond:
+                job.running = False
+                if self._stopping:
+                    break
+                if job.rerun:
+                    job.rerun = False
+                    self._push_now(job)
+                    continue
+                self._push(job)
+                if job.next_run_at:
+                    print(f"任务 {job.name} 下次运行: {job.next_run_at.strftime('%Y-%m-%d %H:%M:%S')}")
+        self._shutdown()
+        print(f"调度器 {self.name} 已退出")
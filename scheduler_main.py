@@ -0,0 +1,57 @@
+"""
+独立的预警调度进程。
+
+与 HTTP 服务分开运行后，HTTP 服务可以多进程部署、随时重启而不会打断正在进行的预警检查。
+多个调度进程同时运行时（例如多台服务器），通过 leader_lease 租约保证只有一个进程执行预警检查。
+后台的启动/停止操作保存在数据库中，调度进程重启后保持原有状态。
+
+用法：
+    python scheduler_main.py                 # 运行调度，收到 SIGTERM/SIGINT 后等待当前任务结束再退出
+    python scheduler_main.py --init-db       # 先初始化数据库，再运行调度
+    python scheduler_main.py --init-db-only  # 只初始化数据库（scripts/run_prod.sh 启动HTTP服务前调用）
+"""
+
+import argparse
+import signal
+import threading
+
+STOP_TIMEOUT_SECONDS = 60  # 退出时等待当前预警检查结束的最长时间（秒）
+
+
+def main():
+    parser = argparse.ArgumentParser(description='天气预警调度进程')
+    parser.add_argument('--init-db', action='store_true', help='启动调度前初始化数据库')
+    parser.add_argument('--init-db-only', action='store_true', help='只初始化数据库后退出')
+    args = parser.parse_args()
+
+    import app as skyalert
+    skyalert.configure_app({'RUN_ALERT_SCHEDULER': not args.init_db_only})
+
+    if args.init_db or args.init_db_only:
+        skyalert.init_db()
+        if args.init_db_only:
+            return
+
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        print(f"收到信号 {signum}，准备退出调度进程")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    skyalert.alert_leader.start()
+    print("预警调度进程已启动，等待成为主实例")
+
+    while not stop_event.wait(1):
+        pass
+
+    skyalert.alert_leader.stop(timeout=10)
+    if not skyalert.alert_scheduler.stop(timeout=STOP_TIMEOUT_SECONDS):
+        print(f"当前任务在{STOP_TIMEOUT_SECONDS}秒内未结束，强制退出")
+    print("预警调度进程已退出")
+
+
+if __name__ == '__main__':
+    main()
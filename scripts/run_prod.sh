@@ -0,0 +1,13 @@
+#!/usr/bin/env bash
+# 生产环境启动HTTP服务：初始化数据库后以 gunicorn 多进程运行（预警调度由 scripts/run_scheduler.sh 单独运行）
+set -euo pipefail
+
+cd "$(dirname "$0")/.."
+
+PYTHON="${PYTHON:-python3}"
+if [ -x .venv/bin/python ]; then
+    PYTHON=.venv/bin/python
+fi
+
+"$PYTHON" scheduler_main.py --init-db-only
+exec "$PYTHON" -m gunicorn -c gunicorn.conf.py wsgi:application
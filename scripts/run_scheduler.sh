@@ -0,0 +1,12 @@
+#!/usr/bin/env bash
+# 生产环境启动预警调度进程（与HTTP服务分开运行）
+set -euo pipefail
+
+cd "$(dirname "$0")/.."
+
+PYTHON="${PYTHON:-python3}"
+if [ -x .venv/bin/python ]; then
+    PYTHON=.venv/bin/python
+fi
+
+exec "$PYTHON" scheduler_main.py
@@ -4,14 +4,17 @@ from flask import request, jsonify
 import json
 import os
 import smtplib
+import ssl
 import mimetypes
 import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
+from email.mime.image import MIMEImage
 from email.utils import formataddr
 import email.utils
 from maintenance_utils import log_health
+from data_snapshot import get_snapshot
 
 # 设置数据JSON文件路径
 SETTINGS_JSON_FILE = 'settings.json'
@@ -36,138 +39,23 @@ def register_routes(app):
                 'message': '请填写所有必要的邮件信息'
             })
         
-        # 从settings.json读取邮件配置
+        # 从系统设置读取邮件配置（按数据版本缓存，未修改时不重复查询）
         try:
-            with open(SETTINGS_JSON_FILE, 'r', encoding='utf-8') as f:
-                settings = json.load(f)
-            
-            sender = settings.get('emailSender', '')
-            name = settings.get('emailName', '')
-            server = settings.get('smtpServer', '')
-            port = settings.get('smtpPort', 587)
-            username = settings.get('smtpUsername', '')
-            password = settings.get('smtpPassword', '')
+            settings = get_snapshot().settings
+            if settings is None:
+                raise FileNotFoundError(SETTINGS_JSON_FILE)
             
             # 验证邮件配置
-            if not all([sender, server, port, username, password]):
+            config_error = smtp_config_error(settings)
+            if config_error:
                 return jsonify({
                     'success': False,
-                    'message': '邮件服务器配置不完整，请检查设置'
+                    'message': config_error
                 })
             
-            # 创建邮件
-            message = MIMEMultipart('mixed')  # 明确指定为mixed类型
-            message['From'] = formataddr((name, sender))
-            message['To'] = to
-            message['Subject'] = subject
-            message['Date'] = email.utils.formatdate(localtime=True)
-            message['Message-ID'] = email.utils.make_msgid()
-
-            # 将纯文本内容转换为HTML（包含<br>标签的换行）
-            email_content = prepare_email_content(content, is_html=True)
-
-            # 设置邮件内容类型为HTML
-            msg = MIMEText(email_content, 'html', 'utf-8')
-            message.attach(msg)
-            
-            # 处理附件
-            if attachments:
-                # 如果附件是字符串，尝试解析它
-                if isinstance(attachments, str):
-                    try:
-                        if attachments.lower() != "null":
-                            attachments = json.loads(attachments)
-                        else:
-                            attachments = []
-                    except Exception as e:
-                        print(f"解析附件字符串失败: {str(e)}")
-                        attachments = []
-                
-                # 确保attachments是列表
-                if not isinstance(attachments, list):
-                    attachments = [attachments]
-                
-                print(f"邮件包含 {len(attachments)} 个附件")
-                
-                # 遍历附件列表，添加到邮件中
-                for attachment_name in attachments:
-                    # 附件完整路径
-                    attachment_path = os.path.join(os.getcwd(), 'templates', attachment_name)
-                    
-                    if os.path.exists(attachment_path):
-                        try:
-                            # 获取文件MIME类型
-                            content_type, encoding = mimetypes.guess_type(attachment_path)
-                            if content_type is None or encoding is not None:
-                                content_type = 'application/octet-stream'
-                            
-                            # 读取文件内容并创建附件部分
-                            with open(attachment_path, 'rb') as f:
-                                file_data = f.read()
-                                
-                                if content_type.startswith('image/'):
-                                    # 对于图片，使用MIMEImage
-                                    from email.mime.image import MIMEImage
-                                    attachment = MIMEImage(file_data, _subtype=content_type.split('/')[-1])
-                                else:
-                                    # 对于其他类型，使用MIMEApplication
-                                    attachment = MIMEApplication(file_data, _subtype=content_type.split('/')[-1])
-                            
-                            # 设置附件名，使用文件名编码保护中文名
-                            try:
-                                attachment.add_header('Content-Disposition', 'attachment', 
-                                                     filename=('utf-8', '', attachment_name))
-                            except:
-                                # 如果编码方式不支持，使用普通方式
-                                attachment.add_header('Content-Disposition', 'attachment', 
-                                                     filename=attachment_name)
-                            
-                            # 确保添加Content-ID，这对嵌入图片很重要
-                            attachment.add_header('Content-ID', f'<{attachment_name}>')
-                            
-                            # 添加到邮件中
-                            message.attach(attachment)
-                            print(f"  - 已添加附件: {attachment_name}")
-                            
-                        except Exception as e:
-                            print(f"  - 添加附件 {attachment_name} 时出错: {str(e)}")
-                    else:
-                        print(f"  - 警告：附件文件不存在: {attachment_path}")
-
-            # 连接到SMTP服务器并发送邮件，增加超时与重试
-            last_error = None
-            for attempt in range(1, SMTP_MAX_RETRY + 1):
-                smtp = None
-                try:
-                    smtp = smtplib.SMTP(server, port, timeout=SMTP_TIMEOUT)
-                    smtp.ehlo()
-
-                    if port == 587:
-                        smtp.starttls()
-                        smtp.ehlo()
-
-                    smtp.login(username, password)
-                    print(f"正在发送邮件到 {to}（第{attempt}次尝试）...")
-                    smtp.sendmail(sender, [to], message.as_string())
-                    print("邮件发送成功")
-                    log_health('SMTP', True, f"向 {to} 发送成功（第{attempt}次）")
-                    smtp.quit()
-                    last_error = None
-                    break
-                except Exception as smtp_err:
-                    last_error = smtp_err
-                    log_health('SMTP', False, f"向 {to} 发送失败（第{attempt}次）: {smtp_err}")
-                    print(f"发送失败（第{attempt}次）: {smtp_err}")
-                    if smtp:
-                        try:
-                            smtp.quit()
-                        except Exception:
-                            pass
-                    if attempt < SMTP_MAX_RETRY:
-                        time.sleep(2)
-
-            if last_error:
-                raise last_error
+            message = build_email_message(settings, to, subject, content, attachments)
+            with SmtpSession(settings) as session:
+                session.send(to, message)
 
             return jsonify({
                 'success': True,
@@ -183,6 +71,183 @@ def register_routes(app):
                 'message': f'发送邮件时出错: {str(e)}'
             })
 
+def smtp_config_error(settings):
+    """检查邮件服务器配置（发件人、服务器、端口、用户名、密码），不完整时返回错误信息，完整时返回 None"""
+    required = ['emailSender', 'smtpServer', 'smtpUsername', 'smtpPassword']
+    if not all(settings.get(key) for key in required) or not settings.get('smtpPort', 587):
+        return '邮件服务器配置不完整，请检查设置'
+    return None
+
+def build_email_message(settings, to, subject, content, attachments=None):
+    """按系统设置构建邮件：HTML 正文，附件从 templates 目录读取"""
+    message = MIMEMultipart('mixed')  # 明确指定为mixed类型
+    message['From'] = formataddr((settings.get('emailName', ''), settings.get('emailSender', '')))
+    message['To'] = to
+    message['Subject'] = subject
+    message['Date'] = email.utils.formatdate(localtime=True)
+    message['Message-ID'] = email.utils.make_msgid()
+
+    # 将纯文本内容转换为HTML（包含<br>标签的换行）
+    email_content = prepare_email_content(content, is_html=True)
+
+    # 设置邮件内容类型为HTML
+    msg = MIMEText(email_content, 'html', 'utf-8')
+    message.attach(msg)
+    
+    # 处理附件
+    if attachments:
+        # 如果附件是字符串，尝试解析它
+        if isinstance(attachments, str):
+            try:
+                if attachments.lower() != "null":
+                    attachments = json.loads(attachments)
+                else:
+                    attachments = []
+            except Exception as e:
+                print(f"解析附件字符串失败: {str(e)}")
+                attachments = []
+        
+        # 确保attachments是列表
+        if not isinstance(attachments, list):
+            attachments = [attachments]
+        
+        print(f"邮件包含 {len(attachments)} 个附件")
+        
+        # 遍历附件列表，添加到邮件中
+        for attachment_name in attachments:
+            # 附件完整路径
+            attachment_path = os.path.join(os.getcwd(), 'templates', attachment_name)
+            
+            if os.path.exists(attachment_path):
+                try:
+                    # 获取文件MIME类型
+                    content_type, encoding = mimetypes.guess_type(attachment_path)
+                    if content_type is None or encoding is not None:
+                        content_type = 'application/octet-stream'
+                    
+                    # 读取文件内容并创建附件部分
+                    with open(attachment_path, 'rb') as f:
+                        file_data = f.read()
+                        
+                        if content_type.startswith('image/'):
+                            # 对于图片，使用MIMEImage
+                            attachment = MIMEImage(file_data, _subtype=content_type.split('/')[-1])
+                        else:
+                            # 对于其他类型，使用MIMEApplication
+                            attachment = MIMEApplication(file_data, _subtype=content_type.split('/')[-1])
+                    
+                    # 设置附件名，使用文件名编码保护中文名
+                    try:
+                        attachment.add_header('Content-Disposition', 'attachment', 
+                                             filename=('utf-8', '', attachment_name))
+                    except:
+                        # 如果编码方式不支持，使用普通方式
+                        attachment.add_header('Content-Disposition', 'attachment', 
+                                             filename=attachment_name)
+                    
+                    # 确保添加Content-ID，这对嵌入图片很重要
+                    attachment.add_header('Content-ID', f'<{attachment_name}>')
+                    
+                    # 添加到邮件中
+                    message.attach(attachment)
+                    print(f"  - 已添加附件: {attachment_name}")
+                    
+                except Exception as e:
+                    print(f"  - 添加附件 {attachment_name} 时出错: {str(e)}")
+            else:
+                print(f"  - 警告：附件文件不存在: {attachment_path}")
+    return message
+
+
+class SmtpSession:
+    """
+    复用同一个 SMTP 连接发送多封邮件：第一次发送时连接并登录，发送失败时重新连接重试（最多 SMTP_MAX_RETRY 次）。
+    连接多次失败后，同一会话中后续邮件直接返回该错误，不再逐封等待超时。用 with 语句使用，退出时关闭连接。
+    """
+
+    def __init__(self, settings):
+        self.sender = settings.get('emailSender', '')
+        self.server = settings.get('smtpServer', '')
+        self.port = int(settings.get('smtpPort') or 587)
+        self.username = settings.get('smtpUsername', '')
+        self.password = settings.get('smtpPassword', '')
+        self.sent_count = 0
+        self._smtp = None
+        self._connect_error = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _connect(self):
+        if self.port == 465:
+            # 端口465使用SSL连接
+            smtp = smtplib.SMTP_SSL(self.server, self.port, context=ssl.create_default_context(), timeout=SMTP_TIMEOUT)
+        else:
+            smtp = smtplib.SMTP(self.server, self.port, timeout=SMTP_TIMEOUT)
+            smtp.ehlo()
+            # 只有端口587才启动STARTTLS
+            if self.port == 587:
+                smtp.starttls()
+                smtp.ehlo()
+        if self.username and self.password:
+            try:
+                smtp.login(self.username, self.password)
+            except smtplib.SMTPNotSupportedError:
+                pass  # 服务器不支持认证，继续发送
+        return smtp
+
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def send(self, to, message):
+        """发送一封邮件，失败时抛出最后一次的异常"""
+        if self._connect_error is not None:
+            raise self._connect_error
+        last_error = None
+        for attempt in range(1, SMTP_MAX_RETRY + 1):
+            reused = self._smtp is not None
+            try:
+                if not reused:
+                    try:
+                        self._smtp = self._connect()
+                    except Exception as connect_err:
+                        if attempt == SMTP_MAX_RETRY:
+                            self._connect_error = connect_err
+                        raise
+                print(f"正在发送邮件到 {to}（第{attempt}次尝试）...")
+                self._smtp.sendmail(self.sender, [to], message.as_string())
+                print("邮件发送成功")
+                self.sent_count += 1
+                return
+            except smtplib.SMTPRecipientsRefused as refused:
+                # 收件人被拒绝时重试没有意义，连接仍可继续使用
+                log_health('SMTP', False, f"向 {to} 发送失败: 收件人被拒绝")
+                print(f"发送失败: 收件人被拒绝 {refused.recipients}")
+                raise
+            except Exception as smtp_err:
+                last_error = smtp_err
+                log_health('SMTP', False, f"向 {to} 发送失败（第{attempt}次）: {smtp_err}")
+                print(f"发送失败（第{attempt}次）: {smtp_err}")
+                self._disconnect()
+                # 复用的连接可能已被服务器断开，直接重连；新建的连接失败时稍等再试
+                if attempt < SMTP_MAX_RETRY and not reused:
+                    time.sleep(2)
+        raise last_error
+
+    def close(self):
+        self._disconnect()
+        if self.sent_count:
+            log_health('SMTP', True, f"发送成功{self.sent_count}封（{self.server}:{self.port}）")
+
+
 # 在发送邮件前处理邮件内容
 def prepare_email_content(content, is_html=True):
     """
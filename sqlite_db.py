@@ -0,0 +1,161 @@
+"""
+SQLite 连接与调优：直接使用 sqlite3 的模块都通过这里取得连接，参数保持一致。
+
+- 每个连接：synchronous=NORMAL、busy_timeout、mmap_size；数据库文件首次打开时切换为 WAL
+  （WAL 模式写入数据库文件，之后的连接自动沿用），读写互不阻塞
+- get_connection() 按线程复用连接（每个线程、每个数据库文件一个），close() 只结束未提交的事务
+  并把连接留给同一线程下次使用；fork 出的子进程会重新创建
+- 热点查询的索引以迁移方式创建（schema_migration 表记录已执行的迁移），老库升级后自动补齐
+
+可通过环境变量调整：
+- SQLITE_BUSY_TIMEOUT_MS：等待其他连接释放写锁的时间（毫秒，默认10000）
+- SQLITE_MMAP_SIZE：内存映射读取的大小上限（字节，默认128MB，0 表示关闭）
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+
+def _env_number(name, default):
+    """读取非负整数环境变量，非法值回退默认值"""
+    try:
+        value = int(os.getenv(name, default))
+        return value if value >= 0 else default
+    except (TypeError, ValueError):
+        return default
+
+
+SQLITE_BUSY_TIMEOUT_MS = _env_number('SQLITE_BUSY_TIMEOUT_MS', 10000)
+SQLITE_MMAP_SIZE = _env_number('SQLITE_MMAP_SIZE', 128 * 1024 * 1024)
+
+# 热点查询的索引与数据补齐：(迁移名, 依赖的表或“表.列”, SQL)。表或列尚未创建时跳过，等创建后再执行
+MIGRATIONS = [
+    ('0001_mail_task_status', 'mail_task',
+     'CREATE INDEX IF NOT EXISTS ix_mail_task_status ON mail_task (status, is_test, created_at)'),
+    ('0002_notification_status', 'notification',
+     'CREATE INDEX IF NOT EXISTS ix_notification_status ON notification (status, timestamp)'),
+    ('0003_personnel_region', 'personnel',
+     'CREATE INDEX IF NOT EXISTS ix_personnel_region ON personnel (region)'),
+    ('0004_log_timestamp', 'log',
+     'CREATE INDEX IF NOT EXISTS ix_log_timestamp ON log (timestamp)'),
+    ('0005_mail_task_batch', 'mail_task.batch_id',
+     'CREATE INDEX IF NOT EXISTS ix_mail_task_batch ON mail_task (batch_id, status)'),
+    ('0006_notification_region', 'notification.weather_type',
+     "UPDATE notification SET region = json_extract(email_data, '$.region'), "
+     "weather_type = json_extract(email_data, '$.weather_type') "
+     "WHERE region IS NULL AND json_valid(email_data)"),
+]
+
+_wal_paths = set()  # 本进程已确认为 WAL 模式的数据库文件
+_migrated_paths = set()  # 本进程已执行完全部迁移的数据库文件
+_state_lock = threading.Lock()
+
+
+def apply_pragmas(conn, db_path=None):
+    """
+    为连接设置统一的 PRAGMA（也用于 SQLAlchemy 创建的连接）
+
+    Args:
+        conn: sqlite3 连接
+        db_path: 数据库文件路径；提供时在本进程首次打开该文件时切换为 WAL 模式
+    """
+    if db_path and db_path != ':memory:' and db_path not in _wal_paths:
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            _wal_paths.add(db_path)
+        except sqlite3.OperationalError as e:
+            # 其他连接正在使用数据库时可能无法切换，下次打开时再试
+            print(f"切换 {db_path} 为 WAL 模式失败: {e}")
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+    conn.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+    return conn
+
+
+def connect(db_path, **kwargs):
+    """打开一个新的已调优连接，由调用方负责关闭（需要独立事务设置或长期持有时使用）"""
+    kwargs.setdefault('timeout', SQLITE_BUSY_TIMEOUT_MS / 1000)
+    return apply_pragmas(sqlite3.connect(db_path, **kwargs), db_path)
+
+
+class PooledConnection(sqlite3.Connection):
+    """线程内复用的连接：close() 回滚未提交的事务后保留连接，真正关闭由 close_thread_connections() 负责"""
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def close_pooled(self):
+        sqlite3.Connection.close(self)
+
+
+_local = threading.local()
+
+
+def _thread_pool():
+    pid = os.getpid()
+    if getattr(_local, 'pid', None) != pid:
+        # fork 出的子进程不能使用父进程的连接
+        _local.pid = pid
+        _local.connections = {}
+    return _local.connections
+
+
+def get_connection(db_path):
+    """取得当前线程复用的连接；同一线程内不应同时在两处使用同一个连接的事务"""
+    connections = _thread_pool()
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = connect(db_path, factory=PooledConnection)
+        connections[db_path] = conn
+    return conn
+
+
+def close_thread_connections():
+    """关闭当前线程复用的全部连接（线程结束前或测试时使用）"""
+    connections = _thread_pool()
+    for conn in connections.values():
+        conn.close_pooled()
+    connections.clear()
+
+
+def apply_migrations(db_path):
+    """
+    执行尚未执行的迁移（同一进程内对同一数据库只检查一次）
+
+    Returns:
+        本次执行的迁移名列表
+    """
+    if db_path in _migrated_paths or not os.path.exists(db_path):
+        return []
+    applied = []
+    with _state_lock:
+        conn = connect(db_path)
+        try:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS schema_migration (name TEXT PRIMARY KEY, applied_at REAL NOT NULL)'
+            )
+            done = {row[0] for row in conn.execute('SELECT name FROM schema_migration')}
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            pending_tables = False
+            for name, requirement, sql in MIGRATIONS:
+                if name in done:
+                    continue
+                table, _, column = requirement.partition('.')
+                if table not in tables or (
+                    column and column not in {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+                ):
+                    pending_tables = True
+                    continue
+                conn.execute(sql)
+                conn.execute('INSERT INTO schema_migration (name, applied_at) VALUES (?, ?)', (name, time.time()))
+                conn.commit()
+                applied.append(name)
+                print(f"已执行数据库迁移 {name}")
+            if not pending_tables:
+                _migrated_paths.add(db_path)
+        finally:
+            conn.close()
+    return applied
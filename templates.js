@@ -264,9 +264,6 @@ async function saveTemplate(templateData) {
     // 重新加载模板列表
     fetchTemplates();
     
-    // 导出模板数据到JSON文件
-    await exportTemplates();
-    
     return { success: true, data: result };
   } catch (error) {
     console.error('保存模板时出错:', error);
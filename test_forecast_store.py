@@ -0,0 +1,46 @@
+"""预报快照库的回归测试（python -m pytest test_forecast_store.py）"""
+
+import os
+import tempfile
+import time
+import unittest
+import datetime
+
+from forecast_store import ForecastStore
+from sqlite_db import close_thread_connections
+
+
+class LoadRegionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = ForecastStore(os.path.join(self.tmp_dir.name, 'forecast_store.db'))
+        today = datetime.date.today().strftime('%Y-%m-%d')
+        self.store.save_regions({
+            '北京': {'region': '北京', 'forecasts': [{'date': today, 'tempMax': '30'}]},
+            '上海': {'region': '上海', 'forecasts': [{'date': today, 'tempMax': '32'}]}
+        })
+
+    def tearDown(self):
+        close_thread_connections()
+        self.tmp_dir.cleanup()
+
+    def test_load_regions_twice_on_one_thread(self):
+        # 同一线程复用同一个连接，连续查询不能因为上一次留下的状态而失败
+        first = self.store.load_regions(['北京'], 3600)
+        second = self.store.load_regions(['北京', '上海', '广州'], 3600)
+        self.assertEqual(list(first), ['北京'])
+        self.assertEqual(sorted(second), ['上海', '北京'])
+        self.assertTrue(second['上海']['stale'])
+
+    def test_load_regions_skips_expired(self):
+        self.store.save_regions(
+            {'广州': {'region': '广州', 'forecasts': [{'date': datetime.date.today().strftime('%Y-%m-%d')}]}},
+            fetched_at=time.time() - 7200
+        )
+        self.assertEqual(self.store.load_regions(['广州'], 3600), {})
+        self.assertIn('广州', self.store.load_regions(['广州'], 10800))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,28 +9,30 @@ from email.header import Header
 import time
 import os
 import random
-from send_email_api import register_routes
-from flask import Flask
 from template_utils import replace_template_variables
 import traceback
-from maintenance_utils import backup_if_has_data, trim_json_file, log_health
-import sqlite3
+import json_store
+from maintenance_utils import backup_if_has_data, trim_json_file, log_health, append_json_array
+from weather_provider import get_weather_provider, WeatherProviderError
+from forecast_store import ForecastStore
+from window_engine import parse_window_condition, window_key, compute_windows, match_window, needs_hourly_forecast
+from data_snapshot import get_snapshot
+from sqlite_db import connect, get_connection, apply_migrations
 
 # 文件路径
-SETTINGS_FILE = 'settings.json'
-CUSTOMERS_FILE = 'customers_data.json'
-ALERT_RULES_FILE = 'alert_rules.json'
-TEMPLATES_FILE = 'templates_data.json'
 WEATHER_FILE = 'weather.json'
 EMAIL_JSON_FILE = 're-Emile.json'
-REQUEST_TIMEOUT = 15  # 天气API请求超时时间（秒）
+RETRY_BACKOFF_BASE = 2  # 天气接口重试的初始等待（秒），之后按指数增长
+RETRY_BACKOFF_MAX = 30  # 单次重试等待上限（秒）
+FORECAST_MAX_STALE_HOURS = 24  # 接口失败时允许使用的历史预报快照最大陈旧时间（小时），可在设置中用 forecastMaxStaleHours 覆盖
+FORECAST_REFRESH_MINUTES = 60  # 增量刷新窗口（分钟）：窗口内检查过的地区直接复用快照，可在设置中用 forecastRefreshMinutes 覆盖
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DB_PATH = os.path.join(BASE_DIR, 'skyalert.db')
+DB_PATH = os.getenv('SKYALERT_DB_PATH') or os.path.join(BASE_DIR, 'skyalert.db')
 
 # 邮件任务表初始化
 def ensure_mail_task_table():
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection(DB_PATH)
         cursor = conn.cursor()
         cursor.execute(
             """
@@ -43,12 +45,15 @@ def ensure_mail_task_table():
                 attempts INTEGER DEFAULT 0,
                 error TEXT,
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                batch_id VARCHAR(50),
+                notification_id VARCHAR(50)
             )
             """
         )
         conn.commit()
         conn.close()
+        apply_migrations(DB_PATH)
     except Exception as e:
         print(f"初始化 mail_task 表失败: {e}")
 
@@ -76,8 +81,7 @@ def parse_first_alert_time(settings):
 # 加载配置文件
 def load_json_file(file_path):
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return json_store.read_json(file_path)
     except Exception as e:
         print(f"Error loading {file_path}: {e}")
         return None
@@ -85,16 +89,15 @@ def load_json_file(file_path):
 # 保存JSON文件
 def save_json_file(file_path, data):
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+        json_store.write_json(file_path, data)
         return True
     except Exception as e:
         print(f"Error saving {file_path}: {e}")
         return False
 
 # 获取顾客地理位置
-def get_customer_regions():
-    customers = load_json_file(CUSTOMERS_FILE)
+def get_customer_regions(snapshot=None):
+    customers = (snapshot or get_snapshot()).customers
     if not customers:
         return []
     
@@ -106,60 +109,248 @@ def get_customer_regions():
     
     return list(regions)
 
+def retry_backoff_seconds(attempt):
+    """第 attempt 次重试前的等待时间：指数退避并加入随机抖动，避免同时重试"""
+    delay = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * (2 ** (attempt - 1)))
+    return delay * random.uniform(0.5, 1.0)
+
+_forecast_store = None
+
+def get_forecast_store():
+    """获取预报快照库（首次使用时创建）"""
+    global _forecast_store
+    if _forecast_store is None:
+        _forecast_store = ForecastStore()
+    return _forecast_store
+
+def get_max_stale_seconds(settings):
+    """读取快照兜底的陈旧时间窗口（秒）"""
+    try:
+        hours = float(settings.get('forecastMaxStaleHours', FORECAST_MAX_STALE_HOURS))
+    except (TypeError, ValueError):
+        hours = FORECAST_MAX_STALE_HOURS
+    return max(0, hours) * 3600
+
+def get_refresh_seconds(settings):
+    """读取增量刷新窗口（秒）：窗口内检查过的地区直接复用快照，不再请求接口"""
+    try:
+        minutes = float(settings.get('forecastRefreshMinutes', FORECAST_REFRESH_MINUTES))
+    except (TypeError, ValueError):
+        minutes = FORECAST_REFRESH_MINUTES
+    return max(0, minutes) * 60
+
+def attach_hourly_forecast(provider, city_id, weather_info):
+    """获取逐小时预报并附加到地区数据上（供窗口规则使用），失败时只记录日志"""
+    try:
+        data = provider.hourly_forecast(city_id)
+    except Exception as e:
+        print(f"获取逐小时预报失败: {weather_info['region']} - {e}")
+        return False
+    if data.get('code') != '200':
+        print(f"逐小时预报接口错误: {weather_info['region']} - {data.get('code')}")
+        return False
+    weather_info['hourlyUpdateTime'] = data.get('updateTime')
+    weather_info['hourly'] = [
+        {
+            'fxTime': hour.get('fxTime'),
+            'temp': hour.get('temp'),
+            'text': hour.get('text'),
+            'windSpeed': hour.get('windSpeed'),
+            'humidity': hour.get('humidity'),
+            'pop': hour.get('pop'),
+            'precip': hour.get('precip')
+        }
+        for hour in data.get('hourly', [])
+    ]
+    return True
+
 # 使用天气API获取天气数据
-def fetch_weather_data(regions):
-    settings = load_json_file(SETTINGS_FILE)
-    if not settings or 'weatherApiKey' not in settings:
-        print("Weather API key not found in settings")
+def fetch_weather_data(regions, snapshot=None):
+    weather_data = {}
+    for region, region_data in iter_weather_data(regions, snapshot=snapshot):
+        weather_data[region] = region_data
+    return weather_data
+
+def report_weather_health(fetched_count, failure_regions, missing_key=False):
+    """记录本轮天气数据获取的健康状态"""
+    if missing_key:
         log_health('WeatherAPI', False, '缺少API密钥配置')
-        return None
+    elif not fetched_count:
+        log_health('WeatherAPI', False, "本轮任务未获取到有效天气数据")
+    elif failure_regions:
+        log_health('WeatherAPI', False, f"部分地区天气数据获取失败: {', '.join(failure_regions)}")
+    else:
+        log_health('WeatherAPI', True, f"成功获取{fetched_count}个地区天气数据")
+
+def iter_weather_data(regions, weather_file=WEATHER_FILE, summary=None, snapshot=None):
+    """
+    逐地区获取天气数据，每完成一个地区立即产出 (地区, 地区数据)，便于下游边获取边判断；
+    全部地区处理完后再统一保存快照、天气文件并记录健康状态。
+    调用方提前停止（关闭生成器）时不再请求和产出兜底快照，但已获取的数据照常保存、记录
+
+    参数:
+    - weather_file: 本轮天气数据的保存文件
+    - summary: 传入 dict 时只把获取结果（fetched/failures/missing_key）写入其中，由调用方汇总记录健康状态
+    - snapshot: 本轮使用的数据快照，默认取当前快照
+    """
+    snapshot = snapshot or get_snapshot()
+    settings = snapshot.settings
+    provider = get_weather_provider((settings or {}).get('weatherApiKey'))
+    if not settings or (provider.requires_api_key and 'weatherApiKey' not in settings):
+        print("Weather API key not found in settings")
+        if summary is not None:
+            summary.update({'fetched': 0, 'failures': [], 'missing_key': True})
+        else:
+            report_weather_health(0, [], missing_key=True)
+        return
 
-    api_key = settings['weatherApiKey']
     weather_data = {}
     failure_regions = []
+    failed_regions = []
+    short_circuited = []
 
     # 获取全局预警天数，决定使用哪个API端点
     global_advance_days = settings.get('alertAdvanceTime', 1)
 
-    # 根据预警提前天数选择API端点：大于2天使用7天预报，否则使用3天预报
-    forecast_api_endpoint = "https://api.qweather.com/v7/weather/7d" if global_advance_days > 2 else "https://api.qweather.com/v7/weather/3d"
-    print(f"全局提前预警天数: {global_advance_days}天，使用API端点: {forecast_api_endpoint}")
+    # 根据预警提前天数选择预报天数：大于2天使用7天预报，否则使用3天预报
+    forecast_days = 7 if global_advance_days > 2 else 3
+    print(f"全局提前预警天数: {global_advance_days}天，使用{forecast_days}天预报（数据源: {provider.name}）")
+
+    # 只有存在活跃的窗口规则时才获取逐小时预报
+    need_hourly = needs_hourly_forecast(snapshot.rules)
 
-    for region in regions:
-        region_success = False
+    store = get_forecast_store()
+    max_stale_seconds = get_max_stale_seconds(settings)
+    refresh_seconds = get_refresh_seconds(settings)
+    now = int(time.time())
+
+    # 读取各地区上次的城市ID与 updateTime；刷新窗口内检查过且快照完整的地区直接复用
+    try:
+        location_states = store.load_location_states()
+    except Exception as store_err:
+        print(f"读取地区状态失败: {store_err}")
+        location_states = {}
+
+    reused = {}
+    state_updates = {}
+    unchanged_count = 0
+
+    def finish(stopped=False):
+        """保存快照、地区状态与天气文件并记录健康状态，返回为失败地区读取的兜底快照"""
+        # 保存本轮成功获取的预报快照与地区状态，并为失败地区读取有效期内的最新快照
+        fallback = {}
         try:
-            # 先获取城市ID
-            location_url = f"https://geoapi.qweather.com/v2/city/lookup?location={region}&key={api_key}"
-            location_response = requests.get(location_url, timeout=REQUEST_TIMEOUT)
-            location_data = location_response.json()
-        except requests.exceptions.RequestException as geo_err:
-            print(f"获取城市ID超时或失败: {region} - {geo_err}")
-            failure_regions.append(f"{region}(定位失败)")
-            continue
-        except Exception as geo_err:
-            print(f"解析城市ID响应失败: {region} - {geo_err}")
-            failure_regions.append(f"{region}(定位解析失败)")
-            continue
+            store.save_regions(weather_data)
+            store.save_location_states(state_updates)
+            if not stopped:
+                fallback = store.load_regions(failed_regions, max_stale_seconds)
+                weather_data.update(fallback)
+            store.prune(max(max_stale_seconds, refresh_seconds, 86400))
+        except Exception as store_err:
+            print(f"读写预报快照失败: {store_err}")
+        if fallback:
+            print(f"{len(fallback)}个地区接口获取失败，已使用{max_stale_seconds / 3600:g}小时内的预报快照")
+        if reused or unchanged_count:
+            print(f"增量刷新: {len(reused)}个地区在{refresh_seconds / 60:g}分钟内已检查、直接复用快照，"
+                  f"{unchanged_count}个地区上游预报未更新")
+        weather_data.update(reused)
+
+        # 保存天气数据到文件
+        if weather_data:
+            save_json_file(weather_file, weather_data)
+            print(f"Weather data saved to {weather_file}")
+        else:
+            print("未能获取任何地区的天气数据")
+
+        if short_circuited:
+            print(f"天气数据源熔断，{len(short_circuited)}个地区未请求，其中{sum(1 for r in short_circuited if r in weather_data)}个使用预报快照")
+            failure_regions.append(f"{len(short_circuited)}个地区(熔断跳过)")
+
+        if summary is not None:
+            summary.update({'fetched': len(weather_data), 'failures': failure_regions, 'missing_key': False})
+        else:
+            report_weather_health(len(weather_data), failure_regions)
+        return fallback
+
+    try:
+        if refresh_seconds > 0:
+            recent_regions = [
+                region for region in regions
+                if now - location_states.get(region, {}).get('checked_at', 0) < refresh_seconds
+            ]
+            try:
+                snapshots = store.load_regions(recent_regions, refresh_seconds)
+            except Exception as store_err:
+                print(f"读取预报快照失败: {store_err}")
+                snapshots = {}
+            for region, forecast_snapshot in snapshots.items():
+                if len(forecast_snapshot['forecasts']) >= forecast_days and (not need_hourly or forecast_snapshot.get('hourly')):
+                    forecast_snapshot['stale'] = False
+                    forecast_snapshot['unchanged'] = True
+                    forecast_snapshot['sourceUpdateTime'] = location_states[region].get('update_time')
+                    reused[region] = forecast_snapshot
+                    yield region, forecast_snapshot
+
+        for region in regions:
+            if region in reused:
+                continue
+
+            region_success = False
+
+            # 数据源熔断中：不再请求，稍后改用快照兜底
+            if not provider.available():
+                short_circuited.append(region)
+                failed_regions.append(region)
+                continue
+
+            state = location_states.get(region, {})
+            city_id = state.get('city_id')
+
+            # 城市ID不会变化，已缓存时跳过城市查询
+            if not city_id:
+                try:
+                    location_data = provider.lookup_city(region)
+                except (requests.exceptions.RequestException, WeatherProviderError) as geo_err:
+                    print(f"获取城市ID超时或失败: {region} - {geo_err}")
+                    failure_regions.append(f"{region}(定位失败)")
+                    failed_regions.append(region)
+                    continue
+                except Exception as geo_err:
+                    print(f"解析城市ID响应失败: {region} - {geo_err}")
+                    failure_regions.append(f"{region}(定位解析失败)")
+                    failed_regions.append(region)
+                    continue
+
+                if location_data.get('code') != '200' or not location_data.get('location'):
+                    print(f"无法获取城市ID: {region}")
+                    failure_regions.append(f"{region}(无城市ID)")
+                    failed_regions.append(region)
+                    continue
+
+                city_id = location_data['location'][0]['id']
+                state_updates[region] = {
+                    'city_id': city_id,
+                    'update_time': None,
+                    'checked_at': 0
+                }
 
-        if location_data.get('code') == '200' and location_data.get('location'):
-            city_id = location_data['location'][0]['id']
-            url = f"{forecast_api_endpoint}?location={city_id}&key={api_key}"
             retry_count = 0
             max_retries = settings.get('retryCount', 3)
             auto_retry = settings.get('autoRetry', True)
 
             while retry_count < max_retries:
                 try:
-                    response = requests.get(url, timeout=REQUEST_TIMEOUT)
-                    data = response.json()
+                    data = provider.daily_forecast(city_id, forecast_days)
 
                     if data.get('code') == '200':
                         daily_forecasts = data.get('daily', [])
-                        max_days = 7 if global_advance_days > 2 else 3
+                        max_days = forecast_days
                         if daily_forecasts and len(daily_forecasts) >= max_days:
+                            source_update_time = data.get('updateTime')
                             weather_info = {
                                 'region': region,
                                 'updateTime': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                'sourceUpdateTime': source_update_time,
                                 'forecasts': []
                             }
 
@@ -177,7 +368,21 @@ def fetch_weather_data(regions):
                                 }
                                 weather_info['forecasts'].append(forecast_data)
 
+                            if need_hourly:
+                                attach_hourly_forecast(provider, city_id, weather_info)
+
+                            # 上游尚未发布新一轮预报：标记为未变化，规则判断可复用上次结果
+                            if source_update_time and source_update_time == state.get('update_time'):
+                                weather_info['unchanged'] = True
+                                unchanged_count += 1
+
                             weather_data[region] = weather_info
+                            state_updates[region] = {
+                                'city_id': city_id,
+                                'update_time': source_update_time,
+                                'checked_at': now
+                            }
+                            yield region, weather_info
                             region_success = True
                             print(f"成功获取 {region} {max_days}天的天气预报数据")
                             break
@@ -185,37 +390,33 @@ def fetch_weather_data(regions):
                             print(f"API返回数据不足{max_days}天: {region}")
                     else:
                         print(f"API error for {region}: {data.get('code')} - {data.get('message')}")
-                except requests.exceptions.RequestException as req_err:
+                        if data.get('code') == '404':
+                            # 缓存的城市ID已失效，下轮重新查询
+                            state_updates[region] = {'city_id': None, 'update_time': None, 'checked_at': 0}
+                            break
+                except (requests.exceptions.RequestException, WeatherProviderError) as req_err:
                     print(f"请求天气接口失败: {region} - {req_err}")
                 except Exception as api_err:
                     print(f"解析天气接口响应失败: {region} - {api_err}")
 
                 retry_count += 1
+                if not provider.available():
+                    print(f"天气数据源已熔断，停止重试: {region}")
+                    break
                 if retry_count < max_retries and auto_retry:
                     print(f"Retrying {region} weather data... ({retry_count}/{max_retries})")
-                    time.sleep(2)
+                    time.sleep(retry_backoff_seconds(retry_count))
 
             if not region_success:
                 failure_regions.append(f"{region}(天气接口失败)")
-        else:
-            print(f"无法获取城市ID: {region}")
-            failure_regions.append(f"{region}(无城市ID)")
-
-    # 保存天气数据到文件
-    if weather_data:
-        save_json_file(WEATHER_FILE, weather_data)
-        print(f"Weather data saved to {WEATHER_FILE}")
-    else:
-        print("未能获取任何地区的天气数据")
-
-    if not weather_data:
-        log_health('WeatherAPI', False, "本轮任务未获取到有效天气数据")
-    elif failure_regions:
-        log_health('WeatherAPI', False, f"部分地区天气数据获取失败: {', '.join(failure_regions)}")
-    else:
-        log_health('WeatherAPI', True, f"成功获取{len(weather_data)}个地区天气数据")
+                failed_regions.append(region)
+    except GeneratorExit:
+        print("天气数据获取已提前停止，保存已获取的数据")
+        finish(stopped=True)
+        raise
 
-    return weather_data
+    for region, forecast_snapshot in finish().items():
+        yield region, forecast_snapshot
 
 def check_parameter_condition(value, condition):
     try:
@@ -242,7 +443,7 @@ def check_parameter_condition(value, condition):
         print(f"  参数比较异常: {e}")
         return False
 
-def is_condition_met(region_data, rule, forecast_hours=24):
+def is_condition_met(region_data, rule, forecast_hours=24, windows=None):
     """
     检查天气数据是否满足预警规则条件
     
@@ -250,6 +451,7 @@ def is_condition_met(region_data, rule, forecast_hours=24):
     - region_data: 地区天气数据
     - rule: 预警规则
     - forecast_hours: 预报时间范围（小时）
+    - windows: 窗口规则使用的逐小时窗口计算结果（compute_windows 的返回值），不传时按需计算
     
     返回:
     - 是否满足条件，及满足条件的日期(如果满足)
@@ -274,14 +476,7 @@ def is_condition_met(region_data, rule, forecast_hours=24):
     advance_days = int(rule['advanceTime'])
     
     # 计算预警日期 - 这是我们关心的未来日期
-    try:
-        # 首先尝试从文件中读取预警日期
-        with open('test_date.txt', 'r') as f:
-            date_str = f.read().strip()
-            current_date = datetime.datetime.strptime(date_str, '%Y-%m-%d')
-    except:
-        # 如果文件不存在或读取失败，使用当前日期
-        current_date = datetime.datetime.now()
+    current_date = get_current_date()
     
     alert_date = current_date + datetime.timedelta(days=advance_days)
     alert_date_str = alert_date.strftime('%Y-%m-%d')
@@ -385,156 +580,226 @@ def is_condition_met(region_data, rule, forecast_hours=24):
                 print(f"满足条件: {region_data['region']} 在 {alert_date_str} 的天气包含关键词 '{keyword}'")
                 rule['matched_forecast_date'] = alert_date_str
                 return True
+    elif alert_type == 'window':
+        # 窗口类型规则：在逐小时预报上按N小时窗口取最大/最小/累计值判断
+        spec = parse_window_condition(condition)
+        if not spec:
+            print(f"  无法解析窗口规则条件: {condition}")
+            return False
+        if windows is None:
+            windows = compute_windows(region_data.get('hourly', []), [window_key(spec)])
+        matched = match_window(windows, spec, alert_date_str)
+        if matched:
+            window, value = matched
+            print(f"满足条件: {region_data['region']} 在 {window.start} ~ {window.end} 的{condition}（窗口值 {value:g}）")
+            rule['matched_forecast_date'] = alert_date_str
+            rule['matched_window'] = {'start': window.start, 'end': window.end, 'value': value}
+            return True
     
     print(f"  结果: 没有满足 '{weather_type}' 规则的条件")
     return False
 
+# 规则判断结果缓存：{地区: (缓存键, [(规则序号, 满足条件的预报日期)])}
+# 地区预报未变化且规则/设置/日期均相同时直接复用，避免重复计算
+_evaluation_cache = {}
+
+def get_current_date():
+    """当前日期：优先读取 test_date.txt 中的测试日期"""
+    try:
+        with open('test_date.txt', 'r') as f:
+            date_str = f.read().strip()
+            return datetime.datetime.strptime(date_str, '%Y-%m-%d')
+    except:
+        return datetime.datetime.now()
+
+def evaluate_region_rules(region_data, rules, global_advance_days, interval_prediction, forecast_hours=24):
+    """
+    对单个地区逐条检查预警规则
+
+    返回:
+    - [(规则序号, 满足条件的预报日期)]，规则序号对应 rules 中的位置
+    """
+    matches = []
+
+    # 同一地区的所有窗口规则共用一次逐小时遍历
+    window_keys = set()
+    for rule in rules:
+        if rule.get('status') == '活跃' and rule.get('alertType') == 'window':
+            spec = parse_window_condition(rule.get('condition'))
+            if spec:
+                window_keys.add(window_key(spec))
+    windows = compute_windows(region_data.get('hourly', []), window_keys) if window_keys else None
+
+    for rule_index, rule in enumerate(rules):
+        if rule.get('status') != '活跃':
+            continue
+
+        # 获取提前预警天数 - 优先使用规则中的设置，如果没有则使用全局设置
+        advance_days = rule.get('advanceTime')
+        if advance_days is None:
+            advance_days = global_advance_days
+        else:
+            # 确保是整数类型
+            try:
+                advance_days = int(advance_days)
+            except (ValueError, TypeError):
+                advance_days = global_advance_days
+
+        if interval_prediction:
+            # 区间预测模式：检查从当天到提前预警天数的整个区间
+            print(f"区间预测模式：检查从今天到提前{advance_days}天的整个区间")
+            matched_forecasts = []
+
+            # 为每一天创建临时规则副本并检查
+            for check_day in range(0, advance_days + 1):
+                temp_rule = rule.copy()
+                temp_rule['advanceTime'] = str(check_day)
+
+                if is_condition_met(region_data, temp_rule, forecast_hours, windows):
+                    matched_forecasts.append({
+                        'days': check_day,  # 相对于当前日期的天数
+                        'date': temp_rule.get('matched_forecast_date')  # 实际日期
+                    })
+
+            # 如果有多个日期满足条件，选择最接近当前日期的
+            if matched_forecasts:
+                matched_forecasts.sort(key=lambda x: x['days'])
+                closest_forecast = matched_forecasts[0]
+                print(f"在区间内发现 {len(matched_forecasts)} 天满足条件，选择最接近当前日期的: {closest_forecast['date']}")
+                matches.append((rule_index, closest_forecast['date']))
+        else:
+            # 原始模式：只检查特定的提前预警天数
+            temp_rule = rule.copy()
+            temp_rule['advanceTime'] = str(advance_days)
+
+            if is_condition_met(region_data, temp_rule, forecast_hours, windows):
+                matches.append((rule_index, temp_rule.get('matched_forecast_date')))
+
+    return matches
+
+class AlertEvaluator:
+    """
+    逐地区预警判断：规则、人员与设置只加载一次，之后每来一个地区的天气数据即可单独判断，
+    供批量判断与流水线共用；预报未变化（unchanged）的地区复用上一轮的规则判断结果
+    """
+
+    def __init__(self, forecast_hours=24, snapshot=None):
+        self.forecast_hours = forecast_hours
+        self.ready = False
+        self.seen_regions = set()
+        self.reused_count = 0
+        snapshot = snapshot or get_snapshot()
+
+        # 加载预警规则（复制一份：判断过程中会在规则上记录匹配日期，不能改动共享的快照）
+        if snapshot.rules is None:
+            print("无法加载预警规则")
+            return
+        self.rules = [dict(rule) for rule in snapshot.rules]
+
+        # 加载客户数据
+        customers = snapshot.customers
+        if customers is None:
+            print("无法加载客户数据")
+            return
+
+        # 加载全局设置
+        settings = snapshot.settings
+        if settings is not None:
+            self.global_advance_days = settings.get('alertAdvanceTime', 1)  # 读取全局提前预警天数
+            self.interval_prediction = settings.get('intervalPrediction', False)  # 读取是否启用区间预测
+            if settings.get('autoRetry') is not None and settings.get('intervalPrediction') is None:
+                # 兼容处理，如果有旧版配置但没有新配置
+                self.interval_prediction = settings.get('autoRetry', False)
+
+            print(f"全局提前预警天数设置为: {self.global_advance_days}天")
+            print(f"区间预测模式: {'已启用' if self.interval_prediction else '未启用'}")
+        else:
+            self.global_advance_days = 1
+            self.interval_prediction = False
+            print("无法加载设置文件，使用默认提前预警天数: 1天")
+
+        # 按地区索引客户，避免每条规则都遍历全部客户
+        self.customers_by_region = {}
+        for customer in customers:
+            self.customers_by_region.setdefault(customer.get('region'), []).append(customer)
+
+        # 规则、设置与当前日期共同决定判断结果，任一变化都会使缓存失效
+        self.rules_fingerprint = (
+            snapshot.version_of('rules'),
+            self.global_advance_days,
+            self.interval_prediction,
+            forecast_hours,
+            get_current_date().strftime('%Y-%m-%d')
+        )
+        self.ready = True
+
+    def evaluate(self, region, region_data):
+        """判断单个地区，返回该地区的预警列表"""
+        if not self.ready:
+            return []
+        self.seen_regions.add(region)
+
+        cache_key = (region_data.get('sourceUpdateTime'), region_data.get('hourlyUpdateTime'), self.rules_fingerprint)
+        cached = _evaluation_cache.get(region)
+        if region_data.get('unchanged') and cache_key[0] and cached and cached[0] == cache_key:
+            matches = cached[1]
+            self.reused_count += 1
+        else:
+            matches = evaluate_region_rules(
+                region_data, self.rules, self.global_advance_days, self.interval_prediction, self.forecast_hours
+            )
+            if cache_key[0]:
+                _evaluation_cache[region] = (cache_key, matches)
+            else:
+                _evaluation_cache.pop(region, None)
+
+        alerts = []
+        for rule_index, matched_date in matches:
+            rule = self.rules[rule_index]
+            if self.interval_prediction:
+                # 更新规则中的匹配日期
+                rule['matched_forecast_date'] = matched_date
+
+            # 对该地区每个客户检查是否关注此类型的预警
+            for customer in self.customers_by_region.get(region, []):
+                if rule['type'] in customer.get('weatherTypes', []):
+                    # 创建预警记录
+                    alerts.append({
+                        'customer': customer,
+                        'region': region,
+                        'weather_type': rule['type'],
+                        'condition': rule['condition'],
+                        'rule': rule,
+                        'global_advance_days': self.global_advance_days,
+                        'forecast_date': matched_date
+                    })
+        return alerts
+
+    def finish(self):
+        """一轮判断结束：清理本轮未出现地区的缓存"""
+        if not self.ready:
+            return
+        for region in list(_evaluation_cache):
+            if region not in self.seen_regions:
+                del _evaluation_cache[region]
+        if self.reused_count:
+            print(f"{self.reused_count}个地区预报未变化，复用上次规则判断结果")
+
 # 检查天气预警条件
-def check_alert_conditions(weather_data, forecast_hours=24):
+def check_alert_conditions(weather_data, forecast_hours=24, snapshot=None):
     """
     检查天气数据是否满足预警条件
     
     修改：确保对每个客户检查所有预警条件，并为每个满足的条件创建单独的预警
     """
-    alerts = []
-    
-    # 加载预警规则
-    try:
-        with open('alert_rules.json', 'r', encoding='utf-8') as f:
-            rules = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        print("无法加载预警规则")
+    evaluator = AlertEvaluator(forecast_hours, snapshot)
+    if not evaluator.ready:
         return []
-    
-    # 加载客户数据
-    try:
-        with open('customers_data.json', 'r', encoding='utf-8') as f:
-            customers = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        print("无法加载客户数据")
-        return []
-    
-    # 加载全局设置
-    try:
-        with open('settings.json', 'r', encoding='utf-8') as f:
-            settings = json.load(f)
-            global_advance_days = settings.get('alertAdvanceTime', 1)  # 读取全局提前预警天数
-            interval_prediction = settings.get('intervalPrediction', False)  # 读取是否启用区间预测
-            if settings.get('autoRetry') is not None and settings.get('intervalPrediction') is None:
-                # 兼容处理，如果有旧版配置但没有新配置
-                interval_prediction = settings.get('autoRetry', False)
-            
-            print(f"全局提前预警天数设置为: {global_advance_days}天")
-            print(f"区间预测模式: {'已启用' if interval_prediction else '未启用'}")
-    except (FileNotFoundError, json.JSONDecodeError):
-        global_advance_days = 1
-        interval_prediction = False
-        print("无法加载设置文件，使用默认提前预警天数: 1天")
-    
-    # 对每个地区的天气数据进行检查
+
+    alerts = []
     for region, region_data in weather_data.items():
-        # 对每个预警规则进行检查
-        for rule in rules:
-            if rule.get('status') != '活跃':
-                continue
-                
-            # 获取提前预警天数 - 优先使用规则中的设置，如果没有则使用全局设置
-            advance_days = rule.get('advanceTime')
-            if advance_days is None:
-                advance_days = global_advance_days
-            else:
-                # 确保是整数类型
-                try:
-                    advance_days = int(advance_days)
-                except (ValueError, TypeError):
-                    advance_days = global_advance_days
-            
-            # 区间预测模式：检查从当天到提前预警天数的整个区间
-            matched_forecasts = []
-            
-            if interval_prediction:
-                # 在区间内检查所有日期
-                print(f"区间预测模式：检查从今天到提前{advance_days}天的整个区间")
-                
-                # 为每一天创建临时规则副本并检查
-                for day in range(0, advance_days + 1):
-                    # 计算当前检查的日期距离今天的天数
-                    check_day = day
-                    
-                    # 创建临时规则，设置对应的提前预警天数
-                    temp_rule = rule.copy()
-                    temp_rule['advanceTime'] = str(check_day)
-                    
-                    # 检查当前日期是否满足条件
-                    if is_condition_met(region_data, temp_rule, forecast_hours):
-                        # 如果满足条件，记录该日期的预报信息
-                        matched_date = temp_rule.get('matched_forecast_date')
-                        matched_forecasts.append({
-                            'days': check_day,  # 相对于当前日期的天数
-                            'date': matched_date,  # 实际日期
-                            'rule': temp_rule  # 规则副本，包含满足条件的日期
-                        })
-                
-                # 如果有多个日期满足条件，选择最接近当前日期的
-                if matched_forecasts:
-                    # 按照距离当前日期的天数排序（升序）
-                    matched_forecasts.sort(key=lambda x: x['days'])
-                    # 取最接近当前日期的预报
-                    closest_forecast = matched_forecasts[0]
-                    
-                    print(f"在区间内发现 {len(matched_forecasts)} 天满足条件，选择最接近当前日期的: {closest_forecast['date']}")
-                    
-                    # 更新规则中的匹配日期
-                    rule['matched_forecast_date'] = closest_forecast['date']
-                    
-                    # 找到该地区的所有客户
-                    region_customers = [c for c in customers if c['region'] == region]
-                    
-                    # 对每个客户检查是否关注此类型的预警
-                    for customer in region_customers:
-                        # 检查客户是否关注此类型的预警
-                        if rule['type'] in customer.get('weatherTypes', []):
-                            # 创建预警记录
-                            alert = {
-                                'customer': customer,
-                                'region': region,
-                                'weather_type': rule['type'],
-                                'condition': rule['condition'],
-                                'rule': rule,
-                                'global_advance_days': global_advance_days,
-                                'forecast_date': closest_forecast['date']
-                            }
-                            alerts.append(alert)
-            else:
-                # 原始模式：只检查特定的提前预警天数
-                # 创建临时规则副本
-                temp_rule = rule.copy()
-                temp_rule['advanceTime'] = str(advance_days)
-                
-                # 检查天气数据是否满足规则条件
-                if is_condition_met(region_data, temp_rule, forecast_hours):
-                    # 保存满足条件的预报日期
-                    matched_date = temp_rule.get('matched_forecast_date')
-                    
-                    # 找到该地区的所有客户
-                    region_customers = [c for c in customers if c['region'] == region]
-                    
-                    # 对每个客户检查是否关注此类型的预警
-                    for customer in region_customers:
-                        # 检查客户是否关注此类型的预警
-                        if rule['type'] in customer.get('weatherTypes', []):
-                            # 创建预警记录
-                            alert = {
-                                'customer': customer,
-                                'region': region,
-                                'weather_type': rule['type'],
-                                'condition': rule['condition'],
-                                'rule': rule,
-                                'global_advance_days': global_advance_days,
-                                'forecast_date': matched_date
-                            }
-                            alerts.append(alert)
-    
+        alerts.extend(evaluator.evaluate(region, region_data))
+    evaluator.finish()
     return alerts
 
 # 检查是否是重复预警
@@ -573,62 +838,66 @@ def is_duplicate_alert(customer, weather_type, data_logs):
     return False
 
 # 发送预警通知
-def send_alerts(alerts, is_test=False):
+class AlertEnqueuer:
     """
-    发送预警邮件
-    
-    修改：确保处理所有预警，不跳过同一客户的多个预警
-    重复邮件定义：一周之内，同一收件对象，同一触发条件
+    把预警转换为邮件并写入 mail_task 队列。
+    模板与历史日志只加载一次；enqueue 可按批次多次调用，每批单独提交，下游可以立即开始发送；
+    close 时统一写入重复预警日志，并生成兼容现有流程的 re-Emile.json
     """
-    if not alerts:
-        print("没有需要发送的预警")
-        return False
-    
-    # 加载模板数据
-    templates = {}
-    try:
-        with open('templates_data.json', 'r', encoding='utf-8') as f:
-            templates_data = json.load(f)
-            
-        # 按类型组织模板
+
+    def __init__(self, is_test=False, email_file=EMAIL_JSON_FILE, shard_output=False, snapshot=None):
+        """
+        参数:
+        - is_test: 是否为测试邮件
+        - email_file: 本轮邮件列表的输出文件
+        - shard_output: 分片模式，不备份/裁剪输出文件，重复预警日志保留在 duplicate_logs 中由调用方统一写入
+        - snapshot: 本轮使用的数据快照，默认取当前快照
+        """
+        self.is_test = is_test
+        self.email_file = email_file
+        self.shard_output = shard_output
+        self.ready = False
+        self.failed = False
+        self.enqueued_count = 0
+        self.duplicate_logs = []
+        self._conn = None
+        self._email_file = None
+        self._email_file_path = email_file + '.tmp'
+
+        # 加载模板数据，按类型组织
+        self.templates = {}
+        templates_data = (snapshot or get_snapshot()).templates
+        if templates_data is None:
+            print("无法加载模板数据")
+            return
         for template in templates_data:
             if template.get('isActive', True) and template.get('type'):
                 # 如果已有这个类型的模板，存储为列表
-                if template['type'] not in templates:
-                    templates[template['type']] = []
-                templates[template['type']].append(template)
-    except (FileNotFoundError, json.JSONDecodeError):
-        print("无法加载模板数据")
-        return False
-    
-    # 加载历史日志数据，用于检查重复预警
-    try:
-        with open('data.json', 'r', encoding='utf-8') as f:
-            history_logs = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        history_logs = []
-    
-    # 准备发送的邮件列表
-    emails_to_send = []
-    
-    # 处理每个预警
-    for alert in alerts:
+                if template['type'] not in self.templates:
+                    self.templates[template['type']] = []
+                self.templates[template['type']].append(template)
+
+        # 加载历史日志数据，用于检查重复预警
+        self.duplicate_index = build_duplicate_index(json_store.read_json('data.json', []))
+        self.ready = True
+
+    def prepare(self, alert):
+        """为单条预警生成邮件数据；没有合适模板或属于重复预警时返回None"""
         customer = alert['customer']
         weather_type = alert['weather_type']
         customer_category = customer.get('category', '客户')  # 获取客户类别，默认为"客户"
-        
+        is_test = self.is_test
+
         # 查找对应的模板
-        if weather_type not in templates:
+        if weather_type not in self.templates:
             print(f"未找到{weather_type}类型的模板，跳过")
-            continue
-        
+            return None
+
         # 根据客户类别选择合适的模板
         suitable_template = None
-        available_templates = templates[weather_type]
-        
-        for template in available_templates:
+        for template in self.templates[weather_type]:
             target_role = template.get('targetRole', 'all')
-            
+
             # 对于客户：可以使用通用(all)模板或客户专用(customer)模板
             if customer_category == '客户' and (target_role == 'all' or target_role == 'customer'):
                 suitable_template = template
@@ -637,14 +906,14 @@ def send_alerts(alerts, is_test=False):
             elif customer_category == '工程师' and (target_role == 'all' or target_role == 'engineer'):
                 suitable_template = template
                 break
-        
+
         # 如果没有找到合适的模板，跳过
         if not suitable_template:
             print(f"未找到适合{customer_category}的{weather_type}类型模板，跳过")
-            continue
-        
+            return None
+
         template = suitable_template
-        
+
         # 准备邮件数据
         email_data = {
             'to_email': customer['email'],
@@ -660,7 +929,7 @@ def send_alerts(alerts, is_test=False):
             'category': customer_category,
             'is_test': is_test
         }
-        
+
         # 确保内容不为空
         if not email_data['content']:
             print(f"警告: {customer['name']}的{weather_type}预警邮件内容为空，使用默认内容")
@@ -677,97 +946,186 @@ def send_alerts(alerts, is_test=False):
 此致
 天气预警系统
             """
-        
+
         # 确保主题不为空
         if not email_data['subject']:
             print(f"警告: {customer['name']}的{weather_type}预警邮件主题为空，使用默认主题")
             email_data['subject'] = f"{customer['region']}地区{weather_type}天气预警通知"
-        
+
         # 添加附件信息
         if 'attachments' in template and template['attachments']:
             try:
                 email_data['attachments'] = json.loads(template['attachments'])
             except:
                 email_data['attachments'] = template['attachments']
-        
+
         # 检查是否是重复预警（一周内同一收件人同一触发条件）
-        is_duplicate = check_duplicate_alert(email_data, history_logs)
-        
+        is_duplicate = check_duplicate_alert(email_data, None, self.duplicate_index)
+
         # 标记重复预警
         email_data['is_duplicate'] = bool(is_duplicate)
         if is_duplicate:
-            # 记录重复情况到日志，便于审计
-            try:
-                try:
-                    with open('data.json', 'r', encoding='utf-8') as f:
-                        log_data = json.load(f)
-                except (FileNotFoundError, json.JSONDecodeError):
-                    log_data = []
-                new_id = max([log.get('id', 0) for log in log_data]) + 1 if log_data else 1
-                log_entry = {
-                    'id': new_id,
-                    'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'recipient': email_data['to_email'],
-                    'to_name': email_data.get('to_name', ''),
-                    'weather_type': email_data.get('weather_type', ''),
-                    'region': email_data.get('region', ''),
-                    'subject': email_data.get('subject', ''),
-                    'content': email_data.get('content', ''),
-                    'alert_date': email_data.get('alert_date', ''),
-                    'condition': email_data.get('condition', ''),
-                    'status': '已记录（重复预警，7天内跳过）',
-                    'category': email_data.get('category', ''),
-                    'is_test': is_test
-                }
-                log_data.append(log_entry)
-                with open('data.json', 'w', encoding='utf-8') as f:
-                    json.dump(log_data, f, ensure_ascii=False, indent=4)
-                trim_json_file('data.json', 'data_log')
-            except Exception as log_err:
-                print(f"记录重复预警日志失败: {log_err}")
+            # 记录重复情况到日志，便于审计（close 时统一写入）
+            self.duplicate_logs.append({
+                'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'recipient': email_data['to_email'],
+                'to_name': email_data.get('to_name', ''),
+                'weather_type': email_data.get('weather_type', ''),
+                'region': email_data.get('region', ''),
+                'subject': email_data.get('subject', ''),
+                'content': email_data.get('content', ''),
+                'alert_date': email_data.get('alert_date', ''),
+                'condition': email_data.get('condition', ''),
+                'status': '已记录（重复预警，7天内跳过）',
+                'category': email_data.get('category', ''),
+                'is_test': is_test
+            })
             # 仅记录，不进入待发送队列
             print(f"检测到重复预警（仅记录，不发送/通知）: {email_data['to_name']} - {email_data['weather_type']} - {email_data['region']}")
-            continue
-        
-        # 添加到发送列表
-        emails_to_send.append(email_data)
-    
-    # 保存到数据库任务表
+            return None
+
+        return email_data
+
+    def enqueue(self, alerts):
+        """把一批预警写入 mail_task（单个事务），返回写入数量"""
+        if not self.ready or self.failed:
+            return 0
+        emails_to_send = [email for email in (self.prepare(alert) for alert in alerts) if email]
+        if not emails_to_send:
+            return 0
+
+        # 保存到数据库任务表
+        try:
+            if self._conn is None:
+                ensure_mail_task_table()
+                self._conn = connect(DB_PATH)
+            cursor = self._conn.cursor()
+            for email in emails_to_send:
+                # 使用时间戳 + 随机数，避免同一邮箱同一时刻多任务被覆盖
+                task_id = f"task_{datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')}_{email['to_email']}_{random.randint(1000, 9999)}"
+                payload = json.dumps(email, ensure_ascii=False)
+                cursor.execute(
+                    """
+                    INSERT OR REPLACE INTO mail_task (task_id, status, payload, is_test, attempts, error, created_at, updated_at)
+                    VALUES (?, 'pending', ?, ?, 0, NULL, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                    """,
+                    (task_id, payload, 1 if self.is_test else 0)
+                )
+            self._conn.commit()
+        except Exception as e:
+            print(f"保存邮件任务失败: {str(e)}")
+            self.failed = True
+            return 0
+
+        # 同步追加到 re-Emile.json 的临时文件，逐条写出，不在内存中保留整轮邮件
+        try:
+            if self._email_file is None:
+                self._email_file = open(self._email_file_path, 'w', encoding='utf-8')
+                self._email_file.write('[\n')
+            for email in emails_to_send:
+                if self.enqueued_count:
+                    self._email_file.write(',\n')
+                self._email_file.write(json_store.dumps(email))
+                self.enqueued_count += 1
+        except Exception as e:
+            print(f"保存邮件信息到文件失败: {str(e)}")
+            self.failed = True
+        return len(emails_to_send)
+
+    def close(self):
+        """结束写入：记录重复预警日志，生成邮件列表文件；全部成功返回True"""
+        if not self.ready:
+            return False
+        if not self.shard_output:
+            append_duplicate_logs(self.duplicate_logs)
+            self.duplicate_logs = []
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+        if self._email_file is None and not self.failed:
+            self._email_file = open(self._email_file_path, 'w', encoding='utf-8')
+            self._email_file.write('[\n')
+        if self._email_file is not None:
+            self._email_file.write('\n]\n')
+            self._email_file.close()
+            self._email_file = None
+
+        if self.failed:
+            try:
+                os.remove(self._email_file_path)
+            except OSError:
+                pass
+            return False
+
+        print(f"邮件任务已写入数据库，共 {self.enqueued_count} 条")
+        try:
+            if not self.shard_output:
+                backup_if_has_data(self.email_file, 're_emile')
+            json_store.replace_file(self._email_file_path, self.email_file)
+            if not self.shard_output:
+                trim_json_file(self.email_file, 're_emile', max_entries=1000)
+            print(f"邮件信息已保存到 {self.email_file}，共 {self.enqueued_count} 条记录")
+            return True
+        except Exception as e:
+            print(f"保存邮件信息到文件失败: {str(e)}")
+            return False
+
+def append_duplicate_logs(entries):
+    """把重复预警记录追加到 data.json（不重写已有内容），按顺序分配日志ID"""
+    if not entries:
+        return
     try:
-        ensure_mail_task_table()
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        for email in emails_to_send:
-            # 使用时间戳 + 随机数，避免同一邮箱同一时刻多任务被覆盖
-            task_id = f"task_{datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')}_{email['to_email']}_{random.randint(1000, 9999)}"
-            payload = json.dumps(email, ensure_ascii=False)
-            cursor.execute(
-                """
-                INSERT OR REPLACE INTO mail_task (task_id, status, payload, is_test, attempts, error, created_at, updated_at)
-                VALUES (?, 'pending', ?, ?, 0, NULL, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                """,
-                (task_id, payload, 1 if is_test else 0)
-            )
-        conn.commit()
-        conn.close()
-        print(f"邮件任务已写入数据库，共 {len(emails_to_send)} 条")
-    except Exception as e:
-        print(f"保存邮件任务失败: {str(e)}")
-        return False
+        log_data = json_store.read_json('data.json', [])
+        new_id = max([log.get('id', 0) for log in log_data]) + 1 if log_data else 1
+        append_json_array('data.json', [
+            {'id': new_id + i, **log_entry} for i, log_entry in enumerate(entries)
+        ], prefix='data_log', max_entries=2000)
+    except Exception as log_err:
+        print(f"记录重复预警日志失败: {log_err}")
+
+def send_alerts(alerts, is_test=False):
+    """
+    发送预警邮件
     
-    # 同步保存到文件以兼容现有流程
-    try:
-        backup_if_has_data('re-Emile.json', 're_emile')
-        with open('re-Emile.json', 'w', encoding='utf-8') as f:
-            json.dump(emails_to_send, f, ensure_ascii=False, indent=4)
-        trim_json_file('re-Emile.json', 're_emile', max_entries=1000)
-        print(f"邮件信息已保存到 re-Emile.json，共 {len(emails_to_send)} 条记录")
-        return True
-    except Exception as e:
-        print(f"保存邮件信息到文件失败: {str(e)}")
+    修改：确保处理所有预警，不跳过同一客户的多个预警
+    重复邮件定义：一周之内，同一收件对象，同一触发条件
+    """
+    if not alerts:
+        print("没有需要发送的预警")
+        return False
+
+    enqueuer = AlertEnqueuer(is_test)
+    if not enqueuer.ready:
         return False
+    enqueuer.enqueue(alerts)
+    return enqueuer.close()
+
+def build_duplicate_index(history_logs):
+    """
+    为重复预警检查建立索引：只保留一周内已发送/已记录重复的日志，
+    按 (收件人, 地区, 天气类型) 分组，值为 [(触发条件, 人员类别)]
+    """
+    index = {}
+    one_week_ago = datetime.datetime.now() - datetime.timedelta(days=7)
+    for log in history_logs or []:
+        status = log.get('status', '')
+        if not (status.startswith('已发送') or status.startswith('已记录（重复预警')):
+            continue
+        try:
+            log_time = datetime.datetime.strptime(log.get('timestamp', ''), '%Y-%m-%d %H:%M:%S')
+        except Exception:
+            continue
+        if log_time < one_week_ago:
+            continue
+        key = (log.get('recipient'), log.get('region'), log.get('weather_type'))
+        index.setdefault(key, []).append((
+            (log.get('condition', '') or '').strip(),
+            (log.get('category', '') or '').strip()
+        ))
+    return index
 
-def check_duplicate_alert(email_data, history_logs):
+def check_duplicate_alert(email_data, history_logs, duplicate_index=None):
     """
     检查是否是重复预警（一周内同一收件人同一触发条件）
     注意：不使用 alert_date（预警日期）参与去重，避免每天预报日期滚动/区间预测导致重复发送。
@@ -775,47 +1133,27 @@ def check_duplicate_alert(email_data, history_logs):
     参数:
     - email_data: 当前邮件数据
     - history_logs: 历史日志数据
+    - duplicate_index: build_duplicate_index 预先建立的索引，批量检查时传入可避免重复遍历日志
     
     返回:
     - 是否是重复预警
     """
-    if not history_logs:
-        return False
-    
-    current_time = datetime.datetime.now()
-    one_week_ago = current_time - datetime.timedelta(days=7)
+    if duplicate_index is None:
+        if not history_logs:
+            return False
+        duplicate_index = build_duplicate_index(history_logs)
     
-    current_email = email_data['to_email']
-    current_region = email_data['region']
-    current_weather_type = email_data['weather_type']
-    current_condition = email_data.get('condition', '')
-    current_category = email_data.get('category', '')
+    current_condition = (email_data.get('condition', '') or '').strip()
+    current_category = (email_data.get('category', '') or '').strip()
     
-    for log in history_logs:
-        try:
-            log_time = datetime.datetime.strptime(log.get('timestamp', ''), '%Y-%m-%d %H:%M:%S')
-        except Exception:
-            continue
-        if log_time < one_week_ago:
-            continue
-        
-        if log.get('recipient') != current_email:
-            continue
-        if log.get('region') != current_region:
-            continue
-        if log.get('weather_type') != current_weather_type:
-            continue
+    key = (email_data['to_email'], email_data['region'], email_data['weather_type'])
+    for log_condition, log_category in duplicate_index.get(key, ()):
         # 兼容旧日志：如果任一方缺失条件/类别，不用作阻断条件
-        log_condition = (log.get('condition', '') or '').strip()
         if log_condition and current_condition and log_condition != current_condition:
             continue
-        log_category = (log.get('category', '') or '').strip()
         if log_category and current_category and log_category != current_category:
             continue
-        
-        status = log.get('status', '')
-        if status.startswith('已发送') or status.startswith('已记录（重复预警'):
-            return True
+        return True
     
     return False
 
@@ -827,7 +1165,10 @@ def send_emails():
         print('没有找到需要发送的邮件信息。')
         return
     
-    # 创建Flask应用
+    # 创建Flask应用（只有发送邮件时才需要，延迟导入，预警流水线与命令行工具无需加载 Flask）
+    from flask import Flask
+    from send_email_api import register_routes
+
     app = Flask(__name__)
     register_routes(app)
     
@@ -932,9 +1273,9 @@ def send_emails():
         for failed in results['failed']:
             print(f"- {failed['to_name']} ({failed['to_email']}): {failed['error']}")
 
-def calculate_next_alert_time(settings):
-    """计算下一次预警时间，支持时:分精度"""
-    current_time = datetime.datetime.now()
+def calculate_next_alert_time(settings, now=None):
+    """计算下一次预警时间，支持时:分精度；now 指定时返回该时刻之后的下一次"""
+    current_time = now or datetime.datetime.now()
     first_hour, first_minute = parse_first_alert_time(settings)
     warning_interval = settings.get('warningInterval', 12)  # 默认12小时间隔
     try:
@@ -1001,14 +1342,17 @@ def main():
     主函数：运行天气预警系统
     """
     try:
+        # 本次运行的各个阶段共用同一份数据快照
+        snapshot = get_snapshot()
+
         # 读取配置文件
-        config = load_json_file(SETTINGS_FILE)
+        config = snapshot.settings
         if not config:
             print("错误：无法加载配置文件")
             return
         
         # 读取预警规则
-        rules = load_json_file(ALERT_RULES_FILE)
+        rules = snapshot.rules
         if not rules:
             print("错误：无法加载预警规则")
             return
@@ -1018,7 +1362,7 @@ def main():
         print(f"\n全局提前预警天数设置为: {global_advance_days}天")
         
         # 获取所有地区的天气数据
-        regions = get_customer_regions()
+        regions = get_customer_regions(snapshot)
         if not regions:
             print("错误：未找到任何地区")
             return
@@ -1027,17 +1371,17 @@ def main():
         all_alerts = []
         
         # 获取天气数据
-        weather_data = fetch_weather_data(regions)
+        weather_data = fetch_weather_data(regions, snapshot)
         if not weather_data:
             print("错误：无法获取天气数据")
             return
         
         # 检查预警条件
         forecast_hours = global_advance_days * 24
-        alerts = check_alert_conditions(weather_data, forecast_hours)
+        alerts = check_alert_conditions(weather_data, forecast_hours, snapshot)
         
         # 提取客户数据以便显示收件人信息
-        customers = load_json_file(CUSTOMERS_FILE)
+        customers = snapshot.customers
         customer_map = {}
         if customers:
             for customer in customers:
@@ -1,8 +1,9 @@
 import json
 import time
-import sqlite3
 import os
 
+from sqlite_db import connect, get_connection
+
 class WeatherCache:
     """天气数据缓存类，用于缓存天气API的响应数据"""
     
@@ -15,14 +16,21 @@ class WeatherCache:
         """
         self.cache_db_path = cache_db_path
         self.cache_duration = cache_duration
-        self._init_db()
+        self._initialized = False
+    
+    def _connect(self):
+        """取得当前线程复用的缓存库连接，首次使用时才创建目录与缓存表"""
+        if not self._initialized:
+            self._init_db()
+            self._initialized = True
+        return get_connection(self.cache_db_path)
     
     def _init_db(self):
         """初始化缓存数据库"""
         # 确保instance目录存在
         os.makedirs(os.path.dirname(self.cache_db_path), exist_ok=True)
         
-        conn = sqlite3.connect(self.cache_db_path)
+        conn = connect(self.cache_db_path)
         cursor = conn.cursor()
         
         # 创建缓存表
@@ -46,7 +54,7 @@ class WeatherCache:
         Returns:
             缓存的数据（如果存在且未过期），否则返回None
         """
-        conn = sqlite3.connect(self.cache_db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute(
@@ -75,7 +83,7 @@ class WeatherCache:
             cache_key: 缓存键名
             data: 要缓存的数据
         """
-        conn = sqlite3.connect(self.cache_db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         timestamp = int(time.time())
@@ -95,7 +103,7 @@ class WeatherCache:
         Args:
             cache_key: 要清除的缓存键名，如果为None则清除所有缓存
         """
-        conn = sqlite3.connect(self.cache_db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         if cache_key:
@@ -108,7 +116,7 @@ class WeatherCache:
     
     def clear_expired(self):
         """清除所有过期的缓存"""
-        conn = sqlite3.connect(self.cache_db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         current_time = int(time.time())
@@ -0,0 +1,354 @@
+"""
+天气数据提供方抽象：统一城市查询、逐日预报与逐小时预报的获取方式。
+
+- QWeatherProvider：和风天气实时接口（默认）
+- LocalWeatherProvider：从磁盘回放录制数据或生成合成数据，可配置延迟与错误率，
+  用于离线压测整个预警流程而不消耗API配额
+
+通过环境变量选择：
+- WEATHER_PROVIDER：qweather（默认）或 local
+- WEATHER_REPLAY_DIR：回放数据目录（默认 weather_replay）
+- WEATHER_REPLAY_LATENCY_MS：本地后端每次请求的模拟延迟（毫秒）
+- WEATHER_REPLAY_ERROR_RATE：本地后端的模拟错误率（0~1）
+- WEATHER_REPLAY_SEED：本地后端随机种子，便于复现
+- WEATHER_RECORD_DIR：设置后，QWeather 的响应会按回放目录格式录制到该目录
+
+请求保护（见 api_guard，按数据源分别计数）:
+- WEATHER_API_QPS：和风天气套餐允许的每秒请求数（默认10）
+- WEATHER_REPLAY_QPS：本地后端的每秒请求数（默认0，即不限流）
+- WEATHER_BREAKER_ERROR_RATE：熔断错误率阈值（默认0.5）
+- WEATHER_BREAKER_MIN_REQUESTS：开始判断熔断的最少请求数（默认10）
+- WEATHER_BREAKER_COOLDOWN：熔断冷却时间（秒，默认60）
+"""
+
+import datetime
+import json
+import os
+import random
+import threading
+import time
+import zlib
+
+from api_guard import ApiGuard, CircuitBreaker, CircuitOpenError, TokenBucket
+from http_client import http_get
+import json_store
+from maintenance_utils import log_health
+
+QWEATHER_CITY_API = "https://geoapi.qweather.com/v2/city/lookup"
+QWEATHER_DAILY_API = "https://api.qweather.com/v7/weather/{days}d"
+QWEATHER_HOURLY_API = "https://api.qweather.com/v7/weather/24h"
+
+DEFAULT_REPLAY_DIR = 'weather_replay'
+
+# 不计入熔断错误率的业务返回码：无数据、参数错误、查询不到城市
+NON_FAILURE_CODES = {'204', '400', '404'}
+THROTTLED_CODES = {'429'}
+
+
+class WeatherProviderError(Exception):
+    """提供方请求失败（网络错误、模拟故障等）"""
+
+
+class WeatherProvider:
+    """
+    天气数据提供方基类，返回值均为和风天气格式的字典（含 code 字段）
+
+    子类实现 _lookup_city / _daily_forecast / _hourly_forecast，
+    基类在每次调用前后统一做限流与熔断统计。
+    """
+
+    name = 'base'
+    requires_api_key = False
+
+    @property
+    def guard(self):
+        return get_api_guard(self.name)
+
+    def available(self):
+        """数据源当前是否可用（未熔断）"""
+        return self.guard.available()
+
+    def _call(self, method, *args):
+        guard = self.guard
+        try:
+            token = guard.before_call()
+        except CircuitOpenError as e:
+            raise WeatherProviderError(str(e)) from e
+        try:
+            data = method(*args)
+        except Exception:
+            guard.after_call(False, token=token)
+            raise
+        code = str(data.get('code', ''))
+        guard.after_call(code == '200' or code in NON_FAILURE_CODES, throttled=code in THROTTLED_CODES, token=token)
+        return data
+
+    def lookup_city(self, location):
+        """按名称查询城市，返回 {'code': '200', 'location': [...]}"""
+        return self._call(self._lookup_city, location)
+
+    def daily_forecast(self, location_id, days=3):
+        """获取逐日预报，返回 {'code': '200', 'updateTime': ..., 'daily': [...]}"""
+        return self._call(self._daily_forecast, location_id, days)
+
+    def hourly_forecast(self, location_id):
+        """获取24小时逐小时预报，返回 {'code': '200', 'updateTime': ..., 'hourly': [...]}"""
+        return self._call(self._hourly_forecast, location_id)
+
+    def _lookup_city(self, location):
+        raise NotImplementedError
+
+    def _daily_forecast(self, location_id, days):
+        raise NotImplementedError
+
+    def _hourly_forecast(self, location_id):
+        raise NotImplementedError
+
+
+class QWeatherProvider(WeatherProvider):
+    """和风天气接口实现"""
+
+    name = 'qweather'
+    requires_api_key = True
+
+    def __init__(self, api_key, record_dir=None):
+        self.api_key = api_key
+        self.record_dir = record_dir
+
+    def _get(self, url, params, record_path=None):
+        params = dict(params, key=self.api_key)
+        response = http_get(url, params=params)
+        if response.status_code != 200:
+            return {'code': str(response.status_code), 'message': f'HTTP {response.status_code}'}
+        data = response.json()
+        if self.record_dir and record_path and data.get('code') == '200':
+            _write_payload(os.path.join(self.record_dir, record_path), data)
+        return data
+
+    def _lookup_city(self, location):
+        return self._get(QWEATHER_CITY_API, {'location': location}, _geo_path(location))
+
+    def _daily_forecast(self, location_id, days):
+        url = QWEATHER_DAILY_API.format(days=days)
+        return self._get(url, {'location': location_id}, os.path.join('daily', f'{location_id}.json'))
+
+    def _hourly_forecast(self, location_id):
+        return self._get(QWEATHER_HOURLY_API, {'location': location_id},
+                         os.path.join('hourly', f'{location_id}.json'))
+
+
+class LocalWeatherProvider(WeatherProvider):
+    """
+    本地回放/合成后端
+
+    目录结构（均为和风天气原始响应格式）:
+    - geo/<城市名>.json
+    - daily/<城市ID>.json
+    - hourly/<城市ID>.json
+    文件不存在时按城市名称生成确定性的合成数据，日期从当天开始滚动。
+    """
+
+    name = 'local'
+    requires_api_key = False
+
+    def __init__(self, replay_dir=DEFAULT_REPLAY_DIR, latency_ms=0, error_rate=0.0, seed=None):
+        self.replay_dir = replay_dir
+        self.latency = max(0.0, float(latency_ms)) / 1000.0
+        self.error_rate = min(1.0, max(0.0, float(error_rate)))
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def _simulate(self):
+        """模拟网络延迟与上游故障"""
+        if self.latency:
+            time.sleep(self.latency)
+        if not self.error_rate:
+            return None
+        with self._random_lock:
+            hit = self._random.random() < self.error_rate
+            as_exception = self._random.random() < 0.5
+        if not hit:
+            return None
+        if as_exception:
+            raise WeatherProviderError('模拟上游请求失败')
+        return {'code': '429', 'message': '模拟上游限流'}
+
+    def _load(self, relative_path):
+        path = os.path.join(self.replay_dir, relative_path)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _lookup_city(self, location):
+        error = self._simulate()
+        if error:
+            return error
+        recorded = self._load(_geo_path(location))
+        if recorded:
+            return recorded
+        return {
+            'code': '200',
+            'location': [{'id': f"L{zlib.crc32(location.encode('utf-8')):010d}", 'name': location}]
+        }
+
+    def _daily_forecast(self, location_id, days):
+        error = self._simulate()
+        if error:
+            return error
+        recorded = self._load(os.path.join('daily', f'{location_id}.json'))
+        if recorded:
+            return recorded
+        return _synthetic_daily(location_id, days)
+
+    def _hourly_forecast(self, location_id):
+        error = self._simulate()
+        if error:
+            return error
+        recorded = self._load(os.path.join('hourly', f'{location_id}.json'))
+        if recorded:
+            return recorded
+        return _synthetic_hourly(location_id)
+
+
+def _geo_path(location):
+    safe_name = str(location).replace(os.sep, '_').replace('/', '_')
+    return os.path.join('geo', f'{safe_name}.json')
+
+
+def _write_payload(path, data):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        json_store.write_json(path, data)
+    except Exception as e:
+        print(f"录制天气数据失败: {path} - {e}")
+
+
+def _update_time(now=None):
+    now = now or datetime.datetime.now()
+    return now.replace(minute=0, second=0, microsecond=0).strftime('%Y-%m-%dT%H:%M+08:00')
+
+
+def _synthetic_daily(location_id, days):
+    """按城市ID生成确定性的逐日预报"""
+    rng = random.Random(zlib.crc32(f'{location_id}:{datetime.date.today()}'.encode('utf-8')))
+    today = datetime.date.today()
+    daily = []
+    for offset in range(days):
+        temp_min = rng.randint(-15, 25)
+        daily.append({
+            'fxDate': (today + datetime.timedelta(days=offset)).strftime('%Y-%m-%d'),
+            'tempMax': str(temp_min + rng.randint(3, 12)),
+            'tempMin': str(temp_min),
+            'textDay': rng.choice(['晴', '多云', '阴', '小雨', '中雨', '暴雨', '雷阵雨', '小雪', '雾', '沙尘暴']),
+            'textNight': rng.choice(['晴', '多云', '阴', '小雨', '雾']),
+            'windSpeedDay': str(rng.randint(1, 60)),
+            'windDirDay': rng.choice(['东风', '南风', '西风', '北风', '东北风', '西南风']),
+            'precip': f"{rng.choice([0, 0, 0, rng.uniform(0, 60)]):.1f}",
+            'vis': str(rng.randint(1, 30)),
+            'humidity': str(rng.randint(20, 100)),
+        })
+    return {'code': '200', 'updateTime': _update_time(), 'daily': daily}
+
+
+def _synthetic_hourly(location_id):
+    """按城市ID生成确定性的24小时逐小时预报"""
+    now = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+    rng = random.Random(zlib.crc32(f'{location_id}:{now:%Y%m%d%H}'.encode('utf-8')))
+    base_temp = rng.randint(-10, 30)
+    hourly = []
+    for offset in range(1, 25):
+        fx_time = now + datetime.timedelta(hours=offset)
+        hourly.append({
+            'fxTime': fx_time.strftime('%Y-%m-%dT%H:%M+08:00'),
+            'temp': str(base_temp + rng.randint(-4, 4)),
+            'text': rng.choice(['晴', '多云', '阴', '小雨', '中雨']),
+            'windSpeed': str(rng.randint(1, 60)),
+            'humidity': str(rng.randint(20, 100)),
+            'pop': str(rng.randint(0, 100)),
+            'precip': f"{rng.choice([0.0, 0.0, rng.uniform(0, 15)]):.1f}",
+        })
+    return {'code': '200', 'updateTime': _update_time(), 'hourly': hourly}
+
+
+_local_provider = None
+_local_provider_lock = threading.Lock()
+_api_guards = {}
+_api_guards_lock = threading.Lock()
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return float(default)
+
+
+def _on_breaker_change(provider_name):
+    def callback(old_state, new_state, error_rate):
+        if new_state == CircuitBreaker.OPEN:
+            message = f"{provider_name} 错误率 {error_rate:.0%}，已熔断，暂停请求"
+            print(message)
+            log_health('WeatherAPI', False, message)
+        elif new_state == CircuitBreaker.CLOSED:
+            message = f"{provider_name} 试探请求成功，熔断恢复"
+            print(message)
+            log_health('WeatherAPI', True, message)
+    return callback
+
+
+def guard_qps_setting(provider_name):
+    """数据源对应的限流环境变量名与默认 QPS"""
+    if provider_name == 'local':
+        return 'WEATHER_REPLAY_QPS', 0
+    return 'WEATHER_API_QPS', 10
+
+
+def get_api_guard(provider_name):
+    """按数据源获取进程内共享的限流/熔断器"""
+    guard = _api_guards.get(provider_name)
+    if guard is not None:
+        return guard
+    with _api_guards_lock:
+        guard = _api_guards.get(provider_name)
+        if guard is None:
+            qps_env, qps_default = guard_qps_setting(provider_name)
+            guard = ApiGuard(
+                provider_name,
+                TokenBucket(_env_float(qps_env, qps_default)),
+                CircuitBreaker(
+                    error_threshold=_env_float('WEATHER_BREAKER_ERROR_RATE', 0.5),
+                    min_requests=int(_env_float('WEATHER_BREAKER_MIN_REQUESTS', 10)),
+                    cooldown=_env_float('WEATHER_BREAKER_COOLDOWN', 60),
+                    on_state_change=_on_breaker_change(provider_name),
+                ),
+            )
+            _api_guards[provider_name] = guard
+    return guard
+
+
+def get_provider_name():
+    return (os.getenv('WEATHER_PROVIDER', 'qweather') or 'qweather').strip().lower()
+
+
+def get_weather_provider(api_key=None):
+    """
+    按环境变量返回当前使用的天气数据提供方
+
+    参数:
+    - api_key: 和风天气API Key（本地后端忽略）
+    """
+    global _local_provider
+    if get_provider_name() == 'local':
+        if _local_provider is None:
+            with _local_provider_lock:
+                if _local_provider is None:
+                    _local_provider = LocalWeatherProvider(
+                        replay_dir=os.getenv('WEATHER_REPLAY_DIR', DEFAULT_REPLAY_DIR),
+                        latency_ms=os.getenv('WEATHER_REPLAY_LATENCY_MS', 0) or 0,
+                        error_rate=os.getenv('WEATHER_REPLAY_ERROR_RATE', 0) or 0,
+                        seed=os.getenv('WEATHER_REPLAY_SEED') or None,
+                    )
+        return _local_provider
+    return QWeatherProvider(api_key, record_dir=os.getenv('WEATHER_RECORD_DIR') or None)
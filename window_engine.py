@@ -0,0 +1,190 @@
+"""
+逐小时预报的时间窗口计算。
+
+在一次遍历逐小时序列的过程中，为每个 (指标, 窗口小时数) 计算所有连续窗口的
+最大值、最小值与累计值：最大/最小值用单调双端队列维护，累计值用滑动求和，
+整体复杂度为 O(小时数 × 窗口种类)，可以对所有地区逐轮计算。
+
+窗口规则（alertType 为 window）的条件格式：
+    "<N>小时[最大|最高|最小|最低|累计|平均]<指标> <比较符> <阈值> [单位]"
+例如 "3小时累计降水量 >= 20 mm"、"2小时最大风速 >= 40 km/h"、"6小时最低温度 <= 0 度"。
+未写聚合方式时，降水量按累计、其余指标按最大值判断。
+"""
+
+import collections
+import functools
+import operator
+import re
+
+# 条件中的指标名称 -> 逐小时预报字段
+METRIC_FIELDS = {
+    '风速': 'windSpeed',
+    '温度': 'temp',
+    '气温': 'temp',
+    '降水量': 'precip',
+    '降雨量': 'precip',
+    '湿度': 'humidity',
+    '降水概率': 'pop',
+}
+
+AGGREGATES = {
+    '最大': 'max',
+    '最高': 'max',
+    '最小': 'min',
+    '最低': 'min',
+    '累计': 'sum',
+    '平均': 'avg',
+}
+
+DEFAULT_AGGREGATES = {'precip': 'sum'}
+
+OPERATORS = {
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le,
+}
+
+_CONDITION_PATTERN = re.compile(
+    r'^\s*(\d+)\s*(?:小时|h)\s*(最大|最高|最小|最低|累计|平均)?\s*'
+    r'(降水概率|降水量|降雨量|风速|温度|气温|湿度)\s*(>=|<=|>|<)\s*(-?\d+(?:\.\d+)?)'
+)
+
+WindowSpec = collections.namedtuple('WindowSpec', 'hours field aggregate operator threshold')
+WindowResult = collections.namedtuple('WindowResult', 'start end max min sum avg')
+
+
+@functools.lru_cache(maxsize=256)
+def parse_window_condition(condition):
+    """解析窗口规则条件，无法解析时返回 None"""
+    match = _CONDITION_PATTERN.match(condition or '')
+    if not match:
+        return None
+    hours, aggregate, metric, op, threshold = match.groups()
+    hours = int(hours)
+    if hours <= 0:
+        return None
+    field = METRIC_FIELDS[metric]
+    aggregate = AGGREGATES[aggregate] if aggregate else DEFAULT_AGGREGATES.get(field, 'max')
+    return WindowSpec(hours, field, aggregate, op, float(threshold))
+
+
+def window_key(spec):
+    """同一指标、同一窗口长度的规则共用一组计算结果"""
+    return (spec.field, spec.hours)
+
+
+class RollingWindow:
+    """固定长度的滑动窗口：单调队列维护最大/最小值，滑动求和维护累计值"""
+
+    def __init__(self, size):
+        self.size = size
+        self._max = collections.deque()  # (序号, 值)，值单调递减
+        self._min = collections.deque()  # (序号, 值)，值单调递增
+        self._values = collections.deque()
+        self._sum = 0.0
+        self._last_missing = -1
+
+    def push(self, index, value):
+        """加入第 index 小时的值；窗口已满且不含缺失值时返回 (最大, 最小, 累计)"""
+        self._values.append(value)
+        if value is None:
+            self._last_missing = index
+        else:
+            self._sum += value
+            while self._max and self._max[-1][1] <= value:
+                self._max.pop()
+            self._max.append((index, value))
+            while self._min and self._min[-1][1] >= value:
+                self._min.pop()
+            self._min.append((index, value))
+
+        start = index - self.size + 1
+        if len(self._values) > self.size:
+            dropped = self._values.popleft()
+            if dropped is not None:
+                self._sum -= dropped
+        while self._max and self._max[0][0] < start:
+            self._max.popleft()
+        while self._min and self._min[0][0] < start:
+            self._min.popleft()
+
+        if start < 0 or self._last_missing >= start:
+            return None
+        return self._max[0][1], self._min[0][1], self._sum
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def compute_windows(hourly, keys):
+    """
+    单次遍历逐小时序列，计算所需的全部窗口
+
+    Args:
+        hourly: 逐小时预报列表（含 fxTime 与各指标字段）
+        keys: 可迭代的 (字段, 窗口小时数)
+
+    Returns:
+        {(字段, 窗口小时数): [WindowResult, ...]}，按窗口起始时间排序
+    """
+    keys = set(keys)
+    results = {key: [] for key in keys}
+    if not hourly or not keys:
+        return results
+
+    rolling = {key: RollingWindow(key[1]) for key in keys}
+    fields = {field for field, _ in keys}
+
+    for index, hour in enumerate(hourly):
+        values = {field: _to_float(hour.get(field)) for field in fields}
+        for key, window in rolling.items():
+            aggregated = window.push(index, values[key[0]])
+            if aggregated is None:
+                continue
+            high, low, total = aggregated
+            hours = key[1]
+            results[key].append(WindowResult(
+                start=hourly[index - hours + 1].get('fxTime', ''),
+                end=hour.get('fxTime', ''),
+                max=high,
+                min=low,
+                sum=round(total, 3),
+                avg=round(total / hours, 3)
+            ))
+    return results
+
+
+def match_window(windows, spec, date=None):
+    """
+    在计算结果中查找满足条件的窗口
+
+    Args:
+        windows: compute_windows 的返回值
+        spec: WindowSpec
+        date: 只看起始时间在该日期（YYYY-MM-DD）的窗口，None 表示不限
+
+    Returns:
+        满足条件且最极端（峰值）的窗口及其聚合值 (WindowResult, value)，没有时返回 None
+    """
+    compare = OPERATORS[spec.operator]
+    prefer_high = spec.operator in ('>', '>=')
+    best = None
+    for window in windows.get(window_key(spec), []):
+        if date and not window.start.startswith(date):
+            continue
+        value = getattr(window, spec.aggregate)
+        if not compare(value, spec.threshold):
+            continue
+        if best is None or (value > best[1] if prefer_high else value < best[1]):
+            best = (window, value)
+    return best
+
+
+def needs_hourly_forecast(rules):
+    """是否存在需要逐小时预报的活跃窗口规则"""
+    return any(rule.get('status') == '活跃' and rule.get('alertType') == 'window' for rule in rules or [])
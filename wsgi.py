@@ -0,0 +1,11 @@
+"""
+生产环境 WSGI 入口（只提供HTTP服务，不运行预警调度）。
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+预警调度由 scheduler_main.py 在独立进程中运行；数据库初始化由 scripts/run_prod.sh 在启动前执行一次。
+"""
+
+from app import configure_app
+
+application = configure_app({'RUN_ALERT_SCHEDULER': False})